@@ -0,0 +1,103 @@
+"""
+On-demand Grad-CAM overlays: an analysis registers each explainable image and returns a URL;
+the overlay is rendered (and kept) only when that URL is first fetched.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from agent.singleflight import SingleFlight
+
+
+def heatmap_id(data: bytes, model_version: str) -> str:
+    """Content id of an image under one model: the same upload gets the same URL (and overlay)."""
+    h = hashlib.sha256(model_version.encode())
+    h.update(b"\0")
+    h.update(data)
+    return h.hexdigest()[:32]
+
+
+@dataclass
+class HeatmapEntry:
+    model_version: str
+    source: Optional[bytes] = None
+    png: Optional[bytes] = None
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.source or b"") + len(self.png or b"")
+
+
+class HeatmapStore:
+    """
+    In-process LRU of registered images, bounded by bytes. An entry holds the upload bytes
+    until its overlay is rendered, then only the PNG. Per gunicorn worker, like jobs: a URL
+    must be fetched from the worker that returned it. Evicted entries are gone (fetch -> None).
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, HeatmapEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._renders = SingleFlight()
+        self.rendered = 0
+
+    def register(self, data: bytes, model_version: str) -> str:
+        """Remember data for a later render; returns its id. Re-registering refreshes the entry."""
+        key = heatmap_id(data, model_version)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                entry = HeatmapEntry(model_version, source=data)
+                self._entries[key] = entry
+                self._bytes += entry.nbytes
+                self._evict()
+        return key
+
+    def get(self, key: str) -> Optional[HeatmapEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def render(self, key: str, render: Callable[[HeatmapEntry], bytes]) -> Optional[bytes]:
+        """
+        The overlay PNG for key, calling render(entry) on first use. Concurrent fetches of the
+        same id share one render. None if key is unknown or evicted.
+        """
+        entry = self.get(key)
+        if entry is None:
+            return None
+        if entry.png is not None:
+            return entry.png
+
+        def run():
+            if entry.png is None:
+                png = render(entry)
+                with self._lock:
+                    # The entry may have been evicted while rendering; it still answers this fetch.
+                    stored = self._entries.get(key) is entry
+                    if stored:
+                        self._bytes -= entry.nbytes
+                    entry.png, entry.source = png, None
+                    if stored:
+                        self._bytes += entry.nbytes
+                        self._evict()
+                    self.rendered += 1
+            return entry.png
+
+        return self._renders.do(key, run)[0]
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "rendered": self.rendered}
@@ -0,0 +1,73 @@
+"""Image context: decode an upload once and share derived arrays across agents."""
+from functools import cached_property
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from ml.preprocess import decode_image, preprocess_image
+
+# Shorter side of the downsampled buffer the extended QA metrics share (see agent.qa_metrics).
+QA_BUFFER_SIZE = 256
+
+
+class ImageContext:
+    """
+    Decoded RGB image plus lazily computed views of it.
+    Built once per request by the orchestrator; agents read from it instead of the filesystem.
+    """
+
+    def __init__(self, image: Image.Image, source_size: Optional[Tuple[int, int]] = None):
+        self.image = image if image.mode == "RGB" else image.convert("RGB")
+        self.source_size = source_size or image.size
+
+    @classmethod
+    def from_source(cls, source, draft_size: Optional[int] = None) -> "ImageContext":
+        """
+        Build from an ImageContext, PIL image, raw bytes, path, or file-like. Raises if undecodable.
+        With draft_size, a JPEG is decoded at the smallest DCT scale (1/2, 1/4 or 1/8) that keeps
+        both sides >= draft_size (Image.draft); size still reports the file's dimensions.
+        """
+        if isinstance(source, cls):
+            return source
+        if isinstance(source, Image.Image):
+            return cls(source)
+        return cls(*decode_image(source, draft_size))
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """Dimensions of the source image, even when it was draft-decoded smaller."""
+        return self.source_size
+
+    @cached_property
+    def model_input(self) -> np.ndarray:
+        """float32 batch of shape (1, 224, 224, 3) normalized to [0, 1]."""
+        return preprocess_image(self.image)
+
+    @cached_property
+    def qa_buffer(self) -> Image.Image:
+        """
+        RGB image box-reduced by an integer factor to a shorter side of QA_BUFFER_SIZE to
+        2 * QA_BUFFER_SIZE - 1 (smaller images are used as is).
+        """
+        factor = min(self.image.size) // QA_BUFFER_SIZE
+        return self.image.reduce(factor) if factor > 1 else self.image
+
+    @cached_property
+    def intensity_stats(self) -> Tuple[float, float]:
+        """
+        (mean, std) of pixel intensity in [0, 1] over all RGB channels.
+        Computed from PIL's per-channel histogram of the uint8 pixels, so no array copy of the
+        image is made.
+        """
+        counts = np.asarray(self.image.histogram(), dtype=np.int64).reshape(3, 256).sum(axis=0)
+        return histogram_stats(counts)
+
+
+def histogram_stats(counts: np.ndarray) -> Tuple[float, float]:
+    """(mean, std) in [0, 1] of the uint8 levels counted by a 256-bin histogram."""
+    levels = np.arange(256, dtype=np.float64) / 255.0
+    n = counts.sum()
+    mean = float(counts @ levels / n)
+    var = float(counts @ (levels - mean) ** 2 / n)
+    return mean, var ** 0.5
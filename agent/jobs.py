@@ -0,0 +1,165 @@
+"""Background jobs: bounded executor, per-job stage events, and status for polling/SSE."""
+import itertools
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+class QueueFullError(Exception):
+    """The job queue is at capacity; retry_after is a suggested wait in seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Job queue is full")
+        self.retry_after = retry_after
+
+
+class Job:
+    """State of one background job. Events are append-only so SSE clients can replay them."""
+
+    def __init__(self, kind: str):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def emit(self, event: str, data: Dict[str, Any]) -> None:
+        with self._cond:
+            self.events.append({"id": next(self._ids), "event": event, "data": data})
+            self._cond.notify_all()
+
+    def set_status(self, status: str, **extra) -> None:
+        # Status change and its event are atomic so stream() never ends before the final event.
+        with self._cond:
+            self.status = status
+            self.emit("status", {"status": status, **extra})
+
+    def stage(self, name: str, payload: Dict[str, Any]) -> None:
+        """Orchestrator on_stage callback: record a finished pipeline stage."""
+        self.emit("stage", payload)
+
+    def progress(self, payload: Dict[str, Any]) -> None:
+        """Orchestrator on_progress callback: record how far a study job has got."""
+        self.emit("progress", payload)
+
+    def stream(self, after_id: int = 0, heartbeat: float = 15.0) -> Iterator[Optional[Dict[str, Any]]]:
+        """Yield events with id > after_id until the job is done; yields None as a keep-alive."""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.events) and not self.done:
+                    if not self._cond.wait(heartbeat):
+                        break
+                pending = self.events[index:]
+                index = len(self.events)
+                finished = self.done
+            if not pending and not finished:
+                yield None
+            for event in pending:
+                if event["id"] > after_id:
+                    yield event
+            if finished and index >= len(self.events):
+                return
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "stages": [e["data"]["stage"] for e in self.events if e["event"] == "stage"],
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class JobManager:
+    """
+    Runs jobs on a bounded thread pool. At most max_workers run at once and at most
+    max_queued wait; submit() raises QueueFullError beyond that (the API turns it into 429).
+    Finished jobs are kept for ttl_seconds so clients can still poll the result.
+    """
+
+    def __init__(self, max_workers: int = 2, max_queued: int = 16, ttl_seconds: float = 900):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.ttl_seconds = ttl_seconds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self._jobs: Dict[str, Job] = {}
+        self._pending = 0
+        self._avg_duration = 5.0
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Executor threads do not survive a fork (gunicorn preload): create one per process.
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="job")
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def submit(self, kind: str, fn: Callable[[Job], Dict[str, Any]]) -> Job:
+        """Queue fn(job); its return value becomes job.result. Raises QueueFullError when full."""
+        with self._lock:
+            self._evict_expired()
+            if self._pending >= self.max_workers + self.max_queued:
+                waves = (self._pending - self.max_workers) // self.max_workers + 1
+                raise QueueFullError(max(1, int(round(waves * self._avg_duration))))
+            self._pending += 1
+            job = Job(kind)
+            self._jobs[job.id] = job
+            executor = self._get_executor()
+        job.set_status("queued")
+        executor.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queued": self.max_queued,
+                "pending": self._pending,
+                "tracked": len(self._jobs),
+                "avg_duration_s": round(self._avg_duration, 3),
+            }
+
+    def _run(self, job: Job, fn: Callable[[Job], Dict[str, Any]]) -> None:
+        job.started_at = time.time()
+        job.set_status("running")
+        result, error = None, None
+        try:
+            result = fn(job)
+        except Exception as exc:
+            error = str(exc)
+        job.finished_at = time.time()
+        with self._lock:
+            self._pending -= 1
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * (job.finished_at - job.started_at)
+        job.result, job.error = result, error
+        job.set_status("failed" if error is not None else "succeeded", error=error)
+
+    def _evict_expired(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        expired = [jid for jid, j in self._jobs.items() if j.done and j.finished_at < cutoff]
+        for jid in expired:
+            del self._jobs[jid]
@@ -1,46 +1,265 @@
 """Orchestrator: runs agents in order and returns combined result."""
 import time
 import uuid
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
-from agent.qa_agent import run as qa_run
-from agent.vision_agent_tf import run as vision_run
+from agent.image_context import ImageContext
+from agent import qa_agent, qa_metrics
+from agent.qa_agent import (
+    check_header as qa_check_header, decode_failure as qa_decode_failure, decode_for_stats, run as qa_run,
+)
+from agent.result_cache import ResultCache
+from agent.study import StudyAggregator, StudyRule
+from agent.vision_agent_tf import (
+    DEFAULT_BATCH_SIZE,
+    images_per_pass as vision_images_per_pass,
+    run as vision_run,
+    run_pass as vision_run_pass,
+)
 from agent.report_agent_stub import run as report_run
-from agent.safety_gate import apply as safety_apply
+from agent.safety_gate import CONFIDENCE_THRESHOLD, apply as safety_apply
+from ml import preprocess
+
+# Called as on_stage(stage, payload) when "qa", "vision", "report" and "safety_gate" finish.
+StageCallback = Callable[[str, Dict[str, Any]], None]
+# Called as on_progress(payload) by run_batch after every forward pass over a study's slices.
+ProgressCallback = Callable[[Dict[str, Any]], None]
+# Default header_qa: the caller has not run qa_agent.check_header on the upload bytes.
+HEADER_UNCHECKED = object()
+
+
+def analysis_thresholds() -> Dict[str, Any]:
+    """Every threshold and preprocessing setting that affects a result; part of the result cache key."""
+    return {
+        "qa_min_dimension": qa_agent.MIN_DIMENSION,
+        "qa_dark_mean": qa_agent.DARK_MEAN,
+        "qa_bright_mean": qa_agent.BRIGHT_MEAN,
+        "qa_low_contrast_std": qa_agent.LOW_CONTRAST_STD,
+        **qa_metrics.thresholds(),
+        "confidence_threshold": CONFIDENCE_THRESHOLD,
+        "preprocess_draft_size": preprocess.DRAFT_SIZE,
+        "preprocess_resample": preprocess.RESAMPLE,
+    }
+
+
+def _emit(on_stage: Optional[StageCallback], stage: str, result, start: float, **extra) -> None:
+    if on_stage is not None:
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+        on_stage(stage, {"stage": stage, "result": result, "elapsed_ms": elapsed_ms, **extra})
+
+
+def replay_stages(result: Dict[str, Any], on_stage: Optional[StageCallback]) -> None:
+    """Emit the stages of an already finished result (cache hit or shared run) in order."""
+    if on_stage is None:
+        return
+    start = time.perf_counter()
+    for stage, key in (("qa", "qa"), ("vision", "vision"), ("report", "report"), ("safety_gate", "report")):
+        _emit(on_stage, stage, result[key], start, replayed=True)
+
+
+def _decode_and_qa(image, header_qa=HEADER_UNCHECKED):
+    """
+    Build the shared ImageContext and run QA on it. ctx is None when decoding fails or raw
+    bytes are rejected from their header, before any decode. header_qa is the caller's
+    qa_agent.check_header result for those bytes, so the header is parsed once per request.
+    Large JPEGs are draft-decoded (ml.preprocess.DRAFT_SIZE) unless that would skew QA's
+    contrast statistics; QA still sees the file's dimensions.
+    """
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        if header_qa is HEADER_UNCHECKED:
+            header_qa = qa_check_header(image)
+        if header_qa is not None:
+            return None, header_qa
+    try:
+        ctx = decode_for_stats(image, preprocess.DRAFT_SIZE)
+    except Exception as e:
+        return None, qa_decode_failure(e)
+    return ctx, qa_run(ctx)
 
 
 def run(
-    image_path: str,
+    image,
     model,
     class_labels: list,
     uploaded_image_url: str = "",
+    on_stage: Optional[StageCallback] = None,
+    model_version: Optional[str] = None,
+    explain: bool = False,
+    tta_views: Optional[Sequence[str]] = None,
+    header_qa=HEADER_UNCHECKED,
 ) -> Dict[str, Any]:
     """
-    Run agents in order. Returns {request_id, qa, vision, report, artifacts, latency_ms}.
-    artifacts includes uploaded_image_url.
+    Run agents in order. Returns {request_id, model_version, qa, vision, report, artifacts, latency_ms}.
+    image may be raw bytes, a path, file-like, PIL image, or ImageContext. It is decoded once
+    into an ImageContext that QA and vision share. artifacts includes uploaded_image_url.
+    on_stage, if given, is called as each agent finishes (see StageCallback). model_version
+    identifies the model that scored the image (see ml.registry.ModelHandle). explain adds a
+    Grad-CAM heatmap to vision (model must support it: see ml.heatmap.supports_explain).
+    tta_views scores the image with test-time augmentation (see vision_agent_tf.run).
+    header_qa passes on a qa_agent.check_header result the caller already has for raw bytes.
     """
     start = time.perf_counter()
     request_id = str(uuid.uuid4())
 
-    qa = qa_run(image_path)
+    ctx, qa = _decode_and_qa(image, header_qa)
+    _emit(on_stage, "qa", qa, start)
 
     if not qa.get("safe_to_infer", False):
         vision = None
+        _emit(on_stage, "vision", None, start, skipped=True)
         report = report_run(qa, {})
     else:
-        vision = vision_run(image_path, model, class_labels)
+        vision = vision_run(ctx, model, class_labels, explain=explain, tta_views=tta_views)
+        _emit(on_stage, "vision", vision, start)
         report = report_run(qa, vision)
+    _emit(on_stage, "report", report, start)
 
     report = safety_apply(qa, vision or {}, report)
+    _emit(on_stage, "safety_gate", report, start)
 
     artifacts = {"uploaded_image_url": uploaded_image_url}
     latency_ms = (time.perf_counter() - start) * 1000
 
     return {
         "request_id": request_id,
+        "model_version": model_version,
         "qa": qa,
         "vision": vision,
         "report": report,
         "artifacts": artifacts,
         "latency_ms": round(latency_ms, 2),
     }
+
+
+def run_cached(
+    cache: ResultCache,
+    key: str,
+    image,
+    model,
+    class_labels: list,
+    uploaded_image_url: str = "",
+    on_stage: Optional[StageCallback] = None,
+    model_version: Optional[str] = None,
+    explain: bool = False,
+    tta_views: Optional[Sequence[str]] = None,
+    header_qa=HEADER_UNCHECKED,
+) -> Dict[str, Any]:
+    """
+    run() behind a result cache. On a hit the cached qa/vision/report are returned with a fresh
+    request_id, this upload's artifacts and the lookup latency; on a miss run() is called and stored.
+    key must be built from model_version (see cache_key), so a hit never crosses models, and
+    from explain and the TTA settings, so a hit was computed the way this request asks.
+    """
+    start = time.perf_counter()
+    cached = cache.get(key)
+    if cached is not None:
+        replay_stages(cached, on_stage)
+        latency_ms = (time.perf_counter() - start) * 1000
+        return {
+            "request_id": str(uuid.uuid4()),
+            "model_version": model_version,
+            **cached,
+            "artifacts": {"uploaded_image_url": uploaded_image_url},
+            "latency_ms": round(latency_ms, 2),
+        }
+    result = run(
+        image, model, class_labels, uploaded_image_url, on_stage, model_version, explain, tta_views, header_qa
+    )
+    cache.set(key, {k: result[k] for k in ("qa", "vision", "report")})
+    return result
+
+
+def run_batch(
+    images: Sequence[Tuple[str, Any]],
+    model,
+    class_labels: list,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    on_stage: Optional[StageCallback] = None,
+    model_version: Optional[str] = None,
+    explain: bool = False,
+    tta_views: Optional[Sequence[str]] = None,
+    rule: StudyRule = StudyRule(),
+    on_progress: Optional[ProgressCallback] = None,
+) -> Dict[str, Any]:
+    """
+    Run the pipeline over many slices of one study, streaming: slices are decoded and QA'd in
+    order, and every time enough have passed QA for a forward pass they are scored and folded
+    into the study summary (see agent.study). images is a sequence of (filename, source) where
+    source is anything run() accepts. Returns {request_id, model_version, study, slices,
+    latency_ms}. on_stage receives per-stage counts rather than per-slice results. explain
+    adds a Grad-CAM heatmap to every analyzed slice, computed one pass at a time; tta_views
+    scores every slice with test-time augmentation.
+    rule picks the study aggregation and early stop. With early stop, passes hold at most
+    rule.min_slices slices and once the study is decisive the remaining slices are neither
+    decoded nor scored: they are returned with "skipped": true and no qa, vision or report.
+    The stages are only known once the study is done, so on_progress, if given, receives
+    {num_slices, num_decoded, num_analyzed, elapsed_ms} after every pass (slices decoded
+    and QA'd so far, and those of them scored).
+    """
+    start = time.perf_counter()
+    request_id = str(uuid.uuid4())
+    aggregator = StudyAggregator(class_labels, rule)
+    per_pass = vision_images_per_pass(batch_size, tta_views)
+    if rule.early_stop:
+        per_pass = min(per_pass, rule.min_slices)
+
+    qa_results: List[Any] = [None] * len(images)
+    vision_results: List[Any] = [None] * len(images)
+    pending: List[Tuple[int, ImageContext]] = []
+    stopped_early = False
+
+    def score_pending(num_decoded: int) -> None:
+        out = vision_run_pass([ctx for _, ctx in pending], model, class_labels, explain, tta_views)
+        for (i, _), vision in zip(pending, out):
+            vision_results[i] = vision
+            aggregator.add(vision)
+        pending.clear()
+        if on_progress is not None:
+            on_progress({
+                "num_slices": len(images),
+                "num_decoded": num_decoded,
+                "num_analyzed": aggregator.num_analyzed,
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+            })
+
+    for i, (_, source) in enumerate(images):
+        ctx, qa = _decode_and_qa(source)
+        qa_results[i] = qa
+        if qa.get("safe_to_infer", False):
+            pending.append((i, ctx))
+        if len(pending) == per_pass:
+            score_pending(i + 1)
+            if aggregator.decisive():
+                stopped_early = i + 1 < len(images)
+                break
+    if pending:
+        score_pending(sum(qa is not None for qa in qa_results))
+
+    num_decoded = sum(qa is not None for qa in qa_results)
+    num_passed = sum(qa is not None and qa.get("safe_to_infer", False) for qa in qa_results)
+    _emit(on_stage, "qa", {"num_slices": len(images), "num_passed": num_passed}, start)
+    _emit(on_stage, "vision", {"num_analyzed": num_passed, "num_skipped": len(images) - num_decoded}, start)
+
+    slices = []
+    for (filename, _), qa, vision in zip(images, qa_results, vision_results):
+        if qa is None:
+            slices.append({"filename": filename, "qa": None, "vision": None, "report": None, "skipped": True})
+            continue
+        report = report_run(qa, vision or {})
+        slices.append({"filename": filename, "qa": qa, "vision": vision, "report": report})
+    _emit(on_stage, "report", {"num_reports": num_decoded}, start)
+
+    for entry in slices:
+        if entry["qa"] is not None:
+            entry["report"] = safety_apply(entry["qa"], entry["vision"] or {}, entry["report"])
+    study = aggregator.summary(len(images), num_decoded - num_passed, stopped_early)
+    _emit(on_stage, "safety_gate", {"study": study}, start)
+
+    latency_ms = (time.perf_counter() - start) * 1000
+    return {
+        "request_id": request_id,
+        "model_version": model_version,
+        "study": study,
+        "slices": slices,
+        "latency_ms": round(latency_ms, 2),
+    }
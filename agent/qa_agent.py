@@ -1,40 +1,137 @@
 """QA agent: image quality checks using PIL + numpy."""
+import io
+import math
+import time
+from typing import Optional
+
 import numpy as np
 from PIL import Image
 
+from agent import qa_metrics
+from agent.image_context import ImageContext
+
+# QA thresholds. Only MIN_DIMENSION blocks inference; the others add warnings.
+MIN_DIMENSION = 150
+DARK_MEAN = 0.15
+BRIGHT_MEAN = 0.90
+LOW_CONTRAST_STD = 0.05
+
+# QA needs statistics, not detail: raw JPEG input is draft-decoded to at least this many
+# pixels per side. The mean survives a draft decode; the std loses whatever detail is finer
+# than the draft scale, so an image whose estimated loss exceeds DRAFT_STD_TOLERANCE is
+# decoded in full instead (decode_for_stats). benchmarks/qa_stats.py measures both.
+STATS_DRAFT_SIZE = 512
+DRAFT_MEAN_TOLERANCE = 0.005
+DRAFT_STD_TOLERANCE = 0.01
+
+# Formats accepted by the header check (PIL's names; MPO is a JPEG with extra frames) and the
+# marker each must end with. Neither marker can occur inside JPEG scan data or PNG chunks
+# before IEND, so a missing one means the upload was cut off.
+END_MARKERS = {"JPEG": b"\xff\xd9", "MPO": b"\xff\xd9", "PNG": b"IEND"}
+
+
+def _rejected(warning: str) -> dict:
+    return {"safe_to_infer": False, "quality_score": 0.0, "warnings": [warning]}
+
+
+def _too_small(w: int, h: int) -> str:
+    return f"Image too small: {w}x{h} (min {MIN_DIMENSION} required)"
+
+
+def decode_failure(error: Exception) -> dict:
+    """QA result for an upload that could not be decoded."""
+    return _rejected(f"Could not open image: {error}")
+
+
+def check_header(data) -> Optional[dict]:
+    """
+    Pre-QA on raw upload bytes that reads only the image header; no pixels are decoded.
+    Returns the failed QA result for a payload that is not a PNG/JPEG, is truncated, or is
+    smaller than MIN_DIMENSION, and None when the image should go on to decode and run().
+    """
+    data = bytes(data) if isinstance(data, memoryview) else data
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            fmt, (w, h) = img.format, img.size
+            # Image.open stops at the first scan (JPEG) or IDAT chunk (PNG).
+            header_end = img.fp.tell()
+    except Exception as e:
+        return decode_failure(e)
+    if fmt not in END_MARKERS:
+        return _rejected(f"Unsupported image format: {fmt}")
+    if data.rfind(END_MARKERS[fmt], header_end) == -1:
+        return _rejected("Image file is truncated")
+    if min(w, h) < MIN_DIMENSION:
+        return _rejected(_too_small(w, h))
+    return None
+
 
-def run(image_path: str) -> dict:
+def draft_std_error(ctx: ImageContext) -> float:
     """
-    Run QA checks on image. Returns {safe_to_infer, quality_score, warnings}.
+    Estimated contrast std a draft decode lost (0.0 when ctx was decoded in full). The
+    variance one more 2x reduction of the draft removes is taken as the loss of each halving
+    the draft skipped: smooth MRI content loses almost nothing, fine texture and noise a lot.
+    """
+    halvings = math.log2(ctx.size[0] / ctx.image.size[0])
+    if halvings <= 0:
+        return 0.0
+    _, std = ctx.intensity_stats
+    _, coarser = ImageContext(ctx.image.reduce(2)).intensity_stats
+    return math.sqrt(std ** 2 + halvings * max(std ** 2 - coarser ** 2, 0.0)) - std
+
+
+def decode_for_stats(source, draft_size: int = STATS_DRAFT_SIZE) -> ImageContext:
+    """
+    ImageContext.from_source(source, draft_size), decoded again in full when the draft would
+    shift the contrast std by more than DRAFT_STD_TOLERANCE (see draft_std_error).
+    """
+    position = source.tell() if hasattr(source, "seek") else None
+    ctx = ImageContext.from_source(source, draft_size=draft_size)
+    if draft_std_error(ctx) <= DRAFT_STD_TOLERANCE:
+        return ctx
+    if position is not None:
+        source.seek(position)
+    return ImageContext.from_source(source)
+
+
+def run(image) -> dict:
+    """
+    Run QA checks on image (ImageContext, or anything ImageContext.from_source accepts).
+    An ImageContext is used as is; other input is decoded at draft resolution when that
+    keeps the statistics within tolerance (decode_for_stats).
+    Returns {safe_to_infer, quality_score, warnings}, plus metrics (agent.qa_metrics) and
+    metrics_ms (time per metric) for images large enough to analyze.
     """
     warnings = []
     try:
-        img = Image.open(image_path).convert("RGB")
+        ctx = decode_for_stats(image)
     except Exception as e:
-        return {
-            "safe_to_infer": False,
-            "quality_score": 0.0,
-            "warnings": [f"Could not open image: {e}"],
-        }
-    w, h = img.size
-    arr = np.array(img) / 255.0
-    mean_val = float(np.mean(arr))
-    std_val = float(np.std(arr))
-
-    if min(w, h) < 150:
-        warnings.append(f"Image too small: {w}x{h} (min 150 required)")
-    if mean_val < 0.15:
+        return decode_failure(e)
+    w, h = ctx.size
+    start = time.perf_counter()
+    mean_val, std_val = ctx.intensity_stats
+    intensity_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    if min(w, h) < MIN_DIMENSION:
+        warnings.append(_too_small(w, h))
+    if mean_val < DARK_MEAN:
         warnings.append("Image too dark")
-    if mean_val > 0.90:
+    if mean_val > BRIGHT_MEAN:
         warnings.append("Image too bright")
-    if std_val < 0.05:
+    if std_val < LOW_CONTRAST_STD:
         warnings.append("Low contrast")
 
-    safe_to_infer = min(w, h) >= 150
+    safe_to_infer = min(w, h) >= MIN_DIMENSION
     quality_score = float(np.clip(std_val, 0.0, 1.0))
 
-    return {
+    result = {
         "safe_to_infer": safe_to_infer,
         "quality_score": quality_score,
         "warnings": warnings,
     }
+    if safe_to_infer:
+        metrics, metrics_ms = qa_metrics.measure(ctx)
+        warnings.extend(qa_metrics.warnings_for(metrics))
+        result["metrics"] = {"brightness": round(mean_val, 5), "contrast": round(std_val, 5), **metrics}
+        result["metrics_ms"] = {"intensity": intensity_ms, **metrics_ms, "total": round(intensity_ms + metrics_ms["total"], 3)}
+    return result
@@ -0,0 +1,118 @@
+"""
+Extended QA metrics: blur, noise, clipping and a grayscale check, computed together from the
+ImageContext's downsampled qa_buffer so the extra checks cost about as much as the basic ones.
+"""
+import time
+from typing import Dict, Tuple
+
+import numpy as np
+
+from agent.image_context import ImageContext
+
+# Warning thresholds, calibrated on image_data/images and blurred (Gaussian, radius 3), noisy
+# (sigma 15) and tinted copies of them (tests/test_qa_metrics.py).
+# Blur is the variance of the 4-neighbour Laplacian on the 8-bit scale; noise is a standard
+# deviation in [0, 1] (Immerkaer's estimator); the rest are fractions of buffer pixels.
+BLUR_MIN_LAPLACIAN_VAR = 30.0
+NOISE_MAX_SIGMA = 0.022
+CLIPPED_HIGH_MAX = 0.10
+COLOR_FRACTION_MAX = 0.05
+
+# A pixel is clipped at or beyond these luma levels, and coloured when its Cb or Cr chroma is
+# more than COLOR_SPREAD from neutral. MRI background is legitimately black, so only
+# highlights raise a warning.
+CLIP_LOW_LEVEL = 5
+CLIP_HIGH_LEVEL = 250
+COLOR_SPREAD = 24
+
+_CHROMATIC = np.abs(np.arange(256) - 128) > COLOR_SPREAD
+
+
+def _laplacian_and_noise(gray: np.ndarray) -> Tuple[float, float]:
+    """
+    Variance of the 4-neighbour Laplacian and Immerkaer's noise sigma (8-bit scale). Both
+    kernels are built from the same shifted views, in int16 (their range fits).
+    """
+    center4 = gray[1:-1, 1:-1] * 4
+    edges = gray[:-2, 1:-1] + gray[2:, 1:-1]
+    edges += gray[1:-1, :-2]
+    edges += gray[1:-1, 2:]
+    laplacian = (edges - center4).astype(np.float32).ravel()
+    n = laplacian.size
+    mean = float(laplacian.sum()) / n
+    blur = float(np.dot(laplacian, laplacian)) / n - mean * mean
+
+    # Immerkaer: [[1,-2,1],[-2,4,-2],[1,-2,1]] = corners - 2 * edges + 4 * center.
+    residual = gray[:-2, :-2] + gray[:-2, 2:]
+    residual += gray[2:, :-2]
+    residual += gray[2:, 2:]
+    residual -= edges
+    residual -= edges
+    residual += center4
+    np.abs(residual, out=residual)
+    noise = np.sqrt(np.pi / 2) * float(residual.sum(dtype=np.int64)) / n / 6
+    return blur, noise
+
+
+def measure(ctx: ImageContext) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """
+    Compute every extended metric from one YCbCr conversion of ctx.qa_buffer: luma feeds blur,
+    noise and clipping, the chroma histograms the grayscale check.
+    Returns (metrics, metrics_ms): the values, and the milliseconds spent on each.
+    """
+    timings = {}
+    start = last = time.perf_counter()
+
+    def lap(name):
+        nonlocal last
+        now = time.perf_counter()
+        timings[name] = round((now - last) * 1000, 3)
+        last = now
+
+    ycc = ctx.qa_buffer.convert("YCbCr")
+    luma_hist, cb_hist, cr_hist = np.asarray(ycc.histogram(), dtype=np.int64).reshape(3, 256)
+    gray = np.asarray(ycc.getchannel(0), dtype=np.int16)
+    lap("buffer")
+
+    blur, noise = _laplacian_and_noise(gray)
+    lap("blur_noise")
+
+    pixels = gray.size
+    clipped_high = float(luma_hist[CLIP_HIGH_LEVEL:].sum()) / pixels
+    clipped_low = float(luma_hist[: CLIP_LOW_LEVEL + 1].sum()) / pixels
+    color_fraction = max(float(cb_hist[_CHROMATIC].sum()), float(cr_hist[_CHROMATIC].sum())) / pixels
+    lap("histogram")
+
+    timings["total"] = round((last - start) * 1000, 3)
+    metrics = {
+        "blur_laplacian_var": round(blur, 3),
+        "noise_sigma": round(noise / 255, 5),
+        "clipped_high": round(clipped_high, 5),
+        "clipped_low": round(clipped_low, 5),
+        "color_fraction": round(color_fraction, 5),
+    }
+    return metrics, timings
+
+
+def warnings_for(metrics: Dict[str, float]) -> list:
+    """Warnings for metrics beyond their thresholds. None of them blocks inference."""
+    warnings = []
+    if metrics["blur_laplacian_var"] < BLUR_MIN_LAPLACIAN_VAR:
+        warnings.append("Image looks blurry")
+    if metrics["noise_sigma"] > NOISE_MAX_SIGMA:
+        warnings.append("Image looks noisy")
+    if metrics["clipped_high"] > CLIPPED_HIGH_MAX:
+        warnings.append("Highlights are clipped")
+    if metrics["color_fraction"] > COLOR_FRACTION_MAX:
+        warnings.append("Image is not grayscale; expected an MRI slice")
+    return warnings
+
+
+def thresholds() -> Dict[str, float]:
+    """Thresholds that change QA results; part of the result cache key."""
+    return {
+        "qa_blur_min_laplacian_var": BLUR_MIN_LAPLACIAN_VAR,
+        "qa_noise_max_sigma": NOISE_MAX_SIGMA,
+        "qa_clipped_high_max": CLIPPED_HIGH_MAX,
+        "qa_color_fraction_max": COLOR_FRACTION_MAX,
+    }
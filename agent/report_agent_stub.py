@@ -1,6 +1,8 @@
 """Report agent stub: deterministic report generation (no LLM)."""
 from typing import Any, Dict
 
+from agent.safety_gate import CONFIDENCE_THRESHOLD
+
 
 def run(qa: Dict[str, Any], vision: Dict[str, Any]) -> dict:
     """
@@ -20,7 +22,7 @@ def run(qa: Dict[str, Any], vision: Dict[str, Any]) -> dict:
     label = vision.get("label", "unknown")
     confidence = vision.get("confidence", 0.0)
 
-    if confidence < 0.60:
+    if confidence < CONFIDENCE_THRESHOLD:
         return {
             "findings": f"Model prediction: {label} (confidence {confidence:.2f}). Quality score: {qa.get('quality_score', 0):.2f}.",
             "impression": "Uncertain classification",
@@ -3,6 +3,7 @@ from typing import Any, Dict
 
 
 DISCLAIMER = "Educational demo only. Not medical advice."
+CONFIDENCE_THRESHOLD = 0.60
 
 
 def apply(qa: Dict[str, Any], vision: Dict[str, Any], report: Dict[str, Any]) -> Dict[str, Any]:
@@ -18,7 +19,7 @@ def apply(qa: Dict[str, Any], vision: Dict[str, Any], report: Dict[str, Any]) ->
         result["findings"] = "; ".join(qa.get("warnings", []) or ["Image quality insufficient for analysis."])
         result["next_steps"] = ["Obtain higher quality image.", "Consult a healthcare provider for clinical evaluation."]
 
-    elif vision and vision.get("confidence", 0) < 0.60:
+    elif vision and vision.get("confidence", 0) < CONFIDENCE_THRESHOLD:
         result["impression"] = "Uncertain classification"
         result["urgency"] = "medium"
         result["findings"] = f"Model prediction: {vision.get('label', 'unknown')} (confidence {vision.get('confidence', 0):.2f}). Quality score: {qa.get('quality_score', 0):.2f}."
@@ -8,6 +8,8 @@ class QAResult:
     safe_to_infer: bool
     quality_score: float
     warnings: List[str]
+    metrics: Dict[str, float] = field(default_factory=dict)
+    metrics_ms: Dict[str, float] = field(default_factory=dict)
 
 
 @dataclass
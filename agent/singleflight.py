@@ -0,0 +1,47 @@
+"""Single-flight: concurrent calls with the same key share one in-flight computation."""
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent work across threads of one process.
+    The first caller for a key runs fn; callers arriving while it runs wait for and share its result
+    (or its exception). Nothing is remembered once the call finishes - that is the cache's job.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (result, shared). shared is True when the result came from another caller's run."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.shared += 1
+                leader = False
+            else:
+                future = Future()
+                self._calls[key] = future
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            future.set_result(fn())
+        except BaseException as exc:
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result(), False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": len(self._calls), "leaders": self.leaders, "shared": self.shared}
@@ -0,0 +1,139 @@
+"""
+Study-level aggregation: combines slice probabilities into one study label as slices are
+scored, and says when the study is clear enough to skip the slices not yet scored.
+"""
+import heapq
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping
+
+# mean: average slice probability per class. max: highest slice probability per class
+# (one convincing slice decides). topk: average of each class's top_k slice probabilities.
+RULES = ("mean", "max", "topk")
+
+DEFAULT_AGGREGATION = os.getenv("STUDY_AGGREGATION", "mean")
+DEFAULT_TOP_K = int(os.getenv("STUDY_TOP_K", "3"))
+# Stop a mean-aggregated study once its confidence reaches this (0 scores every slice) ...
+DEFAULT_EARLY_STOP = float(os.getenv("STUDY_EARLY_STOP", "0"))
+# ... after at least this many analyzed slices; also the pass size while early stop is on.
+DEFAULT_MIN_SLICES = int(os.getenv("STUDY_MIN_SLICES", "8"))
+
+
+@dataclass(frozen=True)
+class StudyRule:
+    aggregation: str = DEFAULT_AGGREGATION
+    top_k: int = DEFAULT_TOP_K
+    early_stop: float = DEFAULT_EARLY_STOP
+    min_slices: int = DEFAULT_MIN_SLICES
+
+    def __post_init__(self):
+        if self.aggregation not in RULES:
+            raise ValueError(f"Unknown aggregation {self.aggregation!r}; expected one of {', '.join(RULES)}")
+        if self.top_k < 1:
+            raise ValueError("top_k must be at least 1")
+        if not 0 <= self.early_stop <= 1:
+            raise ValueError("early_stop must be between 0 and 1")
+        if self.early_stop and self.aggregation != "mean":
+            # max and topk scores only grow as slices are added, so reaching the threshold
+            # says nothing about whether a later slice would change the label.
+            raise ValueError("early_stop needs aggregation=mean")
+        if self.min_slices < 1:
+            raise ValueError("min_slices must be at least 1")
+
+    @classmethod
+    def from_values(cls, values: Mapping[str, str]) -> "StudyRule":
+        """
+        A rule from request values (aggregation, top_k, early_stop); missing ones keep the
+        defaults, except that the default early stop does not carry over to max or topk.
+        """
+        fields = {}
+        try:
+            if values.get("aggregation"):
+                fields["aggregation"] = values["aggregation"].lower()
+                if fields["aggregation"] != "mean":
+                    fields["early_stop"] = 0.0
+            if values.get("top_k"):
+                fields["top_k"] = int(values["top_k"])
+            if values.get("early_stop"):
+                fields["early_stop"] = float(values["early_stop"])
+        except ValueError as e:
+            raise ValueError(f"Invalid study parameter: {e}") from None
+        return cls(**fields)
+
+    def settings(self) -> Dict[str, Any]:
+        settings: Dict[str, Any] = {"aggregation": self.aggregation}
+        if self.aggregation == "topk":
+            settings["top_k"] = self.top_k
+        if self.early_stop:
+            settings.update(early_stop=self.early_stop, min_slices=self.min_slices)
+        return settings
+
+
+class StudyAggregator:
+    """
+    Running study summary. add() takes one slice's vision result and costs O(classes), so the
+    label can be checked after every pass without revisiting earlier slices.
+    """
+
+    def __init__(self, class_labels: List[str], rule: StudyRule = StudyRule()):
+        self.class_labels = list(class_labels)
+        self.rule = rule
+        self.num_analyzed = 0
+        self._sums = {label: 0.0 for label in self.class_labels}
+        self._maxes = {label: 0.0 for label in self.class_labels}
+        self._top: Dict[str, List[float]] = {label: [] for label in self.class_labels}
+        self._label_counts = {label: 0 for label in self.class_labels}
+
+    def add(self, vision: Dict[str, Any]) -> None:
+        self.num_analyzed += 1
+        self._label_counts[vision["label"]] += 1
+        for label in self.class_labels:
+            p = float(vision["probs"][label])
+            self._sums[label] += p
+            self._maxes[label] = max(self._maxes[label], p)
+            top = self._top[label]
+            if len(top) < self.rule.top_k:
+                heapq.heappush(top, p)
+            elif p > top[0]:
+                heapq.heapreplace(top, p)
+
+    def scores(self) -> Dict[str, float]:
+        """Per-class study scores under the rule (only mean scores sum to 1). Empty before any slice."""
+        if not self.num_analyzed:
+            return {}
+        if self.rule.aggregation == "max":
+            return dict(self._maxes)
+        if self.rule.aggregation == "topk":
+            return {label: sum(top) / len(top) for label, top in self._top.items()}
+        return {label: s / self.num_analyzed for label, s in self._sums.items()}
+
+    def decisive(self) -> bool:
+        """True when early stop is on, enough slices are analyzed and the study confidence reached it."""
+        if not self.rule.early_stop or self.num_analyzed < self.rule.min_slices:
+            return False
+        return max(self.scores().values()) >= self.rule.early_stop
+
+    def summary(self, num_slices: int, num_rejected: int, stopped_early: bool = False) -> Dict[str, Any]:
+        summary: Dict[str, Any] = {
+            "num_slices": num_slices,
+            "num_analyzed": self.num_analyzed,
+            "num_rejected": num_rejected,
+            "num_skipped": num_slices - self.num_analyzed - num_rejected,
+            "label_counts": dict(self._label_counts),
+            "label": None,
+            "confidence": None,
+            "mean_probs": None,
+            "scores": None,
+            "rule": self.rule.settings(),
+            "stopped_early": stopped_early,
+        }
+        if self.num_analyzed:
+            scores = self.scores()
+            label = max(scores, key=scores.get)
+            summary.update(
+                label=label,
+                confidence=scores[label],
+                mean_probs={label: s / self.num_analyzed for label, s in self._sums.items()},
+                scores=scores,
+            )
+        return summary
@@ -1,29 +1,150 @@
 """Vision agent: TensorFlow model inference."""
 import gc
+from typing import List, Optional, Sequence
+
 import numpy as np
 
-from ml.preprocess import preprocess_image
+from agent.image_context import ImageContext
+from ml import heatmap, tta
+from ml.preprocess import DRAFT_SIZE, preprocess_batch
 
 # Model output order: glioma, meningioma, no_tumor, pituitary (synced with image_data folder names)
 CLASS_LABELS = ["glioma", "meningioma", "no_tumor", "pituitary"]
 
+# Default number of slices stacked into one forward pass by run_batch().
+DEFAULT_BATCH_SIZE = 32
+
+
+def _to_result(preds, class_labels: list) -> dict:
+    probs = {k: float(v) for k, v in zip(class_labels, preds)}
+    idx = int(np.argmax(preds))
+    return {"label": class_labels[idx], "confidence": float(preds[idx]), "probs": probs}
+
+
+def _tta_result(preds, class_labels: list, views: Sequence[str]) -> dict:
+    """Result from one image's per-view probabilities: mean probs plus their spread across views."""
+    mean, std, agreement = tta.aggregate(preds)
+    result = _to_result(mean, class_labels)
+    result["probs_std"] = {k: float(v) for k, v in zip(class_labels, std)}
+    result["tta"] = {
+        "views": list(views),
+        "agreement": agreement,
+        "confidence_std": float(std[int(np.argmax(mean))]),
+    }
+    return result
+
+
+def _score(batch, model, explain: bool):
+    """(probs, heatmaps or None) for a preprocessed batch, from one forward pass."""
+    if explain:
+        return model.explain(batch)
+    return model.predict(batch, verbose=0), None
 
-def run(image_path: str, model, class_labels: list = None) -> dict:
+
+def _results(preds, cams, class_labels: list, views: Optional[Sequence[str]]) -> List[dict]:
+    """
+    One result per image from rows grouped per image (one row each, or len(views) with TTA).
+    The explanation is the heatmap of the original (first) view for that view's top class.
     """
-    Run vision inference. Returns {label, confidence, probs}.
-    Uses no_tumor (underscore) in label keys.
+    group = len(views) if views else 1
+    results = []
+    for start in range(0, len(preds), group):
+        rows = preds[start:start + group]
+        result = _tta_result(rows, class_labels, views) if views else _to_result(rows[0], class_labels)
+        if cams is not None:
+            result["explanation"] = heatmap.artifact(cams[start], class_labels[int(np.argmax(rows[0]))])
+        results.append(result)
+    return results
+
+
+def run(
+    image,
+    model,
+    class_labels: list = None,
+    explain: bool = False,
+    tta_views: Optional[Sequence[str]] = None,
+) -> dict:
+    """
+    Run vision inference on an ImageContext (or a path, file-like, or PIL image).
+    Returns {label, confidence, probs}. Uses no_tumor (underscore) in label keys.
+    model is anything with predict(batch, verbose=0); the app passes an ml.serving.ServingModel.
+    The image is preprocessed into this thread's reusable batch buffer.
+    With explain, model.explain() scores the image and returns the Grad-CAM heatmap of the
+    predicted class from the same forward pass; the result gains an "explanation" artifact.
+    With tta_views (see ml.tta.view_names), the image and its augmented views are scored in
+    one batch: probs is their mean, probs_std the spread across views, tta the views used,
+    the fraction agreeing with the label and the label's std.
     """
     if class_labels is None:
         class_labels = CLASS_LABELS
-    processed = preprocess_image(image_path)
+    image = ImageContext.from_source(image).image
+    processed = tta.preprocess_views([image], tta_views) if tta_views else preprocess_batch([image])
     try:
-        preds = model.predict(processed, verbose=0)[0]
-        probs = {k: float(v) for k, v in zip(class_labels, preds)}
-        idx = int(np.argmax(preds))
-        label = class_labels[idx]
-        confidence = float(preds[idx])
-        return {"label": label, "confidence": confidence, "probs": probs}
+        preds, cams = _score(processed, model, explain)
+        return _results(preds, cams, class_labels, tta_views)[0]
     finally:
         # Free per-request arrays promptly on low-memory deployments.
         del processed
         gc.collect()
+
+
+def run_batch(
+    images: Sequence,
+    model,
+    class_labels: list = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    explain: bool = False,
+    tta_views: Optional[Sequence[str]] = None,
+) -> List[dict]:
+    """
+    Run vision inference on many images, stacking up to batch_size per forward pass.
+    images may be ImageContexts or anything ImageContext.from_source accepts. Each chunk is
+    preprocessed straight into this thread's reusable batch buffer.
+    Returns one {label, confidence, probs} per image. With explain, each chunk goes through
+    one model.explain() pass (one GradientTape for the chunk) and every result gains an
+    "explanation" artifact. With tta_views, a forward pass holds batch_size // len(views)
+    images with all their views (at least one image).
+    """
+    per_pass = images_per_pass(batch_size, tta_views)
+    results = []
+    for start in range(0, len(images), per_pass):
+        results.extend(run_pass(images[start:start + per_pass], model, class_labels, explain, tta_views))
+    gc.collect()
+    return results
+
+
+def images_per_pass(batch_size: int, tta_views: Optional[Sequence[str]] = None) -> int:
+    """Images per forward pass for batch_size model rows: each image takes len(tta_views) rows with TTA."""
+    return max(1, batch_size // len(tta_views)) if tta_views else batch_size
+
+
+def run_pass(
+    images: Sequence,
+    model,
+    class_labels: list = None,
+    explain: bool = False,
+    tta_views: Optional[Sequence[str]] = None,
+) -> List[dict]:
+    """
+    One forward pass of run_batch() over all of images, so callers that stream images can
+    check results between passes. Does not collect garbage; run_batch does after its last pass.
+    """
+    if class_labels is None:
+        class_labels = CLASS_LABELS
+    chunk_images = [ImageContext.from_source(img).image for img in images]
+    chunk = tta.preprocess_views(chunk_images, tta_views) if tta_views else preprocess_batch(chunk_images)
+    preds, cams = _score(chunk, model, explain)
+    return _results(preds, cams, class_labels, tta_views)
+
+
+def render_overlay(image, model) -> bytes:
+    """
+    PNG of the Grad-CAM overlay for the image's predicted class, blended over the 224x224
+    model input (as the Gradio Space draws it). model must support explain(). Raw bytes are
+    decoded as the orchestrator decodes them, so the model sees the same input as in the analysis.
+    """
+    batch = preprocess_batch([ImageContext.from_source(image, draft_size=DRAFT_SIZE).image])
+    _, cams = model.explain(batch)
+    # The model input is the resized image scaled by 1/255; rounding recovers its pixels exactly.
+    base = np.rint(batch[0] * 255).astype(np.uint8)
+    return heatmap.overlay_png(base, cams[0])
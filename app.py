@@ -1,14 +1,53 @@
-from flask import Flask, Response, jsonify, render_template, request, redirect, url_for
+from flask import (
+    Flask,
+    Response,
+    after_this_request,
+    jsonify,
+    render_template,
+    request,
+    redirect,
+    stream_with_context,
+    url_for,
+)
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 import gc
+import hmac
+import io
+import json
 import logging
 import os
+import threading
+import time
 import uuid
-import tensorflow as tf
-
-from agent.orchestrator import run as orchestrate
-
+import zipfile
+import zlib
+from contextlib import contextmanager
+
+from agent.heatmap_store import HeatmapStore
+from agent.jobs import JobManager, QueueFullError
+from agent.orchestrator import (
+    HEADER_UNCHECKED,
+    analysis_thresholds,
+    replay_stages,
+    run as orchestrate,
+    run_batch as orchestrate_batch,
+    run_cached as orchestrate_cached,
+)
+from agent.qa_agent import check_header as qa_check_header
+from agent.result_cache import ResultCache, cache_key
+from agent.singleflight import SingleFlight
+from agent.study import StudyRule
+from agent.vision_agent_tf import render_overlay
+from ml import tta
+from ml.batching import MicroBatcher
+from ml.heatmap import supports_explain
+from ml.inference_pool import InferencePool
+from ml.registry import BACKENDS, ModelHandle, ModelRegistry, ReloadInProgress, resolve_backend
+from ml.warmup import Warmup, synthetic_scan
+
+STARTED_AT = time.time()
 app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
@@ -17,6 +56,12 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "static", "uploads")
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
 MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5 MB
+# Whole-study uploads (many slices or one zip) get their own, larger body limit.
+BATCH_MAX_CONTENT_LENGTH = int(os.getenv("BATCH_MAX_CONTENT_MB", "100")) * 1024 * 1024
+BATCH_MAX_SLICES = int(os.getenv("BATCH_MAX_SLICES", "256"))
+# Uploads are analyzed from memory; copying them to static/uploads happens after the
+# response is sent and can be switched off entirely.
+PERSIST_UPLOADS = os.getenv("PERSIST_UPLOADS", "1") == "1"
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
@@ -32,40 +77,639 @@ def api_error(code: str, message: str, status: int = 400):
     return jsonify({"error": {"code": code, "message": message}}), status
 
 
+class UploadError(Exception):
+    """Invalid upload or unservable request; carries the api_error code, message and HTTP status."""
+
+    def __init__(self, code: str, message: str, status: int = 400):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+def _write_upload(data: bytes, image_path: str):
+    try:
+        with open(image_path, "wb") as f:
+            f.write(data)
+    except OSError as e:
+        logging.warning("Could not persist upload %s: %s", image_path, e)
+
+
+def _persist_upload(data: bytes, filename: str, header_qa) -> str:
+    """
+    Schedule writing the upload to static/uploads once the response has been sent.
+    Returns the URL the file will be served from, or "" when persistence is disabled or the
+    header pre-QA already rejects the upload (not an image, truncated, too small).
+    header_qa is qa_check_header(data); the caller passes the same result to analyze_upload.
+    """
+    if not PERSIST_UPLOADS or header_qa is not None:
+        return ""
+    safe_name = f"{uuid.uuid4()}_{filename}"
+    image_path = os.path.join(app.config["UPLOAD_FOLDER"], safe_name)
+
+    @after_this_request
+    def _write_after_response(response):
+        response.call_on_close(lambda: _write_upload(data, image_path))
+        return response
+
+    return url_for("static", filename=f"uploads/{safe_name}")
+
+
+def check_image_filename(filename: str) -> str:
+    """Validate the client filename of an 'image' upload; return its secure form or raise UploadError."""
+    if filename == "":
+        raise UploadError("EMPTY_FILENAME", "No file selected.")
+
+    if not allowed_file(filename):
+        raise UploadError("UNSUPPORTED_EXTENSION", "Invalid file type. Allowed: PNG, JPG, JPEG.")
+
+    safe_name = secure_filename(filename)
+    if safe_name == "":
+        raise UploadError("INVALID_FILENAME", "Invalid filename.")
+    return safe_name
+
+
+def _validate_image_upload():
+    """Return (secure filename, FileStorage) for the single 'image' field, or raise UploadError."""
+    if "image" not in request.files:
+        raise UploadError("MISSING_FILE", "No file selected. Use multipart form field 'image'.")
+
+    image = request.files["image"]
+    return check_image_filename(image.filename), image
+
+
+def _read_zip_slices(archive):
+    """
+    Return (filename, bytes) for every allowed image inside a zip upload. The decompressed
+    images may not add up to more than the batch body limit, so a small, highly compressed
+    archive cannot expand past what an uncompressed upload could send.
+    """
+    try:
+        zf = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        raise UploadError("INVALID_ARCHIVE", "Archive is not a valid zip file.")
+    slices = []
+    total = 0
+    with zf:
+        for info in sorted(zf.infolist(), key=lambda i: i.filename):
+            name = os.path.basename(info.filename)
+            if info.is_dir() or name.startswith(".") or not allowed_file(name):
+                continue
+            if info.file_size > MAX_CONTENT_LENGTH:
+                raise UploadError(
+                    "FILE_TOO_LARGE", f"Slice {name} exceeds the 5 MB per-image limit.", 413
+                )
+            if len(slices) >= BATCH_MAX_SLICES:
+                raise UploadError("TOO_MANY_SLICES", f"At most {BATCH_MAX_SLICES} slices per request.")
+            total += info.file_size
+            if total > BATCH_MAX_CONTENT_LENGTH:
+                limit_mb = BATCH_MAX_CONTENT_LENGTH // (1024 * 1024)
+                raise UploadError("FILE_TOO_LARGE", f"Archive expands to more than {limit_mb} MB.", 413)
+            try:
+                data = zf.read(info)
+            except (zipfile.BadZipFile, RuntimeError, NotImplementedError, zlib.error):
+                # Bad CRC, encrypted entry or unsupported compression method.
+                raise UploadError("INVALID_ARCHIVE", f"Archive entry {name} cannot be read.")
+            slices.append((secure_filename(name) or name, data))
+    return slices
+
+
+def _read_batch_slices():
+    """Collect (filename, bytes) pairs from multipart 'images' files and/or a zip 'archive'."""
+    files = [f for f in request.files.getlist("images") if f.filename]
+    archive = request.files.get("archive")
+    if not files and (archive is None or archive.filename == ""):
+        raise UploadError(
+            "MISSING_FILE", "No files selected. Use multipart field 'images' (repeated) or 'archive' (zip)."
+        )
+
+    slices = []
+    if archive is not None and archive.filename:
+        slices.extend(_read_zip_slices(io.BytesIO(archive.read())))
+    for f in files:
+        if not allowed_file(f.filename):
+            raise UploadError(
+                "UNSUPPORTED_EXTENSION", f"Invalid file type for {f.filename}. Allowed: PNG, JPG, JPEG."
+            )
+        data = f.read()
+        if len(data) > MAX_CONTENT_LENGTH:
+            raise UploadError("FILE_TOO_LARGE", f"Slice {f.filename} exceeds the 5 MB per-image limit.", 413)
+        slices.append((secure_filename(f.filename) or f.filename, data))
+
+    if not slices:
+        raise UploadError("EMPTY_BATCH", "No PNG, JPG, or JPEG images found in the upload.")
+    if len(slices) > BATCH_MAX_SLICES:
+        raise UploadError("TOO_MANY_SLICES", f"At most {BATCH_MAX_SLICES} slices per request.")
+    return slices
+
+
 # Load the pre-trained model (graceful failure so server can start).
 # Model path is absolute and rooted at BASE_DIR to avoid cwd-related failures.
-model_path = os.path.join(BASE_DIR, "models", "Brain_Tumors_vgg_final.h5")
+model_path = os.getenv("MODEL_PATH", os.path.join(BASE_DIR, "models", "Brain_Tumors_vgg_final.h5"))
 model = None
-try:
-    model = tf.keras.models.load_model(model_path)
-except Exception as e:
-    model = None
-    logging.exception("Model load failed for %s: %s", model_path, e)
-else:
-    logging.info("Startup: TensorFlow model loaded from %s", model_path)
+# Run inference in N separate model processes instead of inline in the request thread.
+# The web process then holds no weights and can scale threads for I/O independently.
+INFERENCE_PROCESSES = int(os.getenv("INFERENCE_PROCESSES", "0"))
+# Serve through a traced tf.function rather than model.predict(), warmed up at load time
+# for the batch sizes requests actually use (single image, micro-batch).
+SERVING_FUNCTION = os.getenv("SERVING_FUNCTION", "1") == "1"
+SERVING_WARMUP_BATCH_SIZES = tuple(
+    int(n) for n in os.getenv("SERVING_WARMUP_BATCH_SIZES", "1,8").split(",") if n.strip()
+)
+# "keras" serves MODEL_PATH through TensorFlow; "tflite" serves a converted flatbuffer
+# (python -m ml.convert_tflite) with the TFLite interpreter and its XNNPACK CPU kernels.
+# MODEL_VARIANT picks a quantized build from python -m ml.quantize (dynamic, float16, int8)
+# and implies the tflite backend.
+MODEL_VARIANT = os.getenv("MODEL_VARIANT", "")
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "tflite" if MODEL_VARIANT else "keras")
+_variant_suffix = f".{MODEL_VARIANT}" if MODEL_VARIANT else ""
+TFLITE_MODEL_PATH = os.getenv("TFLITE_MODEL_PATH", os.path.splitext(model_path)[0] + _variant_suffix + ".tflite")
+TFLITE_THREADS = int(os.getenv("TFLITE_THREADS", "0")) or None  # 0: one per CPU core
+served_model_path = TFLITE_MODEL_PATH if MODEL_BACKEND == "tflite" else model_path
+
+
+def _model_file_version(path: str) -> str:
+    """Identify a weights file by name, size and mtime (cheap; no hashing of the file)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return "unavailable"
+    return f"{os.path.basename(path)}:{st.st_size}:{int(st.st_mtime)}"
+
+
+def _default_model_path(backend: str) -> str:
+    if backend == MODEL_BACKEND:
+        return served_model_path
+    return TFLITE_MODEL_PATH if backend == "tflite" else model_path
+
+
+def build_model_handle(backend: str = None, path: str = None) -> ModelHandle:
+    """Load a model with a named backend (default: the configured one) as a process pool or in-process."""
+    backend = backend or MODEL_BACKEND
+    path = path or _default_model_path(backend)
+    option = {"keras": SERVING_FUNCTION, "tflite": TFLITE_THREADS}.get(backend)
+    loader_args = (path, SERVING_WARMUP_BATCH_SIZES, option)
+    try:
+        if INFERENCE_PROCESSES > 0:
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown model backend {backend!r}")
+            if not os.path.exists(path):
+                raise FileNotFoundError(path)
+            loaded = InferencePool(BACKENDS[backend], loader_args, INFERENCE_PROCESSES)
+        else:
+            # TensorFlow (or the TFLite interpreter) is imported here, on first load, not
+            # when the web app is imported.
+            loaded = resolve_backend(backend)(*loader_args)
+    except Exception:
+        print(f"Startup check: model_loaded=False path={path} pid={os.getpid()}")
+        raise
+    return ModelHandle(loaded, backend, _model_file_version(path), path)
+
+
+def _publish_model(loaded):
+    """Make a freshly loaded model the one requests use, then warm it up (unless a reload already did)."""
+    global model, warmup
+    model = loaded
+    handle = model_registry.current
+    logging.info("Startup: %s model loaded from %s", handle.backend, handle.path)
+    print(f"Startup check: model_loaded=True path={handle.path} pid={os.getpid()}")
+    if handle.prepared is not None:
+        warmup = handle.prepared
+    else:
+        start_warmup()
+
+
+def _retire_model(handle: ModelHandle) -> None:
+    """A replaced model has finished its last request: stop its micro-batcher."""
+    batcher = _batchers.pop(id(handle.model), None)
+    if batcher is not None:
+        batcher.close()
+
+
+# "background" (default) loads on a thread so pages, /livez and /healthz answer at once;
+# "eager" blocks the import until the model is loaded.
+MODEL_LOAD = os.getenv("MODEL_LOAD", "background")
+model_registry = ModelRegistry(build_model_handle, _publish_model, _retire_model)
+
+
+def load_model(background: bool = None):
+    """Load the model into this process. Called at import, or per worker after fork (gunicorn preload)."""
+    if background is None:
+        background = MODEL_LOAD == "background"
+    model_registry.load(background=background)
+
+
+def model_unavailable_message() -> str:
+    if model_registry.loading:
+        return "Model is still loading. Retry shortly."
+    return "Model is not available on the server."
 
-logging.info("Startup: model_loaded=%s", model is not None)
-print(f"Startup check: model_loaded={model is not None} path={model_path}")
 
 CLASS_LABELS = ["glioma", "meningioma", "no_tumor", "pituitary"]
 
+# Dynamic micro-batching: concurrent requests share one forward pass. Off by default
+# because it only pays off when gunicorn runs more than one thread per worker.
+INFERENCE_BATCHING = os.getenv("INFERENCE_BATCHING", "0") == "1"
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+
+# The batcher owns a dispatch thread, which does not survive a fork: with gunicorn's
+# preload_app each worker process creates its own on first use. There is one batcher per
+# model, so a batch never mixes requests pinned to different models during a hot swap.
+_batchers = {}
+_batcher_pid = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher(target=None):
+    """Return this process's MicroBatcher for target (default: the current model), or None when batching is disabled."""
+    global _batchers, _batcher_pid
+    if not INFERENCE_BATCHING:
+        return None
+    target = model if target is None else target
+    with _batcher_lock:
+        if _batcher_pid != os.getpid():
+            _batchers = {}
+            _batcher_pid = os.getpid()
+        batcher = _batchers.get(id(target))
+        if batcher is None:
+            batcher = MicroBatcher(lambda batch: target.predict(batch, verbose=0), BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+            _batchers[id(target)] = batcher
+        return batcher
+
+
+def current_batcher(target=None):
+    """Return this process's existing MicroBatcher for target (default: the current model) without creating one."""
+    target = model if target is None else target
+    with _batcher_lock:
+        if _batcher_pid != os.getpid():
+            return None
+        return _batchers.get(id(target))
+
+
+def inference_model(target=None):
+    """Return the object the vision agent should call predict() on for target (default: the current model)."""
+    target = model if target is None else target
+    batcher = get_batcher(target)
+    return batcher if batcher is not None else target
+
+
+def _runtime_version(target) -> str:
+    """Version for a model object the registry did not load (e.g. swapped in by tests)."""
+    return "unavailable" if target is None else f"runtime-{id(target):x}"
+
+
+def current_model_version() -> str:
+    """Version of the model serving requests; a swapped-in object never shares the file's version."""
+    handle = model_registry.current
+    if handle is not None and handle.model is model:
+        return handle.version
+    return _runtime_version(model)
+
+
+@contextmanager
+def pinned_model():
+    """
+    Yield (model, version) for one request. A hot swap during the request neither changes
+    them nor closes the model until the request is done. The registry picks and pins the
+    model in one step: reading app.model first could return a model a swap closes before
+    it is pinned.
+    """
+    current, handle = model_registry.acquire_current()
+    if handle is None:
+        # Nothing loaded through the registry (tests put models straight into app.model).
+        yield model, _runtime_version(model)
+        return
+    try:
+        yield current, handle.version
+    finally:
+        model_registry.release(handle)
+
+
+# Content-hash result cache for repeated uploads (0 entries disables it). Set
+# RESULT_CACHE_PATH to an SQLite file to share entries across workers and restarts.
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_TTL_S = float(os.getenv("RESULT_CACHE_TTL_S", "3600"))
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "")
+result_cache = (
+    ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL_S, RESULT_CACHE_PATH or None)
+    if RESULT_CACHE_SIZE > 0
+    else None
+)
+
+
+# Identical uploads that are in flight at the same time share one orchestrator run.
+inflight = SingleFlight()
+
+
+EXPLAIN_UNAVAILABLE_MESSAGE = "Explanations need the keras backend with SERVING_FUNCTION=1 and INFERENCE_PROCESSES=0."
+
+
+# explain=true computes Grad-CAM heatmaps with the analysis; explain=lazy returns a
+# heatmap_url per image instead and renders the overlay when the URL is first fetched.
+EXPLAIN_MODES = {"1": "inline", "true": "inline", "yes": "inline", "lazy": "lazy"}
+
+
+def explain_mode() -> str:
+    """"inline", "lazy" or "" (no explanation) from the explain query or form value."""
+    return EXPLAIN_MODES.get(request.values.get("explain", "").lower(), "")
+
+
+# Test-time augmentation: tta=true scores each image together with flipped and shifted copies
+# in one forward pass and reports the spread across them. TTA=1 makes it the default
+# (tta=false opts out); TTA_VIEWS and TTA_SHIFT_PX pick the views (ml/tta.py).
+TTA_DEFAULT = os.getenv("TTA", "0") == "1"
+TTA_VIEWS = tta.view_names()
+
+
+def tta_views_for(value: str):
+    """The TTA views for a tta query/form value ("" uses the TTA default), or None for a single view."""
+    value = value.lower()
+    if value in ("1", "true", "yes"):
+        return TTA_VIEWS
+    if value in ("0", "false", "no"):
+        return None
+    return TTA_VIEWS if TTA_DEFAULT else None
+
+
+def tta_views_requested():
+    return tta_views_for(request.values.get("tta", ""))
+
+
+def study_rule_requested() -> StudyRule:
+    """The study aggregation rule from the aggregation, top_k and early_stop query/form values."""
+    try:
+        return StudyRule.from_values(request.values)
+    except ValueError as e:
+        raise UploadError("INVALID_STUDY_RULE", str(e))
+
+
+# Images registered by explain=lazy, kept (as upload bytes, then as the rendered PNG) in an
+# LRU bounded by HEATMAP_STORE_MB.
+HEATMAP_STORE_MB = float(os.getenv("HEATMAP_STORE_MB", "64"))
+heatmap_store = HeatmapStore(int(HEATMAP_STORE_MB * 1024 * 1024))
+HEATMAP_URL = "/api/v1/heatmaps/{}"
+
+
+def heatmap_url(data: bytes, model_version: str) -> str:
+    """Register an analyzed image for an on-demand overlay and return its URL."""
+    return HEATMAP_URL.format(heatmap_store.register(data, model_version))
+
+
+def with_heatmap_url(result, data: bytes):
+    """An analyze result with artifacts.heatmap_url when the image reached the model."""
+    if result.get("vision") is None:
+        return result
+    return dict(result, artifacts=dict(result["artifacts"], heatmap_url=heatmap_url(data, result["model_version"])))
+
+
+def render_heatmap(heatmap_id: str) -> bytes:
+    """
+    Overlay PNG for a heatmap id, rendered by the model that analyzed the image on the first
+    fetch and kept after that. Raises UploadError when it cannot be served.
+    """
+
+    def render(entry):
+        with pinned_model() as (current, version):
+            if version != entry.model_version:
+                raise UploadError(
+                    "MODEL_CHANGED", "The model that analyzed this image has been replaced. Analyze it again.", 409
+                )
+            if not supports_explain(current):
+                raise UploadError("EXPLAIN_UNAVAILABLE", EXPLAIN_UNAVAILABLE_MESSAGE, 501)
+            return render_overlay(entry.source, current)
+
+    png = heatmap_store.render(heatmap_id, render)
+    if png is None:
+        raise UploadError("HEATMAP_NOT_FOUND", "Unknown or expired heatmap. Analyze the image again.", 404)
+    return png
+
+
+def analyze_upload(
+    data: bytes, uploaded_image_url: str, on_stage=None, explain: bool = False, tta_views=None,
+    header_qa=HEADER_UNCHECKED,
+):
+    """
+    Run the orchestrator on upload bytes, through the result cache when enabled.
+    Concurrent requests for the same content wait on the first one's run.
+    on_stage receives each pipeline stage; cached and shared results replay theirs.
+    explain adds a Grad-CAM heatmap; it runs on the model itself (the Grad-CAM pass replaces
+    the prediction, so it does not join a micro-batch) and is cached under its own key.
+    tta_views (see tta_views_for) scores the image with test-time augmentation, also cached
+    under its own key. header_qa is the request's qa_check_header(data) result, if it has one.
+    """
+    start = time.perf_counter()
+    with pinned_model() as (current, version):
+        if explain and not supports_explain(current):
+            raise UploadError("EXPLAIN_UNAVAILABLE", EXPLAIN_UNAVAILABLE_MESSAGE, 501)
+        thresholds = analysis_thresholds()
+        if explain:
+            thresholds["explain"] = True
+        if tta_views:
+            thresholds["tta"] = tta.settings(tta_views)
+        key = cache_key(data, version, thresholds)
+        target = current if explain else inference_model(current)
+
+        def compute():
+            if result_cache is None:
+                return orchestrate(
+                    data, target, CLASS_LABELS, uploaded_image_url, on_stage, model_version=version,
+                    explain=explain, tta_views=tta_views, header_qa=header_qa,
+                )
+            return orchestrate_cached(
+                result_cache, key, data, target, CLASS_LABELS, uploaded_image_url, on_stage,
+                model_version=version, explain=explain, tta_views=tta_views, header_qa=header_qa,
+            )
+
+        result, shared = inflight.do(key, compute)
+    if shared:
+        replay_stages(result, on_stage)
+        result = dict(
+            result,
+            request_id=str(uuid.uuid4()),
+            artifacts={"uploaded_image_url": uploaded_image_url},
+            latency_ms=round((time.perf_counter() - start) * 1000, 2),
+        )
+    if not result["qa"].get("safe_to_infer", False):
+        result["vision"] = None
+    return result
+
+
+def analyze_study(
+    slices, on_stage=None, explain: bool = False, tta_views=None, rule: StudyRule = None, on_progress=None
+):
+    """
+    Run the study pipeline on the current model, pinned for the whole study. explain adds
+    Grad-CAM heatmaps, one explain() pass per batch of slices, on the model itself;
+    tta_views scores every slice with test-time augmentation. rule (default: the STUDY_*
+    settings) picks the study aggregation and early stop. on_progress receives counts after
+    every forward pass.
+    """
+    with pinned_model() as (current, version):
+        if explain and not supports_explain(current):
+            raise UploadError("EXPLAIN_UNAVAILABLE", EXPLAIN_UNAVAILABLE_MESSAGE, 501)
+        target = current if explain else inference_model(current)
+        return orchestrate_batch(
+            slices, target, CLASS_LABELS, on_stage=on_stage, model_version=version, explain=explain,
+            tta_views=tta_views, rule=rule or StudyRule(), on_progress=on_progress,
+        )
+
+
+def with_slice_heatmap_urls(result, slices):
+    """A study result with a heatmap_url on every slice that reached the model."""
+    result["slices"] = [
+        dict(entry, heatmap_url=heatmap_url(data, result["model_version"])) if entry["vision"] is not None else entry
+        for entry, (_, data) in zip(result["slices"], slices)
+    ]
+    return result
+
+
+# Background jobs for long analyses: a bounded pool of runners plus a bounded wait queue.
+# Job state lives in this process, so with several gunicorn workers clients must poll
+# the worker that accepted the job (sticky sessions) or run one worker.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "16"))
+JOB_TTL_S = float(os.getenv("JOB_TTL_S", "900"))
+jobs = JobManager(JOB_WORKERS, JOB_QUEUE_SIZE, JOB_TTL_S)
+
+
+# Warm-up: after a load, synthetic scans go through the same pipeline as requests (decode,
+# QA, preprocessing, model) on a background thread. Readiness waits for it; liveness does not.
+WARMUP_ENABLED = os.getenv("WARMUP", "1") == "1"
+warmup = Warmup()
+warmup.skip("model not loaded")
+
+
+def warmup_steps(target=None):
+    """(name, callable) pairs run after each model load, on target (default: the current model). Results bypass the cache."""
+    scan = synthetic_scan()
+    steps = [
+        ("vision", lambda: orchestrate(scan, inference_model(target), CLASS_LABELS)),
+        (
+            "batch",
+            lambda: orchestrate_batch(
+                [(f"warmup_{i}.jpg", scan) for i in range(BATCH_MAX_SIZE)], inference_model(target), CLASS_LABELS
+            ),
+        ),
+    ]
+    explainer = model if target is None else target
+    if supports_explain(explainer):
+        # Builds the Grad-CAM conv-output model and traces its function for this model.
+        steps.append(("gradcam", lambda: orchestrate(scan, explainer, CLASS_LABELS, explain=True)))
+    return steps
+
+
+def start_warmup(background: bool = True) -> Warmup:
+    """Replace the warm-up state for the current model and run it."""
+    global warmup
+    warmup = Warmup(warmup_steps())
+    if model is None:
+        warmup.skip("model not loaded")
+    elif not WARMUP_ENABLED:
+        warmup.skip("disabled")
+    elif background:
+        warmup.start()
+    else:
+        warmup.run()
+    return warmup
+
+
+def is_ready() -> bool:
+    """Model loaded (and, with a process pool, a model process up) and warm-up finished."""
+    model_loaded = model is not None
+    if isinstance(model, InferencePool):
+        model_loaded = model.is_ready()
+    return model_loaded and warmup.ready
+
+
+def reload_model(backend: str = None, path: str = None) -> ModelHandle:
+    """
+    Load backend/path next to the serving model, warm it up, then swap it in. Requests keep
+    being served by the old model meanwhile; it is closed after its last request finishes.
+    """
+
+    def prepare(handle):
+        if not WARMUP_ENABLED:
+            return None
+        candidate = Warmup(warmup_steps(handle.model))
+        candidate.run()
+        if candidate.state == "failed":
+            raise RuntimeError(f"Warm-up failed: {candidate.error}")
+        return candidate
+
+    return model_registry.reload(lambda: build_model_handle(backend, path), prepare)
+
+
+# Hot reload over HTTP (POST /api/v1/admin/models/reload) is enabled by setting ADMIN_TOKEN.
+# Only files under MODEL_DIR can be loaded.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+MODEL_DIR = os.path.realpath(os.getenv("MODEL_DIR", os.path.dirname(model_path)))
+
+
+# TensorFlow's runtime is not fork-safe once it has executed ops, so a preloading gunicorn
+# master sets MODEL_LOAD_DEFERRED=1 and each worker calls load_model() after the fork.
+# Placed after the warm-up definitions because a successful load starts the warm-up.
+if os.getenv("MODEL_LOAD_DEFERRED", "0") != "1":
+    load_model()
+
 
 @app.route("/healthz", methods=["GET"])
 def healthz():
     # Use this endpoint for backend readiness checks in local/prod environments.
     """Health check for load balancers and uptime probes."""
+    handle = model_registry.current
     model_loaded = model is not None
-    ok = model_loaded
+    if isinstance(model, InferencePool):
+        model_loaded = model.is_ready()
+    ok = is_ready()
     payload = {
         "ok": ok,
         "model_loaded": model_loaded,
+        "ready": ok,
+        "warmup": warmup.snapshot(),
+        "model_load": model_registry.snapshot(),
         "service": "Medical MRI Diagnosis AI Agent API",
-        "model_path": model_path,
+        "model_path": handle.path if handle is not None else served_model_path,
+        "model_backend": handle.backend if handle is not None else MODEL_BACKEND,
+        "model_variant": MODEL_VARIANT or None,
+        "model_version": current_model_version(),
+        "models": model_registry.describe(),
     }
+    if isinstance(model, InferencePool):
+        payload["inference_pool"] = model.health()
+    # Peek only: a health probe must not start a batcher thread, e.g. while no model is loaded.
+    batcher = current_batcher()
+    if batcher is not None:
+        payload["batching"] = batcher.stats()
+    if result_cache is not None:
+        payload["cache"] = result_cache.stats()
+    payload["singleflight"] = inflight.stats()
+    payload["heatmaps"] = heatmap_store.snapshot()
+    payload["jobs"] = jobs.stats()
     status = 200 if ok else 500
     return jsonify(payload), status
 
 
+@app.route("/livez", methods=["GET"])
+def livez():
+    """Liveness: the process is up and serving requests, whether or not the model is ready."""
+    return jsonify({"alive": True, "pid": os.getpid(), "uptime_s": round(time.time() - STARTED_AT, 1)}), 200
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness: 200 once the model is loaded and warmed up, 503 until then."""
+    ready = is_ready()
+    payload = {
+        "ready": ready,
+        "model_loaded": model is not None,
+        "model_load": model_registry.snapshot(),
+        "warmup": warmup.snapshot(),
+    }
+    return jsonify(payload), 200 if ready else 503
+
+
 @app.route("/")
 def home():
     return render_template("index.html")
@@ -74,6 +718,9 @@ def home():
 @app.errorhandler(413)
 def request_entity_too_large(error):
     """Handle file too large (exceeds MAX_CONTENT_LENGTH)."""
+    if request.path in ("/api/v1/analyze/batch", "/api/v1/jobs"):
+        limit_mb = BATCH_MAX_CONTENT_LENGTH // (1024 * 1024)
+        return api_error("FILE_TOO_LARGE", f"Upload too large. Maximum batch size is {limit_mb} MB.", 413)
     if request.path.startswith("/api/"):
         return api_error("FILE_TOO_LARGE", "File too large. Maximum size is 5 MB.", 413)
     return render_template("index.html", error="File too large. Maximum size is 5 MB."), 413
@@ -107,11 +754,8 @@ def upload_image():
     if filename == "":
         return render_template("index.html", error="Invalid filename.")
 
-    file_prefix = str(uuid.uuid4())
-    safe_name = f"{file_prefix}_{filename}"
-    image_path = os.path.join(app.config["UPLOAD_FOLDER"], safe_name)
-    image.save(image_path)
-
+    if model is None and model_registry.loading:
+        return render_template("index.html", error="The model is still loading. Please try again in a moment.")
     if model is None:
         return render_template(
             "index.html",
@@ -119,8 +763,10 @@ def upload_image():
         )
 
     try:
-        uploaded_image_url = url_for("static", filename=f"uploads/{safe_name}")
-        result = orchestrate(image_path, model, CLASS_LABELS, uploaded_image_url)
+        data = image.read()
+        header_qa = qa_check_header(data)
+        uploaded_image_url = _persist_upload(data, filename, header_qa)
+        result = analyze_upload(data, uploaded_image_url, tta_views=tta_views_requested(), header_qa=header_qa)
         qa = result["qa"]
         vision = result.get("vision") or {}
         prediction = vision.get("label", "Inconclusive")
@@ -148,41 +794,26 @@ def upload_image():
 def api_v1_analyze():
     """Analyze uploaded MRI image. Returns standardized JSON."""
     try:
-        if "image" not in request.files:
-            return api_error("MISSING_FILE", "No file selected. Use multipart form field 'image'.", 400)
-
-        image = request.files["image"]
-        if image.filename == "":
-            return api_error("EMPTY_FILENAME", "No file selected.", 400)
-
-        if not allowed_file(image.filename):
-            return api_error(
-                "UNSUPPORTED_EXTENSION",
-                "Invalid file type. Allowed: PNG, JPG, JPEG.",
-                400,
-            )
-
-        filename = secure_filename(image.filename)
-        if filename == "":
-            return api_error("INVALID_FILENAME", "Invalid filename.", 400)
+        filename, image = _validate_image_upload()
 
         if model is None:
-            return api_error(
-                "MODEL_UNAVAILABLE",
-                "Model is not available on the server.",
-                503,
-            )
+            return api_error("MODEL_UNAVAILABLE", model_unavailable_message(), 503)
 
-        file_prefix = str(uuid.uuid4())
-        safe_name = f"{file_prefix}_{filename}"
-        image_path = os.path.join(app.config["UPLOAD_FOLDER"], safe_name)
-        image.save(image_path)
+        explain = explain_mode()
+        if explain and not supports_explain(model):
+            return api_error("EXPLAIN_UNAVAILABLE", EXPLAIN_UNAVAILABLE_MESSAGE, 501)
 
-        uploaded_image_url = url_for("static", filename=f"uploads/{safe_name}")
-        result = orchestrate(image_path, model, CLASS_LABELS, uploaded_image_url)
-        if not result["qa"].get("safe_to_infer", False):
-            result["vision"] = None
+        data = image.read()
+        header_qa = qa_check_header(data)
+        uploaded_image_url = _persist_upload(data, filename, header_qa)
+        result = analyze_upload(
+            data, uploaded_image_url, explain=explain == "inline", tta_views=tta_views_requested(), header_qa=header_qa
+        )
+        if explain == "lazy":
+            result = with_heatmap_url(result, data)
         return jsonify(result), 200
+    except UploadError as e:
+        return api_error(e.code, e.message, e.status)
     except Exception as e:
         logging.exception("Analysis failed: %s", e)
         return api_error(
@@ -195,6 +826,175 @@ def api_v1_analyze():
         gc.collect()
 
 
+@app.route("/api/v1/analyze/batch", methods=["POST"])
+def api_v1_analyze_batch():
+    """Analyze every slice of a study in one request. Returns per-slice results and a study summary."""
+    request.max_content_length = BATCH_MAX_CONTENT_LENGTH
+    try:
+        slices = _read_batch_slices()
+
+        if model is None:
+            return api_error("MODEL_UNAVAILABLE", model_unavailable_message(), 503)
+        explain = explain_mode()
+        if explain and not supports_explain(model):
+            return api_error("EXPLAIN_UNAVAILABLE", EXPLAIN_UNAVAILABLE_MESSAGE, 501)
+
+        result = analyze_study(
+            slices, explain=explain == "inline", tta_views=tta_views_requested(), rule=study_rule_requested()
+        )
+        if explain == "lazy":
+            result = with_slice_heatmap_urls(result, slices)
+        return jsonify(result), 200
+    except UploadError as e:
+        return api_error(e.code, e.message, e.status)
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        logging.exception("Batch analysis failed: %s", e)
+        return api_error(
+            "INTERNAL_SERVER_ERROR",
+            f"Batch analysis failed: {str(e)}",
+            500,
+        )
+    finally:
+        gc.collect()
+
+
+@app.route("/api/v1/heatmaps/<heatmap_id>", methods=["GET"])
+def api_v1_heatmap(heatmap_id):
+    """Grad-CAM overlay PNG for a heatmap_url from explain=lazy; rendered on its first fetch."""
+    try:
+        png = render_heatmap(heatmap_id)
+    except UploadError as e:
+        return api_error(e.code, e.message, e.status)
+    return Response(png, mimetype="image/png", headers={"Cache-Control": "private, max-age=3600"})
+
+
+def _job_links(job_id: str):
+    return {
+        "status_url": url_for("api_v1_job_status", job_id=job_id),
+        "events_url": url_for("api_v1_job_events", job_id=job_id),
+    }
+
+
+@app.route("/api/v1/jobs", methods=["POST"])
+def api_v1_jobs_submit():
+    """
+    Queue an analysis and return 202 with the job id straight away.
+    Send 'image' for one image, or 'images'/'archive' for a whole study.
+    """
+    request.max_content_length = BATCH_MAX_CONTENT_LENGTH
+    try:
+        if "image" in request.files:
+            filename, image = _validate_image_upload()
+            data = image.read()
+            if len(data) > MAX_CONTENT_LENGTH:
+                raise UploadError("FILE_TOO_LARGE", "File too large. Maximum size is 5 MB.", 413)
+            slices = None
+        else:
+            slices = _read_batch_slices()
+
+        if model is None:
+            return api_error("MODEL_UNAVAILABLE", model_unavailable_message(), 503)
+
+        tta_views = tta_views_requested()
+        rule = study_rule_requested() if slices is not None else None
+        if slices is None:
+            header_qa = qa_check_header(data)
+            uploaded_image_url = _persist_upload(data, filename, header_qa)
+            kind = "analyze"
+
+            def work(job):
+                return analyze_upload(data, uploaded_image_url, job.stage, tta_views=tta_views, header_qa=header_qa)
+        else:
+            kind = "batch"
+
+            def work(job):
+                return analyze_study(slices, on_stage=job.stage, tta_views=tta_views, rule=rule, on_progress=job.progress)
+
+        job = jobs.submit(kind, work)
+    except UploadError as e:
+        return api_error(e.code, e.message, e.status)
+    except QueueFullError as e:
+        response, status = api_error("QUEUE_FULL", "Too many queued jobs. Retry later.", 429)
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, status
+    except RequestEntityTooLarge:
+        raise
+
+    links = _job_links(job.id)
+    response = jsonify({"job_id": job.id, "kind": job.kind, "status": job.status, **links})
+    response.headers["Location"] = links["status_url"]
+    return response, 202
+
+
+@app.route("/api/v1/jobs/<job_id>", methods=["GET"])
+def api_v1_job_status(job_id):
+    """Poll a job. result is set once status is "succeeded"; error once it is "failed"."""
+    job = jobs.get(job_id)
+    if job is None:
+        return api_error("JOB_NOT_FOUND", "Unknown or expired job id.", 404)
+    return jsonify({**job.to_dict(), **_job_links(job.id)}), 200
+
+
+@app.route("/api/v1/jobs/<job_id>/events", methods=["GET"])
+def api_v1_job_events(job_id):
+    """Server-sent events: one "stage" event per pipeline stage and "status" events for queued/running/done."""
+    job = jobs.get(job_id)
+    if job is None:
+        return api_error("JOB_NOT_FOUND", "Unknown or expired job id.", 404)
+    try:
+        last_event_id = int(request.headers.get("Last-Event-ID", "0"))
+    except ValueError:
+        last_event_id = 0
+
+    def events():
+        for event in job.stream(after_id=last_event_id):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/v1/admin/models/reload", methods=["POST"])
+def api_v1_admin_reload():
+    """Load a model file (optionally with another backend) and hot-swap it in without a restart."""
+    if not ADMIN_TOKEN:
+        return api_error("NOT_FOUND", "Admin API is disabled.", 404)
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+        return api_error("UNAUTHORIZED", "Missing or invalid admin token.", 401)
+
+    body = request.get_json(silent=True) or {}
+    backend = body.get("backend") or MODEL_BACKEND
+    if backend not in BACKENDS:
+        return api_error("INVALID_BACKEND", f"Unknown backend. Use one of: {', '.join(sorted(BACKENDS))}.")
+    path = None
+    if body.get("path"):
+        path = os.path.realpath(os.path.join(MODEL_DIR, body["path"]))
+        if os.path.commonpath([path, MODEL_DIR]) != MODEL_DIR or not os.path.isfile(path):
+            return api_error("INVALID_MODEL_PATH", "Model file not found in the model directory.")
+    if model_registry.loading:
+        return api_error("RELOAD_IN_PROGRESS", "The model is still loading.", 409)
+
+    previous = model_registry.current.describe() if model_registry.current is not None else None
+    try:
+        handle = reload_model(backend, path)
+    except ReloadInProgress as e:
+        return api_error("RELOAD_IN_PROGRESS", str(e), 409)
+    except Exception as e:
+        logging.exception("Model reload failed")
+        return api_error("RELOAD_FAILED", f"Reload failed; the previous model is still serving. {e}", 500)
+    warmed = handle.prepared.snapshot() if handle.prepared is not None else None
+    return jsonify({"model": handle.describe(), "previous": previous, "warmup": warmed}), 200
+
+
 @app.route("/api/analyze", methods=["POST"])
 def api_analyze():
     """Legacy analyze endpoint (redirects to same logic as v1)."""
@@ -0,0 +1,261 @@
+"""
+ASGI entry point for asyncio servers:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5001
+
+Serves the same POST /api/v1/analyze (and legacy /api/analyze) contract, the heatmap URLs it
+returns and health probes as the Flask app, with the same api_error JSON. Upload bodies are
+streamed through a sans-IO multipart parser as they arrive, so a slow client costs an idle
+coroutine rather than a worker thread. Decoding, QA and inference run on a thread pool and the
+upload copy is written off the event loop after the response is sent. Every other route stays
+on `gunicorn wsgi:app`.
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import parse_qs
+
+from werkzeug.datastructures import Headers
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NeedData
+
+import app as flask_app
+
+# Threads for CPU-bound work (decode, QA, inference). Uploads waiting on the network do
+# not hold one; only requests whose body has fully arrived queue here.
+ASGI_EXECUTOR_THREADS = int(os.getenv("ASGI_EXECUTOR_THREADS", "4"))
+executor = ThreadPoolExecutor(ASGI_EXECUTOR_THREADS, thread_name_prefix="asgi-analyze")
+
+ANALYZE_PATHS = ("/api/v1/analyze", "/api/analyze")
+
+
+class _Upload:
+    """The 'image' part of a multipart body, collected while the body streams in."""
+
+    def __init__(self):
+        self.filename = None
+        self.data = bytearray()
+
+
+async def _send_json(send, payload, status: int, extra_headers=()):
+    # Same serialization as Flask's jsonify outside debug mode.
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"access-control-allow-origin", b"*"),
+        *extra_headers,
+    ]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_error(send, code: str, message: str, status: int = 400):
+    await _send_json(send, {"error": {"code": code, "message": message}}, status)
+
+
+async def _read_image_part(scope, receive) -> _Upload:
+    """
+    Stream the request body into the multipart decoder and keep only the first 'image' file.
+    Raises UploadError for oversize bodies (413) or a client that disconnects.
+    """
+    headers = Headers([(k.decode("latin-1"), v.decode("latin-1")) for k, v in scope["headers"]])
+    limit = flask_app.MAX_CONTENT_LENGTH
+    declared = headers.get("content-length", type=int)
+    if declared is not None and declared > limit:
+        raise flask_app.UploadError("FILE_TOO_LARGE", "File too large. Maximum size is 5 MB.", 413)
+
+    mimetype, options = parse_options_header(headers.get("content-type", ""))
+    boundary = options.get("boundary")
+    decoder = None
+    if mimetype == "multipart/form-data" and boundary:
+        decoder = MultipartDecoder(boundary.encode("latin-1"), max_form_memory_size=limit)
+
+    upload = _Upload()
+    collecting = False
+    received = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise flask_app.UploadError("CLIENT_DISCONNECTED", "Client disconnected during upload.", 400)
+        chunk = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        received += len(chunk)
+        if received > limit:
+            raise flask_app.UploadError("FILE_TOO_LARGE", "File too large. Maximum size is 5 MB.", 413)
+        if decoder is None:
+            continue
+        try:
+            decoder.receive_data(chunk)
+            if not more_body:
+                decoder.receive_data(None)
+            event = decoder.next_event()
+            while not isinstance(event, (NeedData, Epilogue)):
+                if isinstance(event, File):
+                    collecting = event.name == "image" and upload.filename is None
+                    if collecting:
+                        upload.filename = event.filename
+                elif isinstance(event, Data) and collecting:
+                    upload.data += event.data
+                    collecting = event.more_data
+                event = decoder.next_event()
+        except RequestEntityTooLarge:
+            raise flask_app.UploadError("FILE_TOO_LARGE", "File too large. Maximum size is 5 MB.", 413)
+        except ValueError:
+            # Malformed multipart: like Flask, treat it as a request without files.
+            decoder, upload = None, _Upload()
+    return upload
+
+
+def _upload_url_and_path(filename: str):
+    safe_name = f"{uuid.uuid4()}_{filename}"
+    path = os.path.join(flask_app.app.config["UPLOAD_FOLDER"], safe_name)
+    return f"/static/uploads/{safe_name}", path
+
+
+def _query_value(scope, name: str) -> str:
+    """A query string value; form fields other than 'image' are not read."""
+    return parse_qs(scope.get("query_string", b"").decode("latin-1")).get(name, [""])[0]
+
+
+def _explain_mode(scope) -> str:
+    """flask_app.explain_mode() from the query string."""
+    return flask_app.EXPLAIN_MODES.get(_query_value(scope, "explain").lower(), "")
+
+
+async def analyze(scope, receive, send):
+    """POST /api/v1/analyze with the Flask endpoint's validation order and responses."""
+    loop = asyncio.get_running_loop()
+    try:
+        upload = await _read_image_part(scope, receive)
+        if upload.filename is None:
+            raise flask_app.UploadError("MISSING_FILE", "No file selected. Use multipart form field 'image'.")
+        filename = flask_app.check_image_filename(upload.filename)
+    except flask_app.UploadError as e:
+        await _send_error(send, e.code, e.message, e.status)
+        return
+
+    if flask_app.model is None:
+        await _send_error(send, "MODEL_UNAVAILABLE", flask_app.model_unavailable_message(), 503)
+        return
+    explain = _explain_mode(scope)
+    if explain and not flask_app.supports_explain(flask_app.model):
+        await _send_error(send, "EXPLAIN_UNAVAILABLE", flask_app.EXPLAIN_UNAVAILABLE_MESSAGE, 501)
+        return
+
+    data = bytes(upload.data)
+    header_qa = flask_app.qa_check_header(data)
+    uploaded_image_url, image_path = "", None
+    if flask_app.PERSIST_UPLOADS and header_qa is None:
+        uploaded_image_url, image_path = _upload_url_and_path(filename)
+    try:
+        result = await loop.run_in_executor(
+            executor,
+            partial(
+                flask_app.analyze_upload,
+                data,
+                uploaded_image_url,
+                explain=explain == "inline",
+                tta_views=flask_app.tta_views_for(_query_value(scope, "tta")),
+                header_qa=header_qa,
+            ),
+        )
+        if explain == "lazy":
+            result = flask_app.with_heatmap_url(result, data)
+    except flask_app.UploadError as e:
+        await _send_error(send, e.code, e.message, e.status)
+        return
+    except Exception as e:
+        logging.exception("Analysis failed: %s", e)
+        await _send_error(send, "INTERNAL_SERVER_ERROR", f"Analysis failed: {str(e)}", 500)
+        return
+    await _send_json(send, result, 200)
+
+    if image_path is not None:
+        # Written after the response, like the Flask app; the default executor keeps
+        # disk I/O off both the event loop and the analysis threads.
+        await loop.run_in_executor(None, flask_app._write_upload, data, image_path)
+
+
+async def heatmap(scope, receive, send):
+    """GET /api/v1/heatmaps/<id>: heatmap URLs are served by the process that returned them."""
+    heatmap_id = scope["path"][len(HEATMAP_PREFIX):]
+    loop = asyncio.get_running_loop()
+    try:
+        png = await loop.run_in_executor(executor, flask_app.render_heatmap, heatmap_id)
+    except flask_app.UploadError as e:
+        await _send_error(send, e.code, e.message, e.status)
+        return
+    headers = [
+        (b"content-type", b"image/png"),
+        (b"content-length", str(len(png)).encode()),
+        (b"cache-control", b"private, max-age=3600"),
+        (b"access-control-allow-origin", b"*"),
+    ]
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+    await send({"type": "http.response.body", "body": png})
+
+
+HEATMAP_PREFIX = flask_app.HEATMAP_URL.format("")
+HEALTH_VIEWS = {"/healthz": flask_app.healthz, "/livez": flask_app.livez, "/readyz": flask_app.readyz}
+
+
+async def health(scope, receive, send):
+    """Probe endpoints reuse the Flask views so both entry points report the same state."""
+    with flask_app.app.app_context():
+        response, status = HEALTH_VIEWS[scope["path"]]()
+        payload = response.get_json()
+    await _send_json(send, payload, status)
+
+
+async def preflight(scope, receive, send):
+    requested = dict(scope["headers"]).get(b"access-control-request-headers", b"")
+    headers = [
+        (b"access-control-allow-origin", b"*"),
+        (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+        (b"access-control-allow-headers", requested),
+        (b"content-length", b"0"),
+    ]
+    await send({"type": "http.response.start", "status": 204, "headers": headers})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI application."""
+    if scope["type"] == "lifespan":
+        await lifespan(scope, receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    path, method = scope["path"], scope["method"]
+    if method == "OPTIONS" and path.startswith("/api/"):
+        await preflight(scope, receive, send)
+    elif path in ANALYZE_PATHS:
+        if method != "POST":
+            await _send_error(send, "METHOD_NOT_ALLOWED", "Use POST.", 405)
+        else:
+            await analyze(scope, receive, send)
+    elif path in HEALTH_VIEWS and method == "GET":
+        await health(scope, receive, send)
+    elif path.startswith(HEATMAP_PREFIX) and method == "GET":
+        await heatmap(scope, receive, send)
+    else:
+        await _send_error(send, "NOT_FOUND", "Not served by the ASGI entry point; use the WSGI app.", 404)
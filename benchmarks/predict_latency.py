@@ -0,0 +1,74 @@
+"""
+Compare per-call latency of model.predict(), an eager model(x) call, the ServingModel tf.function
+and (with --tflite) the converted model on the TFLite interpreter.
+
+Usage:
+    python benchmarks/predict_latency.py [--model models/Brain_Tumors_vgg_final.h5] [--batch-sizes 1,8] [--iters 50]
+                                         [--tflite models/Brain_Tumors_vgg_final.tflite]
+
+Each path gets a few untimed warm-up calls, then --iters timed calls on a random batch.
+Reports p50/p99/mean in milliseconds per call.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_MODEL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "Brain_Tumors_vgg_final.h5")
+
+
+def measure(fn, batch, iters: int, warmup: int = 3) -> dict:
+    for _ in range(warmup):
+        fn(batch)
+    samples = []
+    for _ in range(iters):
+        start = time.perf_counter()
+        fn(batch)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples = np.array(samples)
+    return {
+        "p50": float(np.percentile(samples, 50)),
+        "p99": float(np.percentile(samples, 99)),
+        "mean": float(samples.mean()),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH", DEFAULT_MODEL))
+    parser.add_argument("--batch-sizes", default="1,8")
+    parser.add_argument("--iters", type=int, default=50)
+    parser.add_argument("--tflite", help="Also time this .tflite file (see python -m ml.convert_tflite)")
+    args = parser.parse_args(argv)
+
+    import tensorflow as tf
+    from ml.serving import ServingModel
+
+    model = tf.keras.models.load_model(args.model)
+    serving = ServingModel(model)
+    paths = {
+        "model.predict": lambda b: model.predict(b, verbose=0),
+        "model(x)": lambda b: model(b, training=False).numpy(),
+        "ServingModel": serving.predict,
+    }
+    if args.tflite:
+        from ml.tflite_backend import TFLiteModel
+
+        paths["TFLite"] = TFLiteModel(args.tflite).predict
+
+    print(f"{'batch':>5} {'path':>14} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+    for size in (int(n) for n in args.batch_sizes.split(",")):
+        batch = np.random.default_rng(0).random((size, 224, 224, 3), dtype=np.float32)
+        for name, fn in paths.items():
+            stats = measure(fn, batch, args.iters)
+            print(f"{size:>5} {name:>14} {stats['p50']:9.1f} {stats['p99']:9.1f} {stats['mean']:9.1f}")
+    print(f"ServingModel traces: {serving.tracing_count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
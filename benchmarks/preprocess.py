@@ -0,0 +1,108 @@
+"""
+Compare the original preprocessing with the fused, buffer-reusing path in ml/preprocess.py.
+
+Usage:
+    python benchmarks/preprocess.py [--images image_data/images] [--upscale 0,2048] [--batch 8]
+                                    [--filters bicubic,bilinear,box] [--iters 5]
+
+For every JPEG under --images (upscaled to --upscale pixels per side when non-zero), times
+decode + preprocessing of batches of --batch images:
+  original   full decode, resize, new float32 array per image, np.concatenate per batch
+  fused      draft decode (PREPROCESS_DRAFT_SIZE), resize straight into the thread's batch buffer
+Reports ms per image, numpy bytes allocated per image (tracemalloc) and the largest and mean
+absolute difference from the original input tensor.
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml.preprocess import DRAFT_SIZE, open_image, preprocess_batch  # noqa: E402
+
+DEFAULT_IMAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "image_data", "images")
+
+
+def original(batch_data):
+    arrays = []
+    for data in batch_data:
+        img = Image.open(io.BytesIO(data)).convert("RGB").resize((224, 224))
+        array = np.asarray(img, dtype=np.float32)
+        array *= 1.0 / 255.0
+        arrays.append(array[None, ...])
+    return np.concatenate(arrays, axis=0)
+
+
+def fused(resample):
+    def run(batch_data):
+        return preprocess_batch([open_image(data) for data in batch_data], resample)
+    return run
+
+
+def load(images_dir: str, upscale: int):
+    blobs = []
+    for path in sorted(glob.glob(os.path.join(images_dir, "*", "*.jpg"))):
+        with open(path, "rb") as f:
+            data = f.read()
+        if upscale:
+            buf = io.BytesIO()
+            Image.open(io.BytesIO(data)).convert("RGB").resize((upscale, upscale), Image.BICUBIC).save(buf, "JPEG", quality=92)
+            data = buf.getvalue()
+        blobs.append(data)
+    return blobs
+
+
+def measure(fn, batches, iters: int):
+    for batch in batches:
+        fn(batch)
+    images = sum(len(b) for b in batches)
+    start = time.perf_counter()
+    for _ in range(iters):
+        for batch in batches:
+            fn(batch)
+    ms = (time.perf_counter() - start) * 1000 / iters / images
+    tracemalloc.start()
+    for batch in batches:
+        fn(batch)
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return ms, allocated / len(batches[0])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", default=DEFAULT_IMAGES)
+    parser.add_argument("--upscale", default="0,2048", help="Comma-separated sides; 0 keeps the original files")
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--filters", default="bicubic,bilinear,box")
+    parser.add_argument("--iters", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"draft size {DRAFT_SIZE}, batch {args.batch}")
+    print(f"{'source':>8} {'path':>16} {'ms/img':>8} {'KB/img':>8} {'max diff':>9} {'mean diff':>10}")
+    for upscale in (int(n) for n in args.upscale.split(",")):
+        blobs = load(args.images, upscale)
+        if not blobs:
+            parser.error(f"No JPEGs under {args.images}")
+        batches = [blobs[i:i + args.batch] for i in range(0, len(blobs), args.batch)]
+        reference = [original(b) for b in batches]
+        paths = {"original": original, **{f"fused {name}": fused(name) for name in args.filters.split(",")}}
+        for name, fn in paths.items():
+            ms, per_batch = measure(fn, batches, args.iters)
+            diffs = [np.abs(fn(b) - ref) for b, ref in zip(batches, reference)]
+            max_diff = max(float(d.max()) for d in diffs)
+            mean_diff = float(np.mean([d.mean() for d in diffs]))
+            label = upscale or "samples"
+            print(f"{label:>8} {name:>16} {ms:8.2f} {per_batch / 1024:8.0f} {max_diff:9.4f} {mean_diff:10.5f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Compare the cost of the QA brightness/contrast statistics on large scans.
+
+Usage:
+    python benchmarks/qa_stats.py [--sizes 2048,4096] [--iters 10] [--image image_data/images/glioma/Te-gl_1.jpg]
+
+Builds a noisy JPEG of each size from --image (or a synthetic scan) and times decode + (mean, std) for:
+  float64    np.array(img) / 255.0, the original qa_agent computation
+  bincount   np.bincount over the uint8 pixel array
+  histogram  PIL's C histogram of the full decode (ImageContext.intensity_stats)
+  draft      Image.draft decode at qa_agent.STATS_DRAFT_SIZE, then the histogram
+  qa         qa_agent.decode_for_stats: the draft, or a full decode when the draft would skew the std
+           (what qa_agent.run does with raw bytes)
+
+Memory is the decoded image plus the peak of numpy allocations during the statistics (tracemalloc).
+The error columns are absolute differences from the float64 values.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.image_context import ImageContext  # noqa: E402
+from agent.qa_agent import STATS_DRAFT_SIZE, decode_for_stats  # noqa: E402
+
+
+def float64_stats(data: bytes):
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    arr = np.array(img) / 255.0
+    return img, float(np.mean(arr)), float(np.std(arr))
+
+
+def bincount_stats(data: bytes):
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    counts = np.bincount(np.asarray(img).reshape(-1), minlength=256)
+    levels = np.arange(256, dtype=np.float64) / 255.0
+    n = counts.sum()
+    mean = float(counts @ levels / n)
+    return img, mean, float(counts @ (levels - mean) ** 2 / n) ** 0.5
+
+
+def histogram_stats(data: bytes):
+    ctx = ImageContext.from_source(data)
+    return (ctx.image, *ctx.intensity_stats)
+
+
+def draft_stats(data: bytes):
+    ctx = ImageContext.from_source(data, draft_size=STATS_DRAFT_SIZE)
+    return (ctx.image, *ctx.intensity_stats)
+
+
+def qa_stats(data: bytes):
+    ctx = decode_for_stats(data)
+    return (ctx.image, *ctx.intensity_stats)
+
+
+METHODS = {
+    "float64": float64_stats, "bincount": bincount_stats, "histogram": histogram_stats, "draft": draft_stats,
+    "qa": qa_stats,
+}
+
+
+def scan_jpeg(source: str, size: int) -> bytes:
+    rng = np.random.default_rng(0)
+    if source:
+        base = Image.open(source).convert("RGB").resize((size, size), Image.BICUBIC)
+        pixels = np.asarray(base, dtype=np.float32)
+    else:
+        pixels = np.repeat(rng.normal(110, 40, (size, size, 1)), 3, axis=2).astype(np.float32)
+    pixels = pixels + rng.normal(0, 8, (size, size, 1)).astype(np.float32)
+    buf = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buf, format="JPEG", quality=92)
+    return buf.getvalue()
+
+
+def measure(fn, data: bytes, iters: int):
+    fn(data)
+    samples = []
+    for _ in range(iters):
+        start = time.perf_counter()
+        fn(data)
+        samples.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    img, mean, std = fn(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    decoded = img.size[0] * img.size[1] * len(img.getbands())
+    return float(np.percentile(samples, 50)), (decoded + peak) / 1e6, mean, std
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="2048,4096")
+    parser.add_argument("--iters", type=int, default=10)
+    parser.add_argument("--image", help="Scan to upscale (default: synthetic noise)")
+    args = parser.parse_args(argv)
+
+    print(f"{'size':>5} {'method':>10} {'p50 ms':>8} {'peak MB':>8} {'mean err':>9} {'std err':>9}")
+    for size in (int(n) for n in args.sizes.split(",")):
+        data = scan_jpeg(args.image, size)
+        reference = None
+        for name, fn in METHODS.items():
+            ms, mb, mean, std = measure(fn, data, args.iters)
+            reference = reference or (mean, std)
+            print(f"{size:>5} {name:>10} {ms:8.1f} {mb:8.1f} {abs(mean - reference[0]):9.5f} {abs(std - reference[1]):9.5f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Measure per-process memory of a running gunicorn deployment and suggest a worker count.
+
+Usage:
+    python benchmarks/worker_rss.py <gunicorn master pid> [--budget-mb 2048] [--headroom-mb 256]
+
+Reads /proc/<pid>/smaps_rollup (Linux only) for the master and each worker. PSS splits shared
+pages fairly between the processes mapping them, so master PSS + sum(worker PSS) is the real
+footprint; a worker's private dirty memory is what each additional worker costs.
+"""
+import argparse
+import os
+import sys
+
+FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def read_rollup(pid: int) -> dict:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            key = parts[0].rstrip(":")
+            if key in FIELDS:
+                values[key] = int(parts[1]) / 1024.0  # kB -> MB
+    return values
+
+
+def child_pids(pid: int) -> list:
+    children = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        try:
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(c) for c in f.read().split())
+        except FileNotFoundError:
+            continue
+    return sorted(set(children))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("pid", type=int, help="gunicorn master pid")
+    parser.add_argument("--budget-mb", type=float, default=None, help="memory available to the service")
+    parser.add_argument("--headroom-mb", type=float, default=256.0, help="reserve for spikes and the OS")
+    args = parser.parse_args(argv)
+
+    master = read_rollup(args.pid)
+    workers = {pid: read_rollup(pid) for pid in child_pids(args.pid)}
+
+    header = f"{'process':>16} " + " ".join(f"{f:>14}" for f in FIELDS)
+    print(header)
+    print(f"{'master ' + str(args.pid):>16} " + " ".join(f"{master.get(f, 0):14.1f}" for f in FIELDS))
+    for pid, stats in workers.items():
+        print(f"{'worker ' + str(pid):>16} " + " ".join(f"{stats.get(f, 0):14.1f}" for f in FIELDS))
+
+    if not workers:
+        print("\nNo workers found; is this the gunicorn master pid?", file=sys.stderr)
+        return 1
+
+    total_pss = master.get("Pss", 0) + sum(w.get("Pss", 0) for w in workers.values())
+    per_worker_private = max(
+        w.get("Private_Dirty", 0) + w.get("Private_Clean", 0) for w in workers.values()
+    )
+    print(f"\nTotal PSS: {total_pss:.1f} MB across {len(workers)} worker(s)")
+    print(f"Marginal cost per extra worker (max private): {per_worker_private:.1f} MB")
+
+    if args.budget_mb is not None:
+        shared = total_pss - per_worker_private * len(workers)
+        fit = int((args.budget_mb - args.headroom_mb - shared) // per_worker_private)
+        print(f"Suggested WEB_CONCURRENCY for {args.budget_mb:.0f} MB: {max(fit, 1)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
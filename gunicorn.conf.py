@@ -1,3 +1,59 @@
-workers = 1
-threads = 1
+import gc
+import os
+
+# Sizing: see docs/DEPLOYMENT.md. Defaults keep the single-worker setup that fits a
+# 512 MB free-tier instance.
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "1"))
 timeout = 180
+
+# With several workers, import the app (Flask, NumPy, TensorFlow) once in the master so
+# workers share those pages copy-on-write. The model itself is loaded per worker after the
+# fork: TensorFlow hangs in a forked child once the parent has run ops (load_model does),
+# so weights cannot be inherited from the master. With MODEL_BACKEND=tflite the workers map
+# the same .tflite file, so those pages are shared through the page cache.
+preload_app = os.getenv("GUNICORN_PRELOAD", "1" if workers > 1 else "0") == "1"
+if preload_app:
+    os.environ["MODEL_LOAD_DEFERRED"] = "1"
+
+
+def _prefetch(path):
+    """Pull the weights file into the page cache once so every worker's load reads from memory."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    import app
+
+    # app imports neither runtime; import the served backend's here (no ops run) so workers
+    # share its pages. The TFLite backend never needs TensorFlow, so the master skips it.
+    if app.MODEL_BACKEND == "tflite":
+        from ml.tflite_backend import interpreter_class
+
+        interpreter_class()
+    else:
+        import tensorflow  # noqa: F401
+
+    _prefetch(app.served_model_path)
+    # Move everything allocated during preload into the permanent generation so the
+    # cyclic GC never writes to those object headers and un-shares their pages.
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        import app
+
+        app.load_model()
@@ -1,25 +1,31 @@
 import os
+import sys
+import time
 from pathlib import Path
 
-import cv2
 import gradio as gr
 import numpy as np
 from PIL import Image
 import tensorflow as tf
 
+# Preprocessing is shared with the Flask app (ml/preprocess.py). Inside the repository it is
+# imported from the parent directory; a Space ships a copy of the ml/ package next to app.py.
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from ml.heatmap import overlay  # noqa: E402
+from ml.preprocess import MODEL_SIZE as IMAGE_SIZE, preprocess_batch  # noqa: E402
+from ml.serving import ServingModel, last_conv_layer  # noqa: E402
+
 
 MODEL_PATH = os.getenv("MODEL_PATH", "Brain_Tumors_vgg_final.h5")
 MODEL_PATH_CANDIDATES = [MODEL_PATH, "models/Brain_Tumors_vgg_final.h5"]
-IMAGE_SIZE = (224, 224)
 CLASS_NAMES = [
     "Glioma Tumor",
     "Meningioma Tumor",
     "Pituitary Tumor",
     "No Tumor",
 ]
-INV_255 = 1.0 / 255.0
-LAST_CONV_LAYER_NAME = None
-GRADCAM_MODEL = None
+SERVING_MODEL = None
+GRADCAM_AVAILABLE = False
 
 def load_model_at_startup():
     """Load model once at startup, trying a small set of relative paths."""
@@ -44,24 +50,15 @@ def load_model_at_startup():
 MODEL, RESOLVED_MODEL_PATH, MODEL_LOAD_ERROR = load_model_at_startup()
 
 
-def find_last_conv_layer_name(model) -> str:
-    """Return the last Conv2D layer name for Grad-CAM."""
-    for layer in reversed(model.layers):
-        if isinstance(layer, tf.keras.layers.Conv2D):
-            return layer.name
-    raise ValueError("No Conv2D layer found in model.")
-
-
+# Prediction and Grad-CAM share one forward pass (ServingModel.explain, as in the Flask
+# API's explain=true), so an explained prediction costs about one inference.
 if MODEL is not None:
+    SERVING_MODEL = ServingModel(MODEL)
     try:
-        LAST_CONV_LAYER_NAME = find_last_conv_layer_name(MODEL)
-        GRADCAM_MODEL = tf.keras.models.Model(
-            inputs=MODEL.inputs,
-            outputs=[MODEL.get_layer(LAST_CONV_LAYER_NAME).output, MODEL.output],
-        )
-    except Exception:
-        LAST_CONV_LAYER_NAME = None
-        GRADCAM_MODEL = None
+        last_conv_layer(MODEL)
+        GRADCAM_AVAILABLE = True
+    except ValueError:
+        GRADCAM_AVAILABLE = False
 
 
 def get_example_images():
@@ -77,47 +74,29 @@ def get_example_images():
 
 
 def preprocess_image(image: Image.Image) -> np.ndarray:
-    """Prepare image for model inference: RGB, 224x224, float32, normalized, batched."""
-    processed = image.convert("RGB").resize(IMAGE_SIZE)
-    image_array = np.asarray(processed, dtype=np.float32)
-    image_array *= INV_255
-    return np.expand_dims(image_array, axis=0)
-
-
-def generate_gradcam_overlay(
-    original_image: Image.Image,
-    image_batch: np.ndarray,
-    class_index: int,
-) -> Image.Image:
-    """Generate a Grad-CAM heatmap overlay for the selected class."""
-    if GRADCAM_MODEL is None:
-        return original_image.convert("RGB").resize(IMAGE_SIZE)
-
-    input_tensor = tf.convert_to_tensor(image_batch)
-    with tf.GradientTape() as tape:
-        conv_outputs, predictions = GRADCAM_MODEL(input_tensor, training=False)
-        loss = predictions[:, class_index]
-
-    grads = tape.gradient(loss, conv_outputs)
-    pooled_grads = tf.reduce_mean(grads, axis=(0, 1, 2))
-    conv_activations = conv_outputs[0]
-    heatmap = tf.reduce_sum(conv_activations * pooled_grads, axis=-1)
-    heatmap = tf.maximum(heatmap, 0)
-    max_val = tf.reduce_max(heatmap)
-    if float(max_val) > 0:
-        heatmap = heatmap / max_val
-
-    heatmap_np = heatmap.numpy()
-    heatmap_np = cv2.resize(heatmap_np, IMAGE_SIZE)
-    heatmap_uint8 = np.uint8(255 * heatmap_np)
-    heatmap_color = cv2.applyColorMap(heatmap_uint8, cv2.COLORMAP_JET)
-    heatmap_color = cv2.cvtColor(heatmap_color, cv2.COLOR_BGR2RGB)
+    """
+    Prepare image for model inference: RGB, 224x224, float32, normalized, batched. The batch
+    is this thread's reusable buffer, valid until the thread preprocesses another image.
+    """
+    return preprocess_batch([image])
+
+
+def predict_and_explain(image_batch: np.ndarray):
+    """Class probabilities for one image and its Grad-CAM heatmap (None without a conv layer)."""
+    if not GRADCAM_AVAILABLE:
+        return SERVING_MODEL.predict(image_batch)[0], None
+    probs, cams = SERVING_MODEL.explain(image_batch)
+    return probs[0], cams[0]
 
+
+def generate_gradcam_overlay(original_image: Image.Image, heatmap) -> Image.Image:
+    """Blend a Grad-CAM heatmap (values in [0, 1]) over the image as a JET colormap."""
     base_img = np.asarray(
         original_image.convert("RGB").resize(IMAGE_SIZE), dtype=np.uint8
     )
-    overlay = cv2.addWeighted(base_img, 0.6, heatmap_color, 0.4, 0)
-    return Image.fromarray(overlay)
+    if heatmap is None:
+        return Image.fromarray(base_img)
+    return Image.fromarray(overlay(base_img, heatmap))
 
 
 def predict(image: Image.Image):
@@ -131,13 +110,12 @@ def predict(image: Image.Image):
 
     image_batch = preprocess_image(image)
 
-    # Call the model directly to avoid predict() overhead in single-request inference.
-    preds = MODEL(image_batch, training=False).numpy()[0]
+    preds, heatmap = predict_and_explain(image_batch)
     idx = int(np.argmax(preds))
     predicted_label = CLASS_NAMES[idx]
     confidence = float(preds[idx])
     confidence_pct = round(confidence * 100, 2)
-    gradcam_image = generate_gradcam_overlay(image, image_batch, idx)
+    gradcam_image = generate_gradcam_overlay(image, heatmap)
 
     probabilities = {
         class_name: round(float(score) * 100, 2)
@@ -159,6 +137,30 @@ def predict(image: Image.Image):
     )
 
 
+def warm_up_model():
+    """
+    Run one synthetic image through inference and Grad-CAM at startup so the first user
+    does not pay for graph tracing and kernel selection. Returns elapsed ms, or None.
+    """
+    if MODEL is None:
+        return None
+    start = time.perf_counter()
+    try:
+        rng = np.random.default_rng(0)
+        pixels = np.clip(rng.normal(110, 40, IMAGE_SIZE), 0, 255).astype(np.uint8)
+        image = Image.fromarray(pixels, mode="L").convert("RGB")
+        _, heatmap = predict_and_explain(preprocess_image(image))
+        generate_gradcam_overlay(image, heatmap)
+    except Exception as exc:
+        print(f"Warm-up failed: {exc}")
+        return None
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+WARMUP_MS = warm_up_model()
+print(f"Startup: model_loaded={MODEL is not None} warmup_ms={WARMUP_MS}")
+
+
 with gr.Blocks(theme=gr.themes.Soft(), title="Brain Tumor Detection AI") as demo:
     gr.Markdown(
         """
@@ -0,0 +1,151 @@
+"""Dynamic micro-batching: merge concurrent inference requests into one forward pass."""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Bucket upper bounds (inclusive). The last bucket catches everything larger.
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+QUEUE_WAIT_MS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 250)
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram (non-cumulative counts per bucket)."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        idx = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                idx = i
+                break
+        with self._lock:
+            self._counts[idx] += 1
+            self._sum += value
+            self._count += 1
+            self._max = max(self._max, value)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            labels = [f"le_{b:g}" for b in self.buckets] + ["inf"]
+            return {
+                "buckets": dict(zip(labels, self._counts)),
+                "count": self._count,
+                "sum": round(self._sum, 3),
+                "mean": round(self._sum / self._count, 3) if self._count else 0.0,
+                "max": round(self._max, 3),
+            }
+
+
+class _Pending:
+    __slots__ = ("rows", "future", "enqueued_at")
+
+    def __init__(self, rows: np.ndarray):
+        self.rows = rows
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Collect preprocessed tensors from concurrent callers and run them as one batch.
+
+    A batch is dispatched when it holds ``max_batch_size`` rows or when the oldest
+    request has waited ``max_wait_ms``. Exposes ``predict(batch, verbose=0)`` so it can
+    stand in for a Keras model anywhere the vision agent expects one.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], np.ndarray],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.predict_fn = predict_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait_s = max(float(max_wait_ms), 0.0) / 1000.0
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_MS_BUCKETS)
+        self._queue: "queue.Queue[Optional[_Pending]]" = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, rows: np.ndarray) -> Future:
+        """Queue one or more rows (leading batch axis). Future resolves to their output rows."""
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        pending = _Pending(np.asarray(rows))
+        self._queue.put(pending)
+        return pending.future
+
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        """Model-compatible entry point: blocks until this caller's rows are scored."""
+        return self.submit(batch).result()
+
+    def stats(self) -> Dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_s * 1000.0,
+            "queue_depth": self._queue.qsize(),
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+        }
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join(timeout)
+
+    def _collect(self, first: _Pending) -> List[_Pending]:
+        group = [first]
+        rows = len(first.rows)
+        deadline = first.enqueued_at + self.max_wait_s
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Re-post the sentinel so the loop exits after this batch.
+                self._queue.put(None)
+                break
+            group.append(item)
+            rows += len(item.rows)
+        return group
+
+    def _loop(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            group = self._collect(first)
+            dispatched_at = time.perf_counter()
+            for item in group:
+                self.queue_wait_ms.observe((dispatched_at - item.enqueued_at) * 1000.0)
+            try:
+                batch = np.concatenate([item.rows for item in group], axis=0)
+                self.batch_sizes.observe(len(batch))
+                outputs = np.asarray(self.predict_fn(batch))
+            except Exception as exc:
+                for item in group:
+                    item.future.set_exception(exc)
+                continue
+            offset = 0
+            for item in group:
+                n = len(item.rows)
+                item.future.set_result(outputs[offset:offset + n])
+                offset += n
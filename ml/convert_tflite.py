@@ -0,0 +1,162 @@
+"""
+Convert the Keras model to TFLite and check that the converted model agrees with it.
+
+Usage:
+    python -m ml.convert_tflite [--model models/Brain_Tumors_vgg_final.h5] [--output models/Brain_Tumors_vgg_final.tflite]
+    python -m ml.convert_tflite --check-only --output models/Brain_Tumors_vgg_final.tflite
+
+After converting, every image under --images (one folder per class) is scored by both
+models. The check fails (exit code 1) if any top-1 label differs or a probability moves
+by more than --max-diff.
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agent.image_context import ImageContext  # noqa: E402
+from agent.vision_agent_tf import CLASS_LABELS  # noqa: E402
+
+DEFAULT_MODEL = os.path.join(ROOT, "models", "Brain_Tumors_vgg_final.h5")
+DEFAULT_IMAGES = os.path.join(ROOT, "image_data", "images")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+# Post-training quantization variants: "dynamic" stores int8 weights and computes in
+# float, "float16" halves the weights, "int8" quantizes weights and activations
+# (calibrated on sample images) with int8 input and output tensors.
+VARIANTS = ("dynamic", "float16", "int8")
+
+
+def default_output(model_path: str, variant: str = None) -> str:
+    suffix = f".{variant}" if variant else ""
+    return os.path.splitext(model_path)[0] + suffix + ".tflite"
+
+
+def convert(model_path: str, output_path: str, variant: str = None, calibration_images: List[str] = ()) -> int:
+    """Write a TFLite flatbuffer of the Keras model (float32, or a VARIANTS entry); returns its size in bytes."""
+    import tensorflow as tf
+
+    if variant is not None and variant not in VARIANTS:
+        raise ValueError(f"Unknown variant {variant!r}; expected one of {', '.join(VARIANTS)}")
+    if variant == "int8" and not calibration_images:
+        raise ValueError("The int8 variant needs calibration images.")
+    model = tf.keras.models.load_model(model_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if variant is not None:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == "int8":
+
+        def representative_dataset():
+            for path in calibration_images:
+                yield [ImageContext.from_source(path).model_input]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    flatbuffer = converter.convert()
+    with open(output_path, "wb") as f:
+        f.write(flatbuffer)
+    return len(flatbuffer)
+
+
+def labelled_images(image_dir: str, class_labels: List[str] = CLASS_LABELS) -> List[Tuple[str, str]]:
+    """(path, label) for every image in the per-class folders of image_dir."""
+    items = []
+    for label in class_labels:
+        folder = os.path.join(image_dir, label)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                items.append((os.path.join(folder, name), label))
+    return items
+
+
+def parity_check(reference, candidate, images: List[Tuple[str, str]], class_labels: List[str] = CLASS_LABELS) -> Dict:
+    """
+    Score each image with both models (anything with predict(batch, verbose=0)).
+    Returns agreement, the largest probability difference and each model's accuracy, overall
+    and per class (delta is candidate minus reference).
+    """
+    if not images:
+        raise ValueError("No labelled images to check against.")
+    ref_hits = cand_hits = agree = 0
+    max_abs_diff = 0.0
+    disagreements = []
+    per_class = {}
+    for path, label in images:
+        batch = ImageContext.from_source(path).model_input
+        ref = np.asarray(reference.predict(batch, verbose=0))[0]
+        cand = np.asarray(candidate.predict(batch, verbose=0))[0]
+        ref_label = class_labels[int(np.argmax(ref))]
+        cand_label = class_labels[int(np.argmax(cand))]
+        ref_hits += ref_label == label
+        cand_hits += cand_label == label
+        counts = per_class.setdefault(label, {"images": 0, "reference_hits": 0, "candidate_hits": 0})
+        counts["images"] += 1
+        counts["reference_hits"] += ref_label == label
+        counts["candidate_hits"] += cand_label == label
+        if ref_label == cand_label:
+            agree += 1
+        else:
+            disagreements.append({"image": os.path.relpath(path, ROOT), "reference": ref_label, "candidate": cand_label})
+        max_abs_diff = max(max_abs_diff, float(np.max(np.abs(ref - cand))))
+    n = len(images)
+    return {
+        "images": n,
+        "top1_agreement": agree / n,
+        "max_abs_diff": max_abs_diff,
+        "reference_accuracy": ref_hits / n,
+        "candidate_accuracy": cand_hits / n,
+        "per_class": {
+            label: {
+                "images": c["images"],
+                "reference_accuracy": c["reference_hits"] / c["images"],
+                "candidate_accuracy": c["candidate_hits"] / c["images"],
+                "delta": (c["candidate_hits"] - c["reference_hits"]) / c["images"],
+            }
+            for label, c in per_class.items()
+        },
+        "disagreements": disagreements,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH", DEFAULT_MODEL), help="Keras model to convert")
+    parser.add_argument("--output", help="TFLite file to write (default: next to --model)")
+    parser.add_argument("--images", default=DEFAULT_IMAGES, help="Folder with one subfolder of images per class")
+    parser.add_argument("--max-diff", type=float, default=1e-3, help="Largest allowed probability difference")
+    parser.add_argument("--check-only", action="store_true", help="Skip conversion; check an existing --output")
+    parser.add_argument("--no-check", action="store_true", help="Convert without the parity check")
+    args = parser.parse_args(argv)
+    output = args.output or default_output(args.model)
+
+    if not args.check_only:
+        size = convert(args.model, output)
+        print(f"Wrote {output} ({size / 1e6:.1f} MB)")
+    if args.no_check:
+        return 0
+
+    from ml.serving import load_keras_model
+    from ml.tflite_backend import load_tflite_model
+
+    report = parity_check(load_keras_model(args.model), load_tflite_model(output), labelled_images(args.images))
+    print(json.dumps(report, indent=2))
+    ok = report["top1_agreement"] == 1.0 and report["max_abs_diff"] <= args.max_diff
+    print("Parity check " + ("passed" if ok else "FAILED"))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""
+Score a model on a labelled image tree and report accuracy and throughput.
+
+Usage:
+    python -m ml.evaluate [--model models/Brain_Tumors_vgg_final.h5] [--backend keras|tflite]
+                          [--images image_data/images] [--batch-size 32] [--workers 2] [--prefetch 2]
+                          [--resample bicubic] [--draft-size 512] [--limit N] [--seed 0] [--output report.json]
+
+Images are read from --images/<class>/ in sorted order. Worker threads decode and preprocess
+whole batches ahead of the model (--prefetch batches at most) into a small ring of reused
+buffers, while the main thread runs batched inference. The report has the confusion matrix,
+per-class precision and recall, images/sec and the process's peak RSS. --output also writes it
+as JSON with every image's prediction.
+
+Runs are reproducible: the image order is fixed, --limit samples with --seed, seeds and
+(for keras) TensorFlow op determinism are set, and the report records the model file's
+SHA-256, the image list and the preprocessing settings. predictions_sha256 is the same for
+two runs that produced the same predictions, so compare it across model variants or
+preprocessing changes.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import resource
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agent.image_context import ImageContext  # noqa: E402
+from agent.vision_agent_tf import CLASS_LABELS  # noqa: E402
+from ml import preprocess  # noqa: E402
+from ml.convert_tflite import DEFAULT_IMAGES, DEFAULT_MODEL, default_output, labelled_images  # noqa: E402
+
+
+def prefetch_batches(
+    paths: Sequence[str],
+    batch_size: int,
+    workers: int = 2,
+    depth: int = 2,
+    resample: Optional[str] = None,
+    draft_size: int = preprocess.DRAFT_SIZE,
+) -> Iterator[np.ndarray]:
+    """
+    Yield preprocessed (n, 224, 224, 3) float32 batches of paths, in order. workers threads
+    decode up to depth batches ahead into a ring of depth reused buffers, so a yielded batch
+    is only valid until the next one is requested.
+    """
+    depth = max(1, depth)
+    width, height = preprocess.MODEL_SIZE
+    ring = [np.empty((batch_size, height, width, 3), dtype=np.float32) for _ in range(depth)]
+
+    def load(k: int, start: int) -> np.ndarray:
+        chunk = paths[start:start + batch_size]
+        out = ring[k % depth][:len(chunk)]
+        for row, path in zip(out, chunk):
+            preprocess.preprocess_into(ImageContext.from_source(path, draft_size=draft_size).image, row, resample)
+        return out
+
+    with ThreadPoolExecutor(max(1, workers)) as pool:
+        pending = deque()
+        for k, start in enumerate(range(0, len(paths), batch_size)):
+            if len(pending) == depth:
+                # The caller is done with the batch before asking for the next one, so batch
+                # k - depth's buffer is free again once this yield returns.
+                yield pending.popleft().result()
+            pending.append(pool.submit(load, k, start))
+        while pending:
+            yield pending.popleft().result()
+
+
+def confusion_matrix(truth: Sequence[int], predicted: Sequence[int], num_classes: int) -> np.ndarray:
+    """Counts with true classes as rows and predicted classes as columns."""
+    index = np.asarray(truth, dtype=np.int64) * num_classes + np.asarray(predicted, dtype=np.int64)
+    return np.bincount(index, minlength=num_classes * num_classes).reshape(num_classes, num_classes)
+
+
+def class_metrics(matrix: np.ndarray, class_labels: List[str]) -> Dict[str, Dict]:
+    """Per-class support, precision and recall from a confusion matrix (0.0 when undefined)."""
+    hits = np.diag(matrix)
+    predicted = matrix.sum(axis=0)
+    support = matrix.sum(axis=1)
+    return {
+        label: {
+            "support": int(support[i]),
+            "precision": float(hits[i] / predicted[i]) if predicted[i] else 0.0,
+            "recall": float(hits[i] / support[i]) if support[i] else 0.0,
+        }
+        for i, label in enumerate(class_labels)
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is kB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def select_images(images: List[Tuple[str, str]], limit: Optional[int], seed: int) -> List[Tuple[str, str]]:
+    """images, or a seeded sample of limit of them kept in their original order."""
+    if not limit or limit >= len(images):
+        return images
+    keep = set(random.Random(seed).sample(range(len(images)), limit))
+    return [item for i, item in enumerate(images) if i in keep]
+
+
+def set_deterministic(seed: int, backend: str) -> None:
+    random.seed(seed)
+    np.random.seed(seed)
+    if backend == "keras":
+        import tensorflow as tf
+
+        tf.keras.utils.set_random_seed(seed)
+        tf.config.experimental.enable_op_determinism()
+
+
+def evaluate(
+    model,
+    images: List[Tuple[str, str]],
+    class_labels: List[str] = CLASS_LABELS,
+    batch_size: int = 32,
+    workers: int = 2,
+    depth: int = 2,
+    resample: Optional[str] = None,
+    draft_size: int = preprocess.DRAFT_SIZE,
+) -> Dict:
+    """
+    Score (path, label) images with model (anything with predict(batch, verbose=0)).
+    Returns accuracy, the confusion matrix, per-class metrics, timings and per-image predictions.
+    """
+    if not images:
+        raise ValueError("No labelled images to evaluate.")
+    paths = [path for path, _ in images]
+    truth = [class_labels.index(label) for _, label in images]
+    probs = np.empty((len(images), len(class_labels)), dtype=np.float32)
+
+    wait_s = infer_s = 0.0
+    done = 0
+    start = time.perf_counter()
+    batches = prefetch_batches(paths, batch_size, workers, depth, resample, draft_size)
+    while True:
+        t0 = time.perf_counter()
+        batch = next(batches, None)
+        t1 = time.perf_counter()
+        wait_s += t1 - t0
+        if batch is None:
+            break
+        probs[done:done + len(batch)] = np.asarray(model.predict(batch, verbose=0))
+        infer_s += time.perf_counter() - t1
+        done += len(batch)
+    wall_s = time.perf_counter() - start
+
+    predicted = probs.argmax(axis=1)
+    matrix = confusion_matrix(truth, predicted, len(class_labels))
+    rounded = np.round(probs, 6)
+    return {
+        "images": len(images),
+        "accuracy": float(np.trace(matrix) / len(images)),
+        "class_labels": list(class_labels),
+        "confusion_matrix": matrix.tolist(),
+        "per_class": class_metrics(matrix, class_labels),
+        "seconds": wall_s,
+        "images_per_sec": len(images) / wall_s,
+        "inference_seconds": infer_s,
+        "input_wait_seconds": wait_s,
+        "peak_rss_mb": peak_rss_mb(),
+        "predictions_sha256": hashlib.sha256(rounded.tobytes() + predicted.astype(np.int64).tobytes()).hexdigest(),
+        "predictions": [
+            {"image": os.path.relpath(path, ROOT), "label": label, "predicted": class_labels[int(p)],
+             "probs": [float(x) for x in row]}
+            for (path, label), p, row in zip(images, predicted, rounded)
+        ],
+    }
+
+
+def render_markdown(report: Dict) -> str:
+    labels = report["class_labels"]
+    config = report["config"]
+    lines = [
+        "# Evaluation report",
+        "",
+        f"Model: `{config['model']}` ({config['backend']}, sha256 {config['model_sha256'][:12]}). "
+        f"Generated {report['generated']}.",
+        f"{report['images']} images from `{config['image_dir']}`; batch size {config['batch_size']}, "
+        f"resample {config['resample']}, draft size {config['draft_size']}.",
+        "",
+        f"Accuracy: {report['accuracy']:.1%}. Throughput: {report['images_per_sec']:.1f} images/sec "
+        f"({report['seconds']:.1f} s, {report['input_wait_seconds']:.1f} s waiting for input). "
+        f"Peak RSS: {report['peak_rss_mb']:.0f} MB.",
+        f"Predictions sha256: `{report['predictions_sha256']}`",
+        "",
+        "Confusion matrix (rows: true class, columns: predicted):",
+        "",
+        "| | " + " | ".join(labels) + " |",
+        "|---|" + "|".join("---:" for _ in labels) + "|",
+    ]
+    for label, row in zip(labels, report["confusion_matrix"]):
+        lines.append(f"| {label} | " + " | ".join(str(n) for n in row) + " |")
+    lines += ["", "| Class | Images | Precision | Recall |", "|-------|-------:|----------:|-------:|"]
+    for label, m in report["per_class"].items():
+        lines.append(f"| {label} | {m['support']} | {m['precision']:.1%} | {m['recall']:.1%} |")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", help="Model file (default: MODEL_PATH, or the repo model for --backend)")
+    parser.add_argument("--backend", default="keras", choices=("keras", "tflite"), help="How to load --model")
+    parser.add_argument("--images", default=DEFAULT_IMAGES, help="Folder with one subfolder of images per class")
+    parser.add_argument("--batch-size", type=int, default=32, help="Images per forward pass")
+    parser.add_argument("--workers", type=int, default=2, help="Threads decoding and preprocessing batches")
+    parser.add_argument("--prefetch", type=int, default=2, help="Batches prepared ahead of the model")
+    parser.add_argument("--resample", default=preprocess.RESAMPLE, choices=sorted(preprocess.RESAMPLE_FILTERS))
+    parser.add_argument(
+        "--draft-size", type=int, default=preprocess.DRAFT_SIZE, help="JPEG draft-decode size; 0 decodes in full"
+    )
+    parser.add_argument("--limit", type=int, help="Evaluate a seeded sample of this many images")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for --limit and the framework")
+    parser.add_argument("--output", help="Also write the report, with per-image predictions, as JSON")
+    args = parser.parse_args(argv)
+    model_path = args.model or os.getenv("MODEL_PATH") or (
+        DEFAULT_MODEL if args.backend == "keras" else default_output(DEFAULT_MODEL)
+    )
+
+    images = select_images(labelled_images(args.images), args.limit, args.seed)
+    if not images:
+        parser.error(f"No labelled images under {args.images}")
+
+    from ml.registry import resolve_backend
+
+    set_deterministic(args.seed, args.backend)
+    # Warming up at the batch size keeps the trace out of the timed run.
+    model = resolve_backend(args.backend)(model_path, (args.batch_size,))
+    report = evaluate(
+        model, images, CLASS_LABELS, args.batch_size, args.workers, args.prefetch, args.resample, args.draft_size
+    )
+    image_list = "\n".join(f"{os.path.relpath(p, args.images)}\t{label}" for p, label in images)
+    report = {
+        "generated": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC"),
+        "config": {
+            "model": os.path.relpath(os.path.abspath(model_path), ROOT),
+            "model_sha256": file_sha256(model_path),
+            "backend": args.backend,
+            "image_dir": os.path.relpath(os.path.abspath(args.images), ROOT),
+            "images_sha256": hashlib.sha256(image_list.encode()).hexdigest(),
+            "limit": args.limit,
+            "seed": args.seed,
+            "batch_size": args.batch_size,
+            "workers": args.workers,
+            "prefetch": args.prefetch,
+            "resample": args.resample,
+            "draft_size": args.draft_size,
+        },
+        **report,
+    }
+    print(render_markdown(report))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""
+Grad-CAM heatmap artifacts. Needs only NumPy and Pillow, so the web app can encode the
+heatmaps a model returns without importing TensorFlow; OpenCV is imported only to render
+overlays.
+
+A heatmap stays at the resolution of the model's last conv layer (14x14 for the VGG model)
+and is sent as an 8-bit grayscale PNG, a few hundred bytes base64-encoded. Clients upsample
+it to the 224x224 model input (or the original image) to draw an overlay.
+"""
+import base64
+import io
+from typing import Any, Dict
+
+import numpy as np
+from PIL import Image
+
+METHOD = "gradcam"
+
+
+def supports_explain(model) -> bool:
+    """True when model can return Grad-CAM heatmaps (ml.serving.ServingModel.explain)."""
+    return getattr(model, "explainable", False) is True
+
+
+def encode(cam: np.ndarray) -> str:
+    """Base64 PNG of a heatmap with values in [0, 1], quantized to 8 bits."""
+    pixels = np.clip(np.rint(np.asarray(cam, dtype=np.float32) * 255), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels, mode="L").save(buf, format="PNG", optimize=True)
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def decode(data: str) -> np.ndarray:
+    """Inverse of encode: a float32 heatmap in [0, 1]."""
+    img = Image.open(io.BytesIO(base64.b64decode(data)))
+    return np.asarray(img, dtype=np.float32) / 255.0
+
+
+def artifact(cam: np.ndarray, class_label: str) -> Dict[str, Any]:
+    """The explanation attached to a vision result."""
+    return {
+        "method": METHOD,
+        "class": class_label,
+        "shape": list(np.shape(cam)),
+        "heatmap_png": encode(cam),
+    }
+
+
+def overlay(base: np.ndarray, cam: np.ndarray) -> np.ndarray:
+    """
+    The Gradio Space's overlay: cam upsampled to base (uint8 RGB), coloured with OpenCV's JET
+    colormap and blended 60/40 over base.
+    """
+    import cv2
+
+    cam = cv2.resize(np.asarray(cam, dtype=np.float32), (base.shape[1], base.shape[0]))
+    color = cv2.applyColorMap(np.uint8(255 * cam), cv2.COLORMAP_JET)
+    color = cv2.cvtColor(color, cv2.COLOR_BGR2RGB)
+    return cv2.addWeighted(base, 0.6, color, 0.4, 0)
+
+
+def overlay_png(base: np.ndarray, cam: np.ndarray) -> bytes:
+    """overlay() encoded as PNG."""
+    buf = io.BytesIO()
+    Image.fromarray(overlay(base, cam)).save(buf, format="PNG")
+    return buf.getvalue()
@@ -0,0 +1,369 @@
+"""
+Inference process pool: N model-holding processes serving the web tier over local queues.
+
+Input tensors travel through POSIX shared memory (one block per request) so a batch is copied
+once into the block and read in place by the model process; only the small output array goes
+back over that process's pipe. A monitor thread restarts crashed or hung model processes, and
+retries processes that failed to load the model with exponential backoff.
+"""
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait as wait_connections
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ml.registry import import_loader
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the wait between attempts to reload a model process that failed to load.
+MAX_LOAD_BACKOFF = 60.0
+
+
+class InferenceWorkerError(RuntimeError):
+    """A model process failed, crashed, or timed out while handling a request."""
+
+
+def _worker_main(worker_id: int, loader: str, loader_args: Sequence, conn) -> None:
+    """Entry point of a model process: load once, then serve tasks until the None sentinel."""
+    try:
+        model = import_loader(loader)(*loader_args)
+    except Exception as exc:
+        conn.send(("load_failed", worker_id, os.getpid(), repr(exc)))
+        return
+    conn.send(("ready", worker_id, os.getpid(), None))
+
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            return
+        if msg is None:
+            return
+        if msg[0] == "ping":
+            conn.send(("pong", worker_id, msg[1], None))
+            continue
+        _, task_id, shm_name, shape, dtype = msg
+        # Spawned children share the parent's resource tracker, which already knows this
+        # block; the parent unlinks it once the result (or failure) is in.
+        shm = shared_memory.SharedMemory(name=shm_name)
+        try:
+            batch = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            out = np.asarray(model.predict(batch, verbose=0))
+            del batch
+            conn.send(("ok", worker_id, task_id, out))
+        except Exception as exc:
+            conn.send(("error", worker_id, task_id, repr(exc)))
+        finally:
+            shm.close()
+
+
+class _Task:
+    __slots__ = ("future", "shm", "started_at")
+
+    def __init__(self, shm: shared_memory.SharedMemory):
+        self.future: Future = Future()
+        self.shm = shm
+        self.started_at = time.monotonic()
+
+
+class _Worker:
+    def __init__(self, worker_id: int):
+        self.id = worker_id
+        self.process: Optional[mp.Process] = None
+        # One pipe per process rather than shared queues: a process killed mid-write can
+        # only break its own channel, never a lock the other processes also need.
+        self.conn = None
+        self.conn_closed = False
+        self.send_lock = threading.Lock()
+        self.pid: Optional[int] = None
+        self.ready = False
+        self.restarts = 0
+        # Error from this process's last failed load, cleared once a load succeeds.
+        self.load_error: Optional[str] = None
+        self.load_failures = 0
+        self.retry_at = 0.0
+        self.last_seen = time.monotonic()
+        self.ping_sent: Optional[float] = None
+        self.inflight: Dict[int, _Task] = {}
+
+
+class InferencePool:
+    """
+    Pool of model processes with a model-compatible predict(batch, verbose=0).
+
+    loader is a "module:function" path importable in the child; it is called with loader_args
+    and must return an object with predict(batch, verbose=0). Processes are started with the
+    spawn method because TensorFlow is not fork-safe.
+    """
+
+    def __init__(
+        self,
+        loader: str,
+        loader_args: Sequence = (),
+        num_workers: int = 1,
+        task_timeout: float = 120.0,
+        start_timeout: float = 180.0,
+        health_interval: float = 2.0,
+    ):
+        self.loader = loader
+        self.loader_args = tuple(loader_args)
+        self.task_timeout = task_timeout
+        self.start_timeout = start_timeout
+        self.health_interval = health_interval
+        self._ctx = mp.get_context("spawn")
+        self._lock = threading.Condition()
+        self._task_ids = itertools.count()
+        self._closed = False
+        self._workers: List[_Worker] = [_Worker(i) for i in range(max(int(num_workers), 1))]
+        for worker in self._workers:
+            self._start(worker)
+        self._listener = threading.Thread(target=self._listen, name="inference-pool-results", daemon=True)
+        self._listener.start()
+        self._monitor = threading.Thread(target=self._watch, name="inference-pool-monitor", daemon=True)
+        self._monitor.start()
+
+    # -- public API -------------------------------------------------------
+
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        """Run batch on the least-loaded ready model process and return its output."""
+        return self.submit(batch).result(timeout=self.task_timeout + self.health_interval * 2)
+
+    def submit(self, batch: np.ndarray) -> Future:
+        batch = np.ascontiguousarray(batch)
+        shm = shared_memory.SharedMemory(create=True, size=max(batch.nbytes, 1))
+        np.ndarray(batch.shape, dtype=batch.dtype, buffer=shm.buf)[...] = batch
+        task = _Task(shm)
+        try:
+            worker = self._acquire_worker()
+        except Exception:
+            self._release(task)
+            raise
+        with self._lock:
+            task_id = next(self._task_ids)
+            task.started_at = time.monotonic()
+            worker.inflight[task_id] = task
+        if not self._send(worker, ("predict", task_id, shm.name, batch.shape, batch.dtype.str)):
+            with self._lock:
+                unsent = worker.inflight.pop(task_id, None)
+            if unsent is not None:
+                self._release(unsent)
+                unsent.future.set_exception(InferenceWorkerError(f"model process {worker.pid} is gone"))
+        return task.future
+
+    @property
+    def load_error(self) -> Optional[str]:
+        """Load error of a model process whose last load failed, or None."""
+        with self._lock:
+            return next((w.load_error for w in self._workers if w.load_error is not None), None)
+
+    def is_ready(self) -> bool:
+        with self._lock:
+            return any(w.ready for w in self._workers)
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": any(w.ready for w in self._workers),
+                "load_error": next((w.load_error for w in self._workers if w.load_error), None),
+                "workers": [
+                    {
+                        "id": w.id,
+                        "pid": w.pid,
+                        "alive": bool(w.process is not None and w.process.is_alive()),
+                        "ready": w.ready,
+                        "in_flight": len(w.inflight),
+                        "restarts": w.restarts,
+                        "load_error": w.load_error,
+                        "last_seen_s": round(time.monotonic() - w.last_seen, 2),
+                    }
+                    for w in self._workers
+                ],
+            }
+
+    def close(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+        for w in workers:
+            self._send(w, None)
+        for w in workers:
+            if w.process is not None:
+                w.process.join(timeout)
+                if w.process.is_alive():
+                    w.process.kill()
+            self._fail_inflight(w, "inference pool closed")
+        self._listener.join(timeout)
+
+    # -- internals --------------------------------------------------------
+
+    def _start(self, worker: _Worker) -> None:
+        parent_conn, child_conn = self._ctx.Pipe()
+        with worker.send_lock:
+            if worker.conn is not None:
+                worker.conn.close()
+            worker.conn, worker.conn_closed = parent_conn, False
+        worker.ready = False
+        worker.ping_sent = None
+        worker.last_seen = time.monotonic()
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.id, self.loader, self.loader_args, child_conn),
+            name=f"inference-worker-{worker.id}",
+            daemon=True,
+        )
+        worker.process.start()
+        worker.pid = worker.process.pid
+        child_conn.close()
+
+    def _send(self, worker: _Worker, msg) -> bool:
+        """Send msg to a model process; False if its pipe is already broken."""
+        with worker.send_lock:
+            conn = worker.conn
+            if conn is None or worker.conn_closed:
+                return False
+            try:
+                conn.send(msg)
+            except OSError:
+                worker.conn_closed = True
+                return False
+        return True
+
+    def _acquire_worker(self) -> _Worker:
+        deadline = time.monotonic() + self.start_timeout
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise InferenceWorkerError("inference pool closed")
+                ready = [w for w in self._workers if w.ready]
+                if ready:
+                    return min(ready, key=lambda w: len(w.inflight))
+                # Fail fast only when every process's last load failed; while any is still
+                # loading, wait for it. The monitor keeps retrying the failed ones.
+                if all(w.load_error is not None for w in self._workers):
+                    raise InferenceWorkerError(f"model failed to load: {self._workers[0].load_error}")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise InferenceWorkerError("no model process became ready in time")
+                self._lock.wait(remaining)
+
+    @staticmethod
+    def _release(task: _Task) -> None:
+        task.shm.close()
+        task.shm.unlink()
+
+    def _fail_inflight(self, worker: _Worker, reason: str) -> None:
+        with self._lock:
+            tasks = list(worker.inflight.values())
+            worker.inflight.clear()
+        for task in tasks:
+            self._release(task)
+            if not task.future.done():
+                task.future.set_exception(InferenceWorkerError(reason))
+
+    def _listen(self) -> None:
+        while True:
+            with self._lock:
+                if self._closed and not any(w.inflight for w in self._workers):
+                    return
+                conns = {w.conn: w for w in self._workers if w.conn is not None and not w.conn_closed}
+            # Time out regularly so pipes replaced by a restart are picked up.
+            try:
+                readable = wait_connections(list(conns), timeout=0.2)
+            except (OSError, ValueError):
+                continue  # a pipe was closed by a restart while we waited
+            for conn in readable:
+                worker = conns[conn]
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    # The process exited; the monitor restarts it and fails its requests.
+                    with self._lock:
+                        if worker.conn is conn:
+                            worker.conn_closed = True
+                            worker.ready = False
+                    continue
+                self._handle(worker, msg)
+
+    def _handle(self, worker: _Worker, msg) -> None:
+        kind, worker_id, ref, payload = msg
+        with self._lock:
+            worker.last_seen = time.monotonic()
+            if kind == "ready":
+                worker.ready = True
+                worker.load_error = None
+                worker.load_failures = 0
+                self._lock.notify_all()
+                logger.info("Inference worker %d ready (pid %s)", worker_id, ref)
+                return
+            if kind == "load_failed":
+                worker.load_error = payload
+                worker.load_failures += 1
+                backoff = min(self.health_interval * 2 ** (worker.load_failures - 1), MAX_LOAD_BACKOFF)
+                worker.retry_at = time.monotonic() + backoff
+                self._lock.notify_all()
+                logger.error(
+                    "Inference worker %d failed to load model (retry in %.1fs): %s", worker_id, backoff, payload
+                )
+                return
+            if kind == "pong":
+                worker.ping_sent = None
+                return
+            task = worker.inflight.pop(ref, None)
+        if task is None:
+            return
+        self._release(task)
+        if kind == "ok":
+            task.future.set_result(payload)
+        else:
+            task.future.set_exception(InferenceWorkerError(payload))
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(self.health_interval)
+            with self._lock:
+                if self._closed:
+                    return
+                workers = list(self._workers)
+            now = time.monotonic()
+            for w in workers:
+                alive = w.process is not None and w.process.is_alive()
+                if not alive:
+                    with self._lock:
+                        load_error, retry_at = w.load_error, w.retry_at
+                    if load_error is not None:
+                        if now >= retry_at:
+                            self._restart(w, f"retrying model load after: {load_error}")
+                        continue
+                    self._restart(w, f"model process {w.pid} exited with code {w.process.exitcode}")
+                    continue
+                with self._lock:
+                    oldest = min((t.started_at for t in w.inflight.values()), default=None)
+                    idle = not w.inflight
+                if oldest is not None and now - oldest > self.task_timeout:
+                    self._restart(w, f"model process {w.pid} exceeded task timeout")
+                elif idle and w.ready:
+                    if w.ping_sent is not None and now - w.ping_sent > self.task_timeout:
+                        self._restart(w, f"model process {w.pid} stopped answering health checks")
+                    elif w.ping_sent is None:
+                        w.ping_sent = now
+                        self._send(w, ("ping", now))
+
+    def _restart(self, worker: _Worker, reason: str) -> None:
+        logger.warning("Restarting inference worker %d: %s", worker.id, reason)
+        if worker.process is not None and worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join(5)
+        self._fail_inflight(worker, reason)
+        with self._lock:
+            if self._closed:
+                return
+            worker.restarts += 1
+            self._start(worker)
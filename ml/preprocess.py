@@ -1,16 +1,111 @@
-"""Image preprocessing for the brain tumor model."""
+"""
+Image preprocessing for the brain tumor model, shared by the Flask app and the Gradio Space
+(hf_space/app.py). Needs only NumPy and Pillow.
+
+Images are resized straight into a float32 batch buffer and scaled to [0, 1] in the same
+NumPy call, so no intermediate float array is made. Batch buffers are reused per thread.
+"""
+import io
+import os
+import threading
+from typing import Optional, Sequence, Tuple
+
 import numpy as np
 from PIL import Image
 
+MODEL_SIZE = (224, 224)
+
+RESAMPLE_FILTERS = {
+    "nearest": Image.Resampling.NEAREST,
+    "box": Image.Resampling.BOX,
+    "bilinear": Image.Resampling.BILINEAR,
+    "hamming": Image.Resampling.HAMMING,
+    "bicubic": Image.Resampling.BICUBIC,
+    "lanczos": Image.Resampling.LANCZOS,
+}
+# bicubic is PIL's default and what the model has always been fed; box and bilinear are
+# faster at a small cost in fidelity (benchmarks/preprocess.py).
+RESAMPLE = os.getenv("PREPROCESS_RESAMPLE", "bicubic")
+# JPEGs are decoded with Image.draft at the smallest DCT scale that keeps both sides at least
+# DRAFT_SIZE pixels, so 2k-4k uploads skip most of the decode. 0 always decodes in full.
+DRAFT_SIZE = int(os.getenv("PREPROCESS_DRAFT_SIZE", "512"))
+
+_INV_255 = np.float32(1.0 / 255.0)
+
+
+def resample_filter(name: Optional[str] = None) -> Image.Resampling:
+    """PIL filter for a RESAMPLE_FILTERS name (default: RESAMPLE)."""
+    name = name or RESAMPLE
+    try:
+        return RESAMPLE_FILTERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown resample filter {name!r}; expected one of {', '.join(RESAMPLE_FILTERS)}") from None
+
+
+def decode_image(source, draft_size: Optional[int] = DRAFT_SIZE) -> Tuple[Image.Image, Tuple[int, int]]:
+    """
+    Decode a path, file-like or bytes, draft-decoding JPEGs down to draft_size (0/None: full).
+    Returns the image and the file's own (width, height), which a draft decode does not keep.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    img = Image.open(source)
+    source_size = img.size
+    if draft_size and img.format == "JPEG":
+        img.draft("RGB", (draft_size, draft_size))
+    img.load()
+    return img, source_size
+
+
+def open_image(source, draft_size: Optional[int] = DRAFT_SIZE) -> Image.Image:
+    """decode_image without the source size."""
+    return decode_image(source, draft_size)[0]
+
+
+def preprocess_into(image: Image.Image, out: np.ndarray, resample: Optional[str] = None) -> np.ndarray:
+    """Resize image to MODEL_SIZE and write it, scaled to [0, 1], into out (224, 224, 3) float32."""
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    resized = image.resize(MODEL_SIZE, resample_filter(resample))
+    # dtype pins the loop to float32 (NumPy 1.x would otherwise compute in float16).
+    np.multiply(np.asarray(resized), _INV_255, out=out, dtype=np.float32)
+    return out
+
+
+class _BatchBuffers(threading.local):
+    array: Optional[np.ndarray] = None
+
+
+_buffers = _BatchBuffers()
+
+
+def batch_buffer(size: int) -> np.ndarray:
+    """
+    A (size, 224, 224, 3) float32 view of this thread's reusable buffer, grown on demand.
+    The thread's next call overwrites it: run the model on it before preprocessing again.
+    """
+    array = _buffers.array
+    if array is None or len(array) < size:
+        array = _buffers.array = np.empty((size, MODEL_SIZE[1], MODEL_SIZE[0], 3), dtype=np.float32)
+    return array[:size]
+
+
+def preprocess_batch(images: Sequence[Image.Image], resample: Optional[str] = None) -> np.ndarray:
+    """Preprocess decoded images into this thread's batch buffer (see batch_buffer)."""
+    batch = batch_buffer(len(images))
+    for image, row in zip(images, batch):
+        preprocess_into(image, row, resample)
+    return batch
+
 
-def preprocess_image(image_path):
+def preprocess_image(image):
     """
     Preprocess the uploaded image to make it compatible with the model.
+    Accepts a path, a file-like object, or an already-decoded PIL image. Returns a new
+    (1, 224, 224, 3) float32 array that the caller owns.
     """
-    img = Image.open(image_path).convert("RGB")
-    img = img.resize((224, 224))
-    # Use float32 and an in-place normalization step to reduce peak memory usage.
-    img_array = np.asarray(img, dtype=np.float32)
-    img_array *= 1.0 / 255.0
-    img_array = img_array[None, ...]
-    return img_array
+    if not isinstance(image, Image.Image):
+        image = open_image(image)
+    out = np.empty((1, MODEL_SIZE[1], MODEL_SIZE[0], 3), dtype=np.float32)
+    preprocess_into(image, out[0])
+    return out
@@ -0,0 +1,175 @@
+"""
+Build post-training quantized TFLite variants of the model and report size, latency and accuracy.
+
+Usage:
+    python -m ml.quantize [--model models/Brain_Tumors_vgg_final.h5] [--variants dynamic,float16,int8]
+                          [--images image_data/images] [--calibration-size 100] [--seed 0]
+                          [--report models/quantization_report.md]
+
+Writes models/Brain_Tumors_vgg_final.<variant>.tflite for each variant. The int8 variant is
+calibrated on a seeded sample of the images under --images/<class>, drawn from each class
+in proportion to its size. Every variant is then scored against the
+Keras model on the same images. The Markdown report (and a .json twin) lists file size,
+batch-1 p50 latency, top-1 agreement and accuracy per class, as a delta from the Keras model.
+Serve a variant with MODEL_VARIANT=<variant>.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agent.image_context import ImageContext  # noqa: E402
+from ml.convert_tflite import DEFAULT_IMAGES, DEFAULT_MODEL, VARIANTS, convert, default_output, labelled_images, parity_check  # noqa: E402
+from ml.evaluate import select_images  # noqa: E402
+
+
+def p50_latency_ms(model, batch, iters: int, warmup: int = 2) -> float:
+    for _ in range(warmup):
+        model.predict(batch, verbose=0)
+    samples = []
+    for _ in range(iters):
+        start = time.perf_counter()
+        model.predict(batch, verbose=0)
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(samples, 50))
+
+
+def calibration_sample(images: List[Tuple[str, str]], size: int, seed: int = 0) -> List[str]:
+    """
+    Paths of a seeded sample of size images, stratified by class: each class gets its share
+    of size in proportion to its image count (largest remainders get the leftover places).
+    """
+    if size >= len(images):
+        return [path for path, _ in images]
+    by_class: Dict[str, List[Tuple[str, str]]] = {}
+    for item in images:
+        by_class.setdefault(item[1], []).append(item)
+    quotas = {label: size * len(items) / len(images) for label, items in by_class.items()}
+    counts = {label: int(quota) for label, quota in quotas.items()}
+    leftover = size - sum(counts.values())
+    for label in sorted(quotas, key=lambda label: counts[label] - quotas[label])[:leftover]:
+        counts[label] += 1
+    return [
+        path
+        for label, items in by_class.items() if counts[label]
+        for path, _ in select_images(items, counts[label], seed)
+    ]
+
+
+def render_markdown(report: Dict) -> str:
+    rows = report["variants"]
+    lines = [
+        "# Quantization report",
+        "",
+        f"Model: `{report['model']}`. Generated {report['generated']}.",
+        f"Evaluated on {report['images']} images from `{report['image_dir']}`; int8 calibrated on {report['calibration_images']} of them "
+        f"(stratified by class, seed {report['calibration_seed']}).",
+        "The same images are used for calibration and evaluation, so treat the int8 accuracy as optimistic.",
+        "",
+        "| Variant | File | Size MB | p50 ms (batch 1) | Top-1 agreement | Accuracy | Δ accuracy |",
+        "|---------|------|--------:|-----------------:|----------------:|---------:|-----------:|",
+    ]
+    for row in rows:
+        lines.append(
+            f"| {row['variant']} | `{os.path.basename(row['path'])}` | {row['size_mb']:.1f} | {row['p50_ms']:.0f} "
+            f"| {row['top1_agreement']:.0%} | {row['accuracy']:.1%} | {row['accuracy_delta']:+.1%} |"
+        )
+    labels = list(rows[0]["per_class"])
+    lines += [
+        "",
+        "Per-class accuracy (Δ from the Keras model):",
+        "",
+        "| Class | Images | " + " | ".join(row["variant"] for row in rows) + " |",
+        "|-------|-------:|" + "|".join("------:" for _ in rows) + "|",
+    ]
+    for label in labels:
+        cells = []
+        for row in rows:
+            c = row["per_class"][label]
+            cells.append(f"{c['accuracy']:.0%}" if row["variant"] == "keras" else f"{c['accuracy']:.0%} ({c['delta']:+.0%})")
+        lines.append(f"| {label} | {rows[0]['per_class'][label]['images']} | " + " | ".join(cells) + " |")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH", DEFAULT_MODEL), help="Keras model to quantize")
+    parser.add_argument("--variants", default=",".join(VARIANTS), help=f"Comma-separated subset of {','.join(VARIANTS)}")
+    parser.add_argument("--images", default=DEFAULT_IMAGES, help="Folder with one subfolder of images per class")
+    parser.add_argument("--calibration-size", type=int, default=100, help="Images used to calibrate int8")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the calibration sample")
+    parser.add_argument("--iters", type=int, default=20, help="Timed calls per variant")
+    parser.add_argument("--report", help="Markdown report path (default: quantization_report.md next to --model)")
+    args = parser.parse_args(argv)
+    variants = [v.strip() for v in args.variants.split(",") if v.strip()]
+    report_path = args.report or os.path.join(os.path.dirname(os.path.abspath(args.model)), "quantization_report.md")
+
+    images = labelled_images(args.images)
+    if not images:
+        parser.error(f"No labelled images under {args.images}")
+    calibration = calibration_sample(images, args.calibration_size, args.seed)
+    sample = ImageContext.from_source(images[0][0]).model_input
+
+    from ml.serving import load_keras_model
+    from ml.tflite_backend import load_tflite_model
+
+    reference = load_keras_model(args.model)
+    baseline = parity_check(reference, reference, images)
+    rows = [{
+        "variant": "keras",
+        "path": args.model,
+        "size_mb": os.path.getsize(args.model) / 1e6,
+        "p50_ms": p50_latency_ms(reference, sample, args.iters),
+        "top1_agreement": 1.0,
+        "accuracy": baseline["reference_accuracy"],
+        "accuracy_delta": 0.0,
+        "per_class": {label: {"images": c["images"], "accuracy": c["reference_accuracy"], "delta": 0.0}
+                      for label, c in baseline["per_class"].items()},
+    }]
+    for variant in variants:
+        path = default_output(args.model, variant)
+        size = convert(args.model, path, variant, calibration)
+        print(f"Wrote {path} ({size / 1e6:.1f} MB)")
+        candidate = load_tflite_model(path)
+        parity = parity_check(reference, candidate, images)
+        rows.append({
+            "variant": variant,
+            "path": path,
+            "size_mb": size / 1e6,
+            "p50_ms": p50_latency_ms(candidate, sample, args.iters),
+            "top1_agreement": parity["top1_agreement"],
+            "accuracy": parity["candidate_accuracy"],
+            "accuracy_delta": parity["candidate_accuracy"] - parity["reference_accuracy"],
+            "per_class": {label: {"images": c["images"], "accuracy": c["candidate_accuracy"], "delta": c["delta"]}
+                          for label, c in parity["per_class"].items()},
+        })
+
+    report = {
+        "model": os.path.relpath(os.path.abspath(args.model), ROOT),
+        "generated": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC"),
+        "image_dir": os.path.relpath(os.path.abspath(args.images), ROOT),
+        "images": len(images),
+        "calibration_images": len(calibration),
+        "calibration_seed": args.seed,
+        "variants": rows,
+    }
+    markdown = render_markdown(report)
+    with open(report_path, "w") as f:
+        f.write(markdown)
+    with open(os.path.splitext(report_path)[0] + ".json", "w") as f:
+        json.dump(report, f, indent=2)
+    print(markdown)
+    print(f"Report written to {report_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
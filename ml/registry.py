@@ -0,0 +1,264 @@
+"""
+Model registry: load the model off the import path, inline or on a background thread, and
+hot-swap it for a new file while requests are in flight.
+
+Importing the web app no longer imports TensorFlow; the loader does, when it runs. Routes
+that do not need the model answer while the registry is still "loading".
+
+Backends are named loaders ("keras", "tflite"); each loaded model is a ModelHandle with
+its backend, version and path. Requests pin the handle they started with, so a swap never
+changes the model (or version) under a running request, and a replaced model is closed
+only once its last request has released it.
+"""
+import importlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Backend name -> "module:function" loader. Loaders take (path, warmup_batch_sizes, option)
+# and return an object with predict(batch, verbose=0). Strings, so that InferencePool
+# workers can import the loader themselves and nothing is imported until a load.
+BACKENDS: Dict[str, str] = {
+    "keras": "ml.serving:load_keras_model",
+    "tflite": "ml.tflite_backend:load_tflite_model",
+}
+
+# Descriptions of replaced models kept for /healthz.
+HISTORY_SIZE = 5
+
+
+class ReloadInProgress(RuntimeError):
+    """Another reload holds the registry."""
+
+
+def register_backend(name: str, loader: str) -> None:
+    """Make a "module:function" loader available under name."""
+    BACKENDS[name] = loader
+
+
+def import_loader(spec: str) -> Callable:
+    """Import and return a "module:function" loader."""
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def resolve_backend(name: str) -> Callable:
+    """Import and return the loader registered under name."""
+    try:
+        spec = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown model backend {name!r}; expected one of {', '.join(sorted(BACKENDS))}") from None
+    return import_loader(spec)
+
+
+class ModelHandle:
+    """A loaded model plus what identifies it. version feeds result cache keys and responses."""
+
+    def __init__(self, model: Any, backend: str = "custom", version: str = "", path: str = ""):
+        self.model = model
+        self.backend = backend
+        self.version = version or f"runtime-{id(model):x}"
+        self.path = path
+        self.loaded_at = time.time()
+        self.users = 0
+        self.retired = False
+        self.closed = False
+        # Whatever reload()'s prepare step returned for this model (e.g. its warm-up).
+        self.prepared: Any = None
+
+    def close(self) -> None:
+        self.closed = True
+        close = getattr(self.model, "close", None)
+        if callable(close):
+            close()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "version": self.version,
+            "path": self.path,
+            "loaded_at": round(self.loaded_at, 3),
+            "in_flight": self.users,
+        }
+
+
+class ModelRegistry:
+    """
+    Runs loader() once per load() call and hands the result to on_loaded(model). state is
+    "idle", "loading", "ready" or "failed". A failed load leaves whatever on_loaded last
+    published untouched. loader may return a ModelHandle or a bare model.
+
+    swap() replaces the current model atomically. on_retired(handle) runs once a replaced
+    model has no requests left, right before it is closed.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Any],
+        on_loaded: Callable[[Any], None],
+        on_retired: Optional[Callable[[ModelHandle], None]] = None,
+    ):
+        self._loader = loader
+        self._on_loaded = on_loaded
+        self._on_retired = on_retired
+        self._lock = threading.Lock()
+        self._swap_lock = threading.RLock()
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.state = "idle"
+        self.error: Optional[str] = None
+        self.load_ms: Optional[float] = None
+        self.pid: Optional[int] = None
+        self.current: Optional[ModelHandle] = None
+        self._retiring: List[ModelHandle] = []
+        self.history: List[Dict[str, Any]] = []
+
+    @property
+    def loading(self) -> bool:
+        return self.state == "loading"
+
+    def load(self, background: bool = False) -> None:
+        """Start a load unless one is already running in this process."""
+        with self._lock:
+            if self.state == "loading" and self.pid == os.getpid():
+                return
+            self.state = "loading"
+            self.error = None
+            self.pid = os.getpid()
+            self._done.clear()
+        if background:
+            # Not a daemon: interpreter shutdown waits for the load instead of tearing
+            # TensorFlow down halfway through its import.
+            self._thread = threading.Thread(target=self._run, name="model-load")
+            self._thread.start()
+        else:
+            self._run()
+
+    def _run(self) -> None:
+        start = time.perf_counter()
+        try:
+            self.swap(self._loader())
+        except Exception as exc:
+            self.error = repr(exc)
+            self.state = "failed"
+            logger.exception("Model load failed")
+        else:
+            self.state = "ready"
+        finally:
+            self.load_ms = round((time.perf_counter() - start) * 1000, 2)
+            self._done.set()
+
+    def swap(self, loaded: Any) -> ModelHandle:
+        """Make loaded (a ModelHandle or bare model) current and retire the previous one."""
+        handle = loaded if isinstance(loaded, ModelHandle) else ModelHandle(loaded)
+        with self._swap_lock:
+            with self._lock:
+                previous, self.current = self.current, handle
+            self._on_loaded(handle.model)
+        if previous is not None:
+            self._retire(previous)
+        logger.info("Serving %s model %s", handle.backend, handle.version)
+        return handle
+
+    def reload(self, loader: Callable[[], Any], prepare: Optional[Callable[[ModelHandle], Any]] = None) -> ModelHandle:
+        """
+        Load a replacement with loader() while the current model keeps serving, run
+        prepare(handle) on it (e.g. warm-up; raise to reject it; the return value is kept
+        as handle.prepared), then swap it in. A failure leaves the current model in place
+        and is raised to the caller.
+        """
+        if not self._swap_lock.acquire(blocking=False):
+            raise ReloadInProgress("A model reload is already in progress.")
+        try:
+            loaded = loader()
+            handle = loaded if isinstance(loaded, ModelHandle) else ModelHandle(loaded)
+            if prepare is not None:
+                try:
+                    handle.prepared = prepare(handle)
+                except Exception:
+                    self._close(handle)
+                    raise
+            self.swap(handle)
+            self.state = "ready"
+            self.error = None
+            return handle
+        finally:
+            self._swap_lock.release()
+
+    def _retire(self, handle: ModelHandle) -> None:
+        with self._lock:
+            handle.retired = True
+            self.history = ([handle.describe()] + self.history)[:HISTORY_SIZE]
+            idle = handle.users == 0
+            if not idle:
+                self._retiring.append(handle)
+        if idle:
+            self._close(handle)
+
+    def _close(self, handle: ModelHandle) -> None:
+        if self._on_retired is not None:
+            self._on_retired(handle)
+        handle.close()
+
+    def acquire(self, model: Any) -> Optional[ModelHandle]:
+        """Pin the live handle serving model (None if it is unknown or already closed)."""
+        with self._lock:
+            for handle in [self.current] + self._retiring:
+                if handle is not None and handle.model is model and not handle.closed:
+                    handle.users += 1
+                    return handle
+        return None
+
+    def acquire_current(self) -> Tuple[Any, Optional[ModelHandle]]:
+        """Pin the current handle and return (its model, handle); (None, None) before the first load."""
+        with self._lock:
+            handle = self.current
+            if handle is None:
+                return None, None
+            handle.users += 1
+            return handle.model, handle
+
+    def release(self, handle: ModelHandle) -> None:
+        with self._lock:
+            handle.users -= 1
+            close = handle.retired and handle.users == 0 and handle in self._retiring
+            if close:
+                self._retiring.remove(handle)
+        if close:
+            self._close(handle)
+
+    @contextmanager
+    def pinned(self, model: Any) -> Iterator[Optional[ModelHandle]]:
+        """Hold model's handle for the duration of a request."""
+        handle = self.acquire(model)
+        try:
+            yield handle
+        finally:
+            if handle is not None:
+                self.release(handle)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the current load finishes; True if it succeeded."""
+        if self.state == "idle":
+            return False
+        self._done.wait(timeout)
+        return self.state == "ready"
+
+    def snapshot(self) -> Dict[str, Any]:
+        current = self.current.describe() if self.current is not None else None
+        return {"state": self.state, "load_ms": self.load_ms, "error": self.error, "current": current}
+
+    def describe(self) -> Dict[str, Any]:
+        """Current model, models still draining and recently replaced ones."""
+        with self._lock:
+            return {
+                "current": self.current.describe() if self.current is not None else None,
+                "draining": [h.describe() for h in self._retiring],
+                "history": list(self.history),
+                "backends": sorted(BACKENDS),
+            }
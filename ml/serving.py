@@ -0,0 +1,112 @@
+"""
+Serving wrapper: run a Keras model through one traced tf.function instead of model.predict().
+
+model.predict() builds a data adapter, callbacks and a progress bar on every call, which for
+a single 224x224 image costs more than the forward pass on small hosts. A tf.function with a
+fixed (None, 224, 224, 3) float32 signature is traced once and reused for every batch size.
+"""
+import logging
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+logger = logging.getLogger(__name__)
+
+INPUT_SIGNATURE = (tf.TensorSpec(shape=(None, 224, 224, 3), dtype=tf.float32, name="images"),)
+
+
+def last_conv_layer(model: tf.keras.Model) -> tf.keras.layers.Layer:
+    """The last Conv2D layer, whose activations Grad-CAM weights."""
+    for layer in reversed(model.layers):
+        if isinstance(layer, tf.keras.layers.Conv2D):
+            return layer
+    raise ValueError("No Conv2D layer found in model.")
+
+
+class ServingModel:
+    """
+    Model-compatible wrapper: predict(batch, verbose=0) -> np.ndarray of class probabilities.
+    The underlying Keras model stays available as .model; explain() adds Grad-CAM heatmaps.
+    """
+
+    explainable = True
+
+    def __init__(self, model: tf.keras.Model):
+        self.model = model
+        self._serve = tf.function(self._forward, input_signature=INPUT_SIGNATURE)
+        self._explain: Optional[tf.types.experimental.GenericFunction] = None
+        self.warmup_ms: Dict[int, float] = {}
+
+    def _forward(self, images):
+        return self.model(images, training=False)
+
+    def predict(self, batch, verbose: int = 0) -> np.ndarray:
+        return self._serve(tf.convert_to_tensor(batch, dtype=tf.float32)).numpy()
+
+    def _build_explain(self):
+        """
+        One traced function that returns the class probabilities and the Grad-CAM heatmap of
+        the predicted class from a single forward pass. The conv-output model is built here,
+        once per loaded model; a reload creates a new ServingModel and with it a new one.
+        """
+        conv = last_conv_layer(self.model)
+        cam_model = tf.keras.Model(self.model.inputs, [conv.output, self.model.output])
+
+        def explain(images):
+            with tf.GradientTape() as tape:
+                conv_out, probs = cam_model(images, training=False)
+                # Images in a batch do not interact, so the gradient of the summed top-class
+                # scores gives every image the gradient of its own score.
+                top = tf.reduce_max(probs, axis=-1)
+            grads = tape.gradient(top, conv_out)
+            weights = tf.reduce_mean(grads, axis=(1, 2), keepdims=True)
+            cams = tf.nn.relu(tf.reduce_sum(conv_out * weights, axis=-1))
+            return probs, tf.math.divide_no_nan(cams, tf.reduce_max(cams, axis=(1, 2), keepdims=True))
+
+        return tf.function(explain, input_signature=INPUT_SIGNATURE)
+
+    def explain(self, batch) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Predict and explain in one pass: (probs (N, classes), heatmaps (N, h, w) in [0, 1]),
+        each heatmap for that image's predicted class at the last conv layer's resolution.
+        """
+        if self._explain is None:
+            self._explain = self._build_explain()
+        probs, cams = self._explain(tf.convert_to_tensor(batch, dtype=tf.float32))
+        return probs.numpy(), cams.numpy()
+
+    def warmup(self, batch_sizes: Sequence[int] = (1,)) -> Dict[int, float]:
+        """
+        Trace the function and run one zero batch per size so kernel selection and buffer
+        allocation happen before the first request. Returns milliseconds per batch size.
+        """
+        for size in batch_sizes:
+            start = time.perf_counter()
+            self.predict(np.zeros((size, 224, 224, 3), dtype=np.float32))
+            self.warmup_ms[size] = round((time.perf_counter() - start) * 1000, 2)
+        logger.info("Serving function warmed up: %s", self.warmup_ms)
+        return self.warmup_ms
+
+    @property
+    def tracing_count(self) -> int:
+        return self._serve.experimental_get_tracing_count()
+
+
+def as_serving_model(model, warmup_batch_sizes: Sequence[int] = ()):
+    """Wrap a Keras model in ServingModel (and warm it up); return anything else unchanged."""
+    if not isinstance(model, tf.keras.Model):
+        return model
+    serving = ServingModel(model)
+    if warmup_batch_sizes:
+        serving.warmup(warmup_batch_sizes)
+    return serving
+
+
+def load_keras_model(model_path: str, warmup_batch_sizes: Sequence[int] = (), serving_function: bool = True):
+    """Load a Keras model file for serving. Used in-process and as the InferencePool loader."""
+    model = tf.keras.models.load_model(model_path)
+    if serving_function:
+        model = as_serving_model(model, warmup_batch_sizes)
+    return model
@@ -0,0 +1,113 @@
+"""
+TFLite serving backend: run a converted model with the TFLite interpreter on CPU.
+
+The interpreter applies XNNPACK's multithreaded float kernels by default, so a converted
+model needs neither the Keras runtime nor TensorFlow's graph executor. The interpreter
+comes from the first of ai_edge_litert, tflite_runtime or tensorflow.lite that imports;
+the first two are small standalone wheels, the last pulls in all of TensorFlow.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (respects container CPU sets, unlike os.cpu_count())."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def interpreter_class():
+    """Return the lightest available TFLite Interpreter class."""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteModel:
+    """
+    Model-compatible wrapper: predict(batch, verbose=0) -> np.ndarray of class probabilities,
+    the same contract vision_agent_tf expects from the Keras model.
+
+    The batch dimension is resized on demand; re-allocating tensors is only paid when the
+    batch size changes. One interpreter is not thread-safe, so calls are serialized.
+    Full-integer models (int8/uint8 input and output) are quantized and dequantized here,
+    so callers always pass and receive float32.
+    """
+
+    def __init__(self, model_path: str, num_threads: Optional[int] = None):
+        self.model_path = model_path
+        self.num_threads = num_threads or available_cpus()
+        self._interpreter = interpreter_class()(model_path=model_path, num_threads=self.num_threads)
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = None
+        self._lock = threading.Lock()
+        self.warmup_ms: Dict[int, float] = {}
+
+    def _resize(self, batch_size: int) -> None:
+        if batch_size == self._batch_size:
+            return
+        shape = list(self._input["shape"])
+        shape[0] = batch_size
+        self._interpreter.resize_tensor_input(self._input["index"], shape)
+        self._interpreter.allocate_tensors()
+        self._batch_size = batch_size
+
+    @property
+    def quantized(self) -> bool:
+        return np.issubdtype(self._input["dtype"], np.integer)
+
+    def _quantize(self, batch: np.ndarray) -> np.ndarray:
+        dtype = self._input["dtype"]
+        if not np.issubdtype(dtype, np.integer):
+            return batch
+        scale, zero_point = self._input["quantization"]
+        info = np.iinfo(dtype)
+        return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+    def _dequantize(self, out: np.ndarray) -> np.ndarray:
+        if not np.issubdtype(self._output["dtype"], np.integer):
+            return np.array(out, dtype=np.float32)
+        scale, zero_point = self._output["quantization"]
+        return (out.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch, verbose: int = 0) -> np.ndarray:
+        batch = self._quantize(np.asarray(batch, dtype=np.float32))
+        with self._lock:
+            self._resize(len(batch))
+            self._interpreter.set_tensor(self._input["index"], batch)
+            self._interpreter.invoke()
+            return self._dequantize(self._interpreter.get_tensor(self._output["index"]))
+
+    def warmup(self, batch_sizes: Sequence[int] = (1,)) -> Dict[int, float]:
+        """Run one zero batch per size so first requests skip XNNPACK's weight packing."""
+        for size in batch_sizes:
+            start = time.perf_counter()
+            self.predict(np.zeros((size, 224, 224, 3), dtype=np.float32))
+            self.warmup_ms[size] = round((time.perf_counter() - start) * 1000, 2)
+        logger.info("TFLite model warmed up: %s", self.warmup_ms)
+        return self.warmup_ms
+
+
+def load_tflite_model(model_path: str, warmup_batch_sizes: Sequence[int] = (), num_threads: Optional[int] = None):
+    """Load a .tflite file for serving. Used in-process and as the InferencePool loader."""
+    model = TFLiteModel(model_path, num_threads)
+    if warmup_batch_sizes:
+        model.warmup(warmup_batch_sizes)
+    return model
@@ -0,0 +1,76 @@
+"""
+Test-time augmentation: extra views of a preprocessed scan (a horizontal flip and small
+shifts), written next to it in the same batch buffer so the original and its views are scored
+in one forward pass, then averaged. Needs only NumPy.
+"""
+import os
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from ml.preprocess import batch_buffer, preprocess_into
+
+# Shift in pixels of the 224x224 model input (8 px is about 3.5%).
+SHIFT_PX = int(os.getenv("TTA_SHIFT_PX", "8"))
+
+
+def _shift(src: np.ndarray, out: np.ndarray, dy: int, dx: int) -> None:
+    """Translate src by (dy, dx) into out, repeating the edge rows and columns the shift uncovers."""
+    h, w = src.shape[:2]
+    rows = np.clip(np.arange(h) - dy, 0, h - 1)
+    cols = np.clip(np.arange(w) - dx, 0, w - 1)
+    np.take(src.take(rows, axis=0), cols, axis=1, out=out)
+
+
+VIEWS: Dict[str, Callable[[np.ndarray, np.ndarray], None]] = {
+    "identity": lambda src, out: np.copyto(out, src),
+    "flip": lambda src, out: np.copyto(out, src[:, ::-1]),
+    "shift_left": lambda src, out: _shift(src, out, 0, -SHIFT_PX),
+    "shift_right": lambda src, out: _shift(src, out, 0, SHIFT_PX),
+    "shift_up": lambda src, out: _shift(src, out, -SHIFT_PX, 0),
+    "shift_down": lambda src, out: _shift(src, out, SHIFT_PX, 0),
+}
+DEFAULT_VIEWS = "identity,flip,shift_left,shift_right,shift_up,shift_down"
+
+
+def view_names(spec: Optional[str] = None) -> List[str]:
+    """
+    Parse a comma-separated list of VIEWS names (default: TTA_VIEWS). The original image is
+    always the first view, so row 0 of every group is the un-augmented scan.
+    """
+    names = [n.strip() for n in (spec or os.getenv("TTA_VIEWS", DEFAULT_VIEWS)).split(",") if n.strip()]
+    unknown = [n for n in names if n not in VIEWS]
+    if unknown:
+        raise ValueError(f"Unknown TTA view(s) {', '.join(unknown)}; expected some of {', '.join(VIEWS)}")
+    return ["identity"] + [n for n in dict.fromkeys(names) if n != "identity"]
+
+
+def settings(views: Sequence[str]) -> Dict[str, object]:
+    """Everything that changes a TTA result; part of the result cache key."""
+    return {"views": list(views), "shift_px": SHIFT_PX}
+
+
+def preprocess_views(images: Sequence[Image.Image], views: Sequence[str], resample: Optional[str] = None) -> np.ndarray:
+    """
+    Preprocess each image and write its views right after it into this thread's batch buffer
+    (see ml.preprocess.batch_buffer): rows [i * len(views), (i + 1) * len(views)) belong to image i.
+    """
+    batch = batch_buffer(len(images) * len(views))
+    for i, image in enumerate(images):
+        group = batch[i * len(views):(i + 1) * len(views)]
+        preprocess_into(image, group[0], resample)
+        for name, out in zip(views[1:], group[1:]):
+            VIEWS[name](group[0], out)
+    return batch
+
+
+def aggregate(preds: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Combine one image's per-view probabilities (views, classes): the mean, the per-class
+    standard deviation across views, and the fraction of views whose top class is the mean's.
+    """
+    mean = preds.mean(axis=0)
+    std = preds.std(axis=0)
+    agreement = float(np.mean(np.argmax(preds, axis=1) == np.argmax(mean)))
+    return mean, std, agreement
@@ -0,0 +1,30 @@
+"""
+Shared test setup and helpers. Importing app loads the model and warms it up on a background
+thread unless told otherwise; that thread can replace a patched app.model mid-test and keeps
+the run alive after the last test, so tests import app with both turned off.
+"""
+import os
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+os.environ.setdefault("MODEL_LOAD_DEFERRED", "1")
+os.environ.setdefault("WARMUP", "0")
+# Tests that check persistence turn it back on with a temporary UPLOAD_FOLDER.
+os.environ.setdefault("PERSIST_UPLOADS", "0")
+
+# What fake_predict returns for every row: no_tumor wins.
+FAKE_PROBS = [0.1, 0.2, 0.6, 0.1]
+
+
+def jpeg_bytes(size=(200, 200), color="red"):
+    """A solid-color JPEG upload; the default passes QA."""
+    buf = BytesIO()
+    Image.new("RGB", size, color=color).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def fake_predict(batch, verbose=0):
+    """Stand-in for model.predict: FAKE_PROBS for every row of the batch."""
+    return np.tile(np.array([FAKE_PROBS]), (len(batch), 1))
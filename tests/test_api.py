@@ -11,6 +11,7 @@ from io import BytesIO
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app import app, CLASS_LABELS
+from tests.conftest import fake_predict, jpeg_bytes
 
 
 class TestApiV1Analyze:
@@ -162,3 +163,329 @@ class TestHealthz:
             assert response.status_code == 500
             assert response.get_json()["ok"] is False
             assert response.get_json()["model_loaded"] is False
+
+    def test_healthz_does_not_start_a_batcher(self, client):
+        """Test /healthz reports batching stats without creating a batcher for a missing model."""
+        import app as app_module
+        with patch("app.model", None), patch("app.INFERENCE_BATCHING", True), \
+                patch.dict("app._batchers", clear=True):
+            data = client.get("/healthz").get_json()
+            assert "batching" not in data
+            assert app_module._batchers == {}
+
+
+class TestApiV1AnalyzeBatch:
+    """Tests for POST /api/v1/analyze/batch"""
+
+    @pytest.fixture
+    def client(self):
+        app.config["TESTING"] = True
+        with app.test_client() as client:
+            yield client
+
+    def test_multiple_files_return_per_slice_results_and_summary(self, client):
+        mock_model = MagicMock()
+        mock_model.predict.side_effect = fake_predict
+        files = [
+            (BytesIO(jpeg_bytes((200, 200))), "slice_1.jpg"),
+            (BytesIO(jpeg_bytes((200, 200))), "slice_2.jpg"),
+            (BytesIO(jpeg_bytes((50, 50))), "tiny.jpg"),
+        ]
+        with patch("app.model", mock_model):
+            response = client.post(
+                "/api/v1/analyze/batch",
+                data={"images": files},
+                content_type="multipart/form-data",
+            )
+        assert response.status_code == 200
+        data = response.get_json()
+        assert [s["filename"] for s in data["slices"]] == ["slice_1.jpg", "slice_2.jpg", "tiny.jpg"]
+        assert data["slices"][2]["vision"] is None
+        assert data["slices"][0]["vision"]["label"] == "no_tumor"
+        study = data["study"]
+        assert study["num_slices"] == 3
+        assert study["num_analyzed"] == 2
+        assert study["num_rejected"] == 1
+        assert study["label"] == "no_tumor"
+        # Both passing slices go through a single batched forward pass.
+        assert mock_model.predict.call_count == 1
+        assert len(mock_model.predict.call_args[0][0]) == 2
+
+    def test_zip_archive_is_expanded(self, client):
+        import zipfile
+
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("study/a.jpg", jpeg_bytes((200, 200)))
+            zf.writestr("study/b.png", jpeg_bytes((200, 200)))
+            zf.writestr("study/notes.txt", b"ignored")
+        archive.seek(0)
+        mock_model = MagicMock()
+        mock_model.predict.side_effect = fake_predict
+        with patch("app.model", mock_model):
+            response = client.post(
+                "/api/v1/analyze/batch",
+                data={"archive": (archive, "study.zip")},
+                content_type="multipart/form-data",
+            )
+        assert response.status_code == 200
+        data = response.get_json()
+        assert [s["filename"] for s in data["slices"]] == ["a.jpg", "b.png"]
+        assert data["study"]["num_analyzed"] == 2
+
+    def test_missing_files_returns_400(self, client):
+        response = client.post("/api/v1/analyze/batch")
+        assert response.status_code == 400
+        assert response.get_json()["error"]["code"] == "MISSING_FILE"
+
+    def test_invalid_archive_returns_400(self, client):
+        response = client.post(
+            "/api/v1/analyze/batch",
+            data={"archive": (BytesIO(b"not a zip"), "study.zip")},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 400
+        assert response.get_json()["error"]["code"] == "INVALID_ARCHIVE"
+
+    def test_unreadable_archive_entry_returns_400(self, client):
+        import zipfile
+
+        data = jpeg_bytes((200, 200))
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zf:
+            zf.writestr("a.jpg", data)
+        # Stored entries are copied verbatim, so flipping a byte of the image breaks its CRC.
+        corrupted = archive.getvalue().replace(data, data[:-10] + bytes([data[-10] ^ 0xFF]) + data[-9:])
+        for path in ("/api/v1/analyze/batch", "/api/v1/jobs"):
+            response = client.post(
+                path, data={"archive": (BytesIO(corrupted), "study.zip")}, content_type="multipart/form-data"
+            )
+            assert response.status_code == 400
+            assert response.get_json()["error"]["code"] == "INVALID_ARCHIVE"
+
+    def test_archive_expanding_past_the_batch_limit_returns_413(self, client):
+        import zipfile
+
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            for i in range(3):
+                zf.writestr(f"slice_{i}.png", b"\0" * (4 * 1024 * 1024))
+        archive.seek(0)
+        with patch("app.BATCH_MAX_CONTENT_LENGTH", 10 * 1024 * 1024):
+            response = client.post(
+                "/api/v1/analyze/batch",
+                data={"archive": (archive, "study.zip")},
+                content_type="multipart/form-data",
+            )
+        assert response.status_code == 413
+        assert response.get_json()["error"]["code"] == "FILE_TOO_LARGE"
+
+    def test_oversized_slice_returns_413(self, client):
+        files = [(BytesIO(jpeg_bytes((200, 200))), "a.jpg"), (BytesIO(b"\xff" * (5 * 1024 * 1024 + 1)), "big.png")]
+        for path in ("/api/v1/analyze/batch", "/api/v1/jobs"):
+            response = client.post(
+                path,
+                data={"images": [(BytesIO(f.getvalue()), name) for f, name in files]},
+                content_type="multipart/form-data",
+            )
+            assert response.status_code == 413
+            assert response.get_json()["error"]["code"] == "FILE_TOO_LARGE"
+
+    @patch("app.model", None)
+    def test_model_unavailable_returns_503(self, client):
+        response = client.post(
+            "/api/v1/analyze/batch",
+            data={"images": [(BytesIO(jpeg_bytes((200, 200))), "a.jpg")]},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 503
+        assert response.get_json()["error"]["code"] == "MODEL_UNAVAILABLE"
+
+
+class TestUploadPersistence:
+    """Uploads are analyzed from memory and written to static/uploads after the response."""
+
+    @pytest.fixture
+    def client(self, tmp_path):
+        app.config["TESTING"] = True
+        with patch.dict(app.config, {"UPLOAD_FOLDER": str(tmp_path)}), patch("app.PERSIST_UPLOADS", True), \
+                app.test_client() as client:
+            yield client
+
+    def _analyze(self, client, data=None):
+        mock_model = MagicMock()
+        mock_model.predict.side_effect = fake_predict
+        with patch("app.model", mock_model):
+            response = client.post(
+                "/api/v1/analyze",
+                data={"image": (BytesIO(data or jpeg_bytes((200, 200))), "scan.jpg")},
+                content_type="multipart/form-data",
+            )
+            response.close()
+        return response
+
+    def test_upload_written_after_response(self, client):
+        response = self._analyze(client)
+        assert response.status_code == 200
+        url = response.get_json()["artifacts"]["uploaded_image_url"]
+        saved = os.listdir(app.config["UPLOAD_FOLDER"])
+        assert len(saved) == 1
+        assert url.endswith(saved[0])
+        with open(os.path.join(app.config["UPLOAD_FOLDER"], saved[0]), "rb") as f:
+            assert f.read() == jpeg_bytes((200, 200))
+
+    def test_persistence_can_be_disabled(self, client):
+        with patch("app.PERSIST_UPLOADS", False):
+            response = self._analyze(client)
+        assert response.status_code == 200
+        assert response.get_json()["artifacts"]["uploaded_image_url"] == ""
+        assert os.listdir(app.config["UPLOAD_FOLDER"]) == []
+
+    @pytest.mark.parametrize(
+        "payload, warning",
+        [
+            (jpeg_bytes((200, 100)), "Image too small: 200x100 (min 150 required)"),
+            (jpeg_bytes((200, 200))[:-300], "Image file is truncated"),
+            (b"%PDF-1.4 not a scan", "Could not open image"),
+        ],
+    )
+    def test_header_rejects_skip_decode_and_disk(self, client, payload, warning):
+        with patch("agent.orchestrator.ImageContext.from_source") as decode:
+            response = self._analyze(client, payload)
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data["qa"]["safe_to_infer"] is False
+        assert data["qa"]["warnings"][0].startswith(warning)
+        assert data["vision"] is None
+        assert data["artifacts"]["uploaded_image_url"] == ""
+        assert os.listdir(app.config["UPLOAD_FOLDER"]) == []
+        decode.assert_not_called()
+
+    @pytest.mark.parametrize("payload", [jpeg_bytes((200, 200)), jpeg_bytes((200, 100))])
+    def test_header_is_checked_once_per_request(self, client, payload):
+        from agent.qa_agent import check_header
+        with patch("app.qa_check_header", wraps=check_header) as request_check, \
+                patch("agent.orchestrator.qa_check_header") as pipeline_check:
+            response = self._analyze(client, payload)
+        assert response.status_code == 200
+        request_check.assert_called_once()
+        pipeline_check.assert_not_called()
+        rejected = check_header(payload) is not None
+        assert response.get_json()["qa"]["safe_to_infer"] is not rejected
+        assert (response.get_json()["artifacts"]["uploaded_image_url"] == "") is rejected
+
+
+class TestApiV1Jobs:
+    """Tests for POST /api/v1/jobs, GET /api/v1/jobs/<id> and its SSE event stream."""
+
+    @pytest.fixture
+    def client(self):
+        app.config["TESTING"] = True
+        app.config["UPLOAD_FOLDER"] = tempfile.mkdtemp()
+        with app.test_client() as client:
+            yield client
+        shutil.rmtree(app.config["UPLOAD_FOLDER"])
+
+    @staticmethod
+    def _wait_done(client, job_id):
+        import time
+
+        for _ in range(500):
+            data = client.get(f"/api/v1/jobs/{job_id}").get_json()
+            if data["status"] in ("succeeded", "failed"):
+                return data
+            time.sleep(0.01)
+        raise AssertionError("job did not finish")
+
+    def test_single_image_job_polls_to_result(self, client):
+        mock_model = MagicMock()
+        mock_model.predict.side_effect = fake_predict
+        with patch("app.model", mock_model):
+            response = client.post(
+                "/api/v1/jobs",
+                data={"image": (BytesIO(jpeg_bytes((200, 200))), "scan.jpg")},
+                content_type="multipart/form-data",
+            )
+            assert response.status_code == 202
+            body = response.get_json()
+            assert body["kind"] == "analyze"
+            assert response.headers["Location"] == body["status_url"]
+            data = self._wait_done(client, body["job_id"])
+        assert data["status"] == "succeeded"
+        assert data["stages"] == ["qa", "vision", "report", "safety_gate"]
+        assert data["result"]["vision"]["label"] == "no_tumor"
+        assert "request_id" in data["result"]
+
+    def test_event_stream_emits_stages(self, client):
+        import json
+
+        mock_model = MagicMock()
+        mock_model.predict.side_effect = fake_predict
+        with patch("app.model", mock_model):
+            response = client.post(
+                "/api/v1/jobs",
+                data={"images": [(BytesIO(jpeg_bytes((200, 200))), "a.jpg"), (BytesIO(jpeg_bytes((200, 200))), "b.jpg")]},
+                content_type="multipart/form-data",
+            )
+            assert response.status_code == 202
+            assert response.get_json()["kind"] == "batch"
+            stream = client.get(response.get_json()["events_url"])
+            assert stream.mimetype == "text/event-stream"
+            text = stream.get_data(as_text=True)
+        events = []
+        for block in text.strip().split("\n\n"):
+            fields = dict(line.split(": ", 1) for line in block.splitlines())
+            events.append((fields["event"], json.loads(fields["data"])))
+        stages = [data["stage"] for kind, data in events if kind == "stage"]
+        assert stages == ["qa", "vision", "report", "safety_gate"]
+        progress = [data for kind, data in events if kind == "progress"]
+        assert progress[-1]["num_analyzed"] == 2
+        assert [kind for kind, _ in events].index("progress") < [kind for kind, _ in events].index("stage")
+        assert events[-1] == ("status", {"status": "succeeded", "error": None})
+
+    def test_full_queue_returns_429_with_retry_after(self, client):
+        import threading
+        from agent.jobs import JobManager
+
+        release = threading.Event()
+        mock_model = MagicMock()
+
+        def blocking_predict(batch, verbose=0):
+            release.wait(5)
+            return fake_predict(batch)
+
+        mock_model.predict.side_effect = blocking_predict
+        with patch("app.model", mock_model), patch("app.jobs", JobManager(max_workers=1, max_queued=0)), patch(
+            "app.result_cache", None
+        ):
+            first = client.post(
+                "/api/v1/jobs",
+                data={"image": (BytesIO(jpeg_bytes((200, 200))), "a.jpg")},
+                content_type="multipart/form-data",
+            )
+            second = client.post(
+                "/api/v1/jobs",
+                data={"image": (BytesIO(jpeg_bytes((210, 210))), "b.jpg")},
+                content_type="multipart/form-data",
+            )
+            release.set()
+            self._wait_done(client, first.get_json()["job_id"])
+        assert first.status_code == 202
+        assert second.status_code == 429
+        assert second.get_json()["error"]["code"] == "QUEUE_FULL"
+        assert int(second.headers["Retry-After"]) >= 1
+
+    def test_unknown_job_returns_404(self, client):
+        response = client.get("/api/v1/jobs/does-not-exist")
+        assert response.status_code == 404
+        assert response.get_json()["error"]["code"] == "JOB_NOT_FOUND"
+        assert client.get("/api/v1/jobs/does-not-exist/events").status_code == 404
+
+    def test_invalid_upload_returns_400(self, client):
+        response = client.post(
+            "/api/v1/jobs",
+            data={"image": (BytesIO(b"x"), "scan.gif")},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 400
+        assert response.get_json()["error"]["code"] == "UNSUPPORTED_EXTENSION"
@@ -0,0 +1,221 @@
+"""Tests for the ASGI entry point (asgi.py), driven directly through the ASGI interface."""
+import asyncio
+import json
+import os
+import sys
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import asgi
+from app import app as flask_app
+from tests.conftest import fake_predict, jpeg_bytes
+
+BOUNDARY = "testboundary"
+
+
+def _multipart(name, filename, data):
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def _call(
+    method, path, body=b"", chunk_size=None, content_type=f"multipart/form-data; boundary={BOUNDARY}", query_string=b""
+):
+    """Run one request through asgi.app; the body is delivered in chunks like a slow client."""
+    chunk_size = chunk_size or max(len(body), 1)
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b""]
+    messages = [
+        {"type": "http.request", "body": c, "more_body": i < len(chunks) - 1} for i, c in enumerate(chunks)
+    ]
+    sent = []
+
+    async def receive():
+        await asyncio.sleep(0)
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query_string,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())],
+    }
+    asyncio.run(asgi.app(scope, receive, send))
+    start = sent[0]
+    payload = b"".join(m.get("body", b"") for m in sent[1:])
+    return start["status"], dict(start["headers"]), payload
+
+
+@pytest.fixture
+def upload_folder(tmp_path):
+    with patch.dict(flask_app.config, {"UPLOAD_FOLDER": str(tmp_path)}), patch("app.PERSIST_UPLOADS", True):
+        yield str(tmp_path)
+
+
+@pytest.fixture
+def mock_model():
+    model = MagicMock()
+    model.predict.side_effect = fake_predict
+    with patch("app.model", model):
+        yield model
+
+
+class TestAsgiAnalyze:
+    def test_streamed_upload_returns_flask_shape(self, upload_folder, mock_model):
+        image = jpeg_bytes((200, 200))
+        status, headers, body = _call("POST", "/api/v1/analyze", _multipart("image", "scan.jpg", image), chunk_size=997)
+        assert status == 200
+        assert headers[b"content-type"] == b"application/json"
+        data = json.loads(body)
+        assert set(data) == {"request_id", "model_version", "qa", "vision", "report", "artifacts", "latency_ms"}
+        assert data["vision"]["label"] == "no_tumor"
+        saved = os.listdir(upload_folder)
+        assert len(saved) == 1
+        assert data["artifacts"]["uploaded_image_url"] == f"/static/uploads/{saved[0]}"
+        with open(os.path.join(upload_folder, saved[0]), "rb") as f:
+            assert f.read() == image
+
+    def test_header_is_checked_once(self, upload_folder, mock_model):
+        from agent.qa_agent import check_header
+        with patch("app.qa_check_header", wraps=check_header) as request_check, \
+                patch("agent.orchestrator.qa_check_header") as pipeline_check:
+            status, _, body = _call("POST", "/api/v1/analyze", _multipart("image", "scan.jpg", jpeg_bytes((200, 200))))
+        assert status == 200
+        assert json.loads(body)["vision"]["label"] == "no_tumor"
+        request_check.assert_called_once()
+        pipeline_check.assert_not_called()
+
+    def test_qa_fail_returns_vision_none(self, upload_folder, mock_model):
+        status, _, body = _call("POST", "/api/analyze", _multipart("image", "tiny.jpg", jpeg_bytes((50, 50))))
+        assert status == 200
+        data = json.loads(body)
+        assert data["qa"]["safe_to_infer"] is False
+        assert data["vision"] is None
+
+    @pytest.mark.parametrize(
+        "body, code",
+        [
+            (b"", "MISSING_FILE"),
+            (_multipart("other", "scan.jpg", b"x"), "MISSING_FILE"),
+            (_multipart("image", "", b""), "EMPTY_FILENAME"),
+            (_multipart("image", "scan.gif", b"x"), "UNSUPPORTED_EXTENSION"),
+        ],
+    )
+    def test_validation_errors_match_flask(self, upload_folder, mock_model, body, code):
+        status, _, payload = _call("POST", "/api/v1/analyze", body)
+        assert status == 400
+        assert json.loads(payload)["error"]["code"] == code
+
+    def test_oversize_body_returns_413(self, upload_folder, mock_model):
+        body = _multipart("image", "big.jpg", b"\0" * (5 * 1024 * 1024 + 1))
+        status, _, payload = _call("POST", "/api/v1/analyze", body, chunk_size=65536)
+        assert status == 413
+        assert json.loads(payload)["error"]["code"] == "FILE_TOO_LARGE"
+
+    @patch("app.model", None)
+    def test_model_unavailable_returns_503(self, upload_folder):
+        status, _, payload = _call("POST", "/api/v1/analyze", _multipart("image", "scan.jpg", jpeg_bytes((200, 200))))
+        assert status == 503
+        assert json.loads(payload)["error"]["code"] == "MODEL_UNAVAILABLE"
+
+    def test_explain_query_parameter(self, upload_folder, mock_model):
+        body = _multipart("image", "scan.jpg", jpeg_bytes((200, 200)))
+        status, _, payload = _call("POST", "/api/v1/analyze", body, query_string=b"explain=true")
+        assert status == 501
+        assert json.loads(payload)["error"]["code"] == "EXPLAIN_UNAVAILABLE"
+        mock_model.explainable = True
+        mock_model.explain.side_effect = lambda batch: (fake_predict(batch), np.zeros((len(batch), 14, 14)))
+        status, _, payload = _call("POST", "/api/v1/analyze", body, query_string=b"explain=true")
+        assert status == 200
+        assert json.loads(payload)["vision"]["explanation"]["shape"] == [14, 14]
+
+    def test_tta_query_parameter(self, upload_folder, mock_model):
+        body = _multipart("image", "scan.jpg", jpeg_bytes((200, 200)))
+        with patch("app.TTA_VIEWS", ["identity", "flip"]):
+            status, _, payload = _call("POST", "/api/v1/analyze", body, query_string=b"tta=true")
+        assert status == 200
+        assert json.loads(payload)["vision"]["tta"]["views"] == ["identity", "flip"]
+        assert len(mock_model.predict.call_args[0][0]) == 2
+
+    def test_lazy_heatmap_url_is_served(self, upload_folder, mock_model):
+        mock_model.explainable = True
+        mock_model.explain.side_effect = lambda batch: (fake_predict(batch), np.ones((len(batch), 14, 14)))
+        body = _multipart("image", "scan.jpg", jpeg_bytes((200, 200)))
+        status, _, payload = _call("POST", "/api/v1/analyze", body, query_string=b"explain=lazy")
+        assert status == 200
+        url = json.loads(payload)["artifacts"]["heatmap_url"]
+        mock_model.explain.assert_not_called()
+        status, headers, png = _call("GET", url)
+        assert status == 200
+        assert headers[b"content-type"] == b"image/png"
+        assert Image.open(BytesIO(png)).size == (224, 224)
+        status, _, payload = _call("GET", "/api/v1/heatmaps/missing")
+        assert (status, json.loads(payload)["error"]["code"]) == (404, "HEATMAP_NOT_FOUND")
+
+    def test_concurrent_uploads_share_one_loop(self, upload_folder, mock_model):
+        image = _multipart("image", "scan.jpg", jpeg_bytes((200, 200)))
+
+        async def one():
+            messages = [
+                {"type": "http.request", "body": image[i:i + 512], "more_body": i + 512 < len(image)}
+                for i in range(0, len(image), 512)
+            ]
+            sent = []
+
+            async def receive():
+                await asyncio.sleep(0.001)
+                return messages.pop(0)
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {
+                "type": "http",
+                "method": "POST",
+                "path": "/api/v1/analyze",
+                "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())],
+            }
+            await asgi.app(scope, receive, send)
+            return sent[0]["status"]
+
+        async def many():
+            return await asyncio.gather(*(one() for _ in range(50)))
+
+        assert asyncio.run(many()) == [200] * 50
+
+
+class TestAsgiRoutes:
+    def test_healthz_matches_flask(self, mock_model):
+        status, _, body = _call("GET", "/healthz")
+        assert status == 200
+        data = json.loads(body)
+        assert data["ok"] is True
+        assert data["model_loaded"] is True
+
+    @patch("app.model", None)
+    def test_probes_match_flask(self):
+        assert _call("GET", "/livez")[0] == 200
+        status, _, body = _call("GET", "/readyz")
+        assert status == 503
+        assert json.loads(body)["ready"] is False
+
+    def test_unknown_route_returns_json_404(self):
+        status, _, body = _call("GET", "/about")
+        assert status == 404
+        assert json.loads(body)["error"]["code"] == "NOT_FOUND"
+
+    def test_cors_preflight(self):
+        status, headers, _ = _call("OPTIONS", "/api/v1/analyze")
+        assert status == 204
+        assert headers[b"access-control-allow-origin"] == b"*"
@@ -0,0 +1,93 @@
+"""Tests for the dynamic micro-batching scheduler."""
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ml.batching import Histogram, MicroBatcher
+
+
+class RecordingModel:
+    """Fake model returning each row's first pixel so callers can check routing."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, batch):
+        self.batch_sizes.append(len(batch))
+        return batch.reshape(len(batch), -1)[:, :4].copy()
+
+
+class TestMicroBatcher:
+    def test_concurrent_requests_share_one_forward_pass(self):
+        model = RecordingModel()
+        batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=200)
+        results = {}
+        barrier = threading.Barrier(4)
+
+        def worker(i):
+            barrier.wait()
+            row = np.full((1, 2, 2, 1), float(i), dtype=np.float32)
+            results[i] = batcher.predict(row)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        batcher.close()
+
+        assert model.batch_sizes == [4]
+        for i in range(4):
+            assert results[i].shape == (1, 4)
+            assert np.all(results[i] == i)
+
+    def test_batch_never_exceeds_max_size(self):
+        model = RecordingModel()
+        batcher = MicroBatcher(model, max_batch_size=2, max_wait_ms=50)
+        futures = [batcher.submit(np.zeros((1, 4), dtype=np.float32)) for _ in range(5)]
+        for f in futures:
+            f.result(timeout=5)
+        batcher.close()
+        assert sum(model.batch_sizes) == 5
+        assert max(model.batch_sizes) <= 2
+
+    def test_single_request_dispatched_after_max_wait(self):
+        model = RecordingModel()
+        batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=1)
+        out = batcher.predict(np.ones((1, 4), dtype=np.float32), verbose=0)
+        batcher.close()
+        assert out.shape == (1, 4)
+        assert model.batch_sizes == [1]
+
+    def test_errors_propagate_to_every_caller(self):
+        def broken(batch):
+            raise RuntimeError("boom")
+
+        batcher = MicroBatcher(broken, max_batch_size=2, max_wait_ms=1)
+        with pytest.raises(RuntimeError, match="boom"):
+            batcher.predict(np.zeros((1, 4), dtype=np.float32))
+        batcher.close()
+
+    def test_stats_report_histograms(self):
+        batcher = MicroBatcher(RecordingModel(), max_batch_size=2, max_wait_ms=1)
+        batcher.predict(np.zeros((1, 4), dtype=np.float32))
+        batcher.close()
+        stats = batcher.stats()
+        assert stats["batch_size"]["count"] == 1
+        assert stats["queue_wait_ms"]["count"] == 1
+        assert stats["batch_size"]["buckets"]["le_1"] == 1
+
+
+class TestHistogram:
+    def test_values_land_in_first_matching_bucket(self):
+        h = Histogram((1, 5))
+        for v in (0.5, 1, 3, 10):
+            h.observe(v)
+        snap = h.snapshot()
+        assert snap["buckets"] == {"le_1": 2, "le_5": 1, "inf": 1}
+        assert snap["count"] == 4
+        assert snap["max"] == 10
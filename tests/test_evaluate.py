@@ -0,0 +1,110 @@
+"""Tests for the offline evaluator: prefetch pipeline, metrics and the ml.evaluate CLI."""
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ml.evaluate import class_metrics, confusion_matrix, evaluate, main, prefetch_batches, select_images
+from ml.preprocess import preprocess_batch
+
+LABELS = ["glioma", "meningioma", "no_tumor", "pituitary"]
+
+
+class MeanModel:
+    """Deterministic stand-in: the class is picked by the image's mean red level."""
+
+    def predict(self, batch, verbose=0):
+        red = batch[..., 0].mean(axis=(1, 2))
+        logits = -np.abs(red[:, None] - np.array([0.1, 0.35, 0.6, 0.85])[None, :]) * 10
+        e = np.exp(logits)
+        return e / e.sum(axis=1, keepdims=True)
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    # Each class has two images whose red level MeanModel maps to that class, plus one
+    # no_tumor image that looks like glioma.
+    for i, label in enumerate(LABELS):
+        (tmp_path / label).mkdir()
+        for j in range(2):
+            Image.new("RGB", (64 + j, 64), (int((0.1 + 0.25 * i) * 255), 40, 40)).save(tmp_path / label / f"{j}.png")
+    Image.new("RGB", (64, 64), (25, 40, 40)).save(tmp_path / "no_tumor" / "odd.png")
+    return str(tmp_path)
+
+
+def _images(image_dir):
+    from ml.convert_tflite import labelled_images
+
+    return labelled_images(image_dir)
+
+
+class TestMetrics:
+    def test_confusion_matrix_and_class_metrics(self):
+        matrix = confusion_matrix([0, 0, 1, 2, 2], [0, 1, 1, 0, 0], 4)
+        assert matrix.tolist() == [[1, 1, 0, 0], [0, 1, 0, 0], [2, 0, 0, 0], [0, 0, 0, 0]]
+        metrics = class_metrics(matrix, LABELS)
+        assert metrics["glioma"] == {"support": 2, "precision": pytest.approx(1 / 3), "recall": 0.5}
+        assert metrics["meningioma"] == {"support": 1, "precision": 0.5, "recall": 1.0}
+        assert metrics["no_tumor"]["precision"] == 0.0
+        assert metrics["pituitary"] == {"support": 0, "precision": 0.0, "recall": 0.0}
+
+    def test_seeded_sample_keeps_order(self):
+        items = [(str(i), "glioma") for i in range(10)]
+        sample = select_images(items, 4, seed=3)
+        assert sample == select_images(items, 4, seed=3)
+        assert len(sample) == 4 and sample == sorted(sample, key=lambda item: int(item[0]))
+        assert select_images(items, None, seed=3) == items
+
+
+class TestPrefetch:
+    def test_batches_arrive_in_order_and_match_preprocessing(self, image_dir):
+        paths = [path for path, _ in _images(image_dir)]
+        batches = [batch.copy() for batch in prefetch_batches(paths, 2, workers=3, depth=2)]
+        assert [len(b) for b in batches] == [2, 2, 2, 2, 1]
+        expected = preprocess_batch([Image.open(path) for path in paths])
+        np.testing.assert_array_equal(np.concatenate(batches), expected)
+
+
+class TestEvaluate:
+    def test_report(self, image_dir):
+        report = evaluate(MeanModel(), _images(image_dir), LABELS, batch_size=4)
+        assert report["images"] == 9
+        assert report["accuracy"] == pytest.approx(8 / 9)
+        assert report["confusion_matrix"][2] == [1, 0, 2, 0]
+        assert report["per_class"]["no_tumor"]["recall"] == pytest.approx(2 / 3)
+        assert report["per_class"]["glioma"]["precision"] == pytest.approx(2 / 3)
+        assert report["images_per_sec"] > 0 and report["peak_rss_mb"] > 0
+        assert report["predictions"][0]["predicted"] == "glioma"
+
+    def test_predictions_do_not_depend_on_the_pipeline(self, image_dir):
+        images = _images(image_dir)
+        first = evaluate(MeanModel(), images, LABELS, batch_size=4, workers=1, depth=1)
+        second = evaluate(MeanModel(), images, LABELS, batch_size=3, workers=3, depth=3)
+        assert first["predictions_sha256"] == second["predictions_sha256"]
+
+    def test_cli_writes_json_report(self, image_dir, tmp_path, capsys):
+        import tensorflow as tf
+        from ml.convert_tflite import convert
+
+        inputs = tf.keras.Input(shape=(224, 224, 3))
+        x = tf.keras.layers.GlobalAveragePooling2D()(inputs)
+        keras_path = str(tmp_path / "tiny.keras")
+        tf.keras.Model(inputs, tf.keras.layers.Dense(4, activation="softmax")(x)).save(keras_path)
+        tflite_path = str(tmp_path / "tiny.tflite")
+        convert(keras_path, tflite_path)
+
+        output = str(tmp_path / "report.json")
+        args = ["--backend", "tflite", "--model", tflite_path, "--images", image_dir, "--batch-size", "4"]
+        assert main(args + ["--output", output]) == 0
+        assert "Confusion matrix" in capsys.readouterr().out
+        with open(output) as f:
+            report = json.load(f)
+        assert report["config"]["batch_size"] == 4
+        assert len(report["predictions"]) == 9
+        assert main(args + ["--output", output]) == 0
+        with open(output) as f:
+            assert json.load(f)["predictions_sha256"] == report["predictions_sha256"]
@@ -0,0 +1,257 @@
+"""Tests for Grad-CAM explanations: explain=true, batched study heatmaps and lazy heatmap URLs."""
+import os
+import sys
+import threading
+import time
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from agent.heatmap_store import HeatmapStore
+from agent.vision_agent_tf import render_overlay, run_batch as vision_run_batch
+from ml import heatmap
+from tests.conftest import fake_predict, jpeg_bytes
+
+
+class ExplainableModel:
+    """Stand-in for ml.serving.ServingModel: predict() plus a one-pass explain()."""
+
+    explainable = True
+
+    def __init__(self):
+        self.predict_calls = 0
+        self.explain_calls = 0
+        self.explain_sizes = []
+
+    def predict(self, batch, verbose=0):
+        self.predict_calls += 1
+        return fake_predict(batch)
+
+    def explain(self, batch):
+        self.explain_calls += 1
+        self.explain_sizes.append(len(batch))
+        cam = np.linspace(0, 1, 14 * 14, dtype=np.float32).reshape(14, 14)
+        return fake_predict(batch), np.tile(cam, (len(batch), 1, 1))
+
+
+class TestHeatmapArtifact:
+    def test_round_trip_within_one_level(self):
+        cam = np.random.default_rng(0).random((14, 14), dtype=np.float32)
+        decoded = heatmap.decode(heatmap.encode(cam))
+        assert decoded.shape == (14, 14)
+        assert np.abs(decoded - cam).max() <= 0.5 / 255 + 1e-6
+
+    def test_artifact_fields(self):
+        artifact = heatmap.artifact(np.zeros((14, 14), dtype=np.float32), "glioma")
+        assert artifact["method"] == "gradcam"
+        assert artifact["class"] == "glioma"
+        assert artifact["shape"] == [14, 14]
+        assert len(artifact["heatmap_png"]) < 1000
+
+    def test_overlay_blends_jet_colormap(self):
+        base = np.full((224, 224, 3), 100, dtype=np.uint8)
+        blended = heatmap.overlay(base, np.zeros((14, 14), dtype=np.float32))
+        assert blended.shape == (224, 224, 3) and blended.dtype == np.uint8
+        # JET maps 0 to dark blue (0, 0, 128 in RGB): 0.6 * 100 + 0.4 * colour.
+        np.testing.assert_array_equal(blended[0, 0], [60, 60, 111])
+        png = Image.open(BytesIO(heatmap.overlay_png(base, np.ones((14, 14), dtype=np.float32))))
+        assert png.size == (224, 224) and png.mode == "RGB"
+
+    def test_render_overlay_blends_over_model_input(self):
+        image = Image.new("RGB", (300, 260), (40, 80, 120))
+        expected = heatmap.overlay(np.asarray(image.resize((224, 224))), ExplainableModel().explain(np.zeros((1,)))[1][0])
+        rendered = np.asarray(Image.open(BytesIO(render_overlay(image, ExplainableModel()))))
+        np.testing.assert_array_equal(rendered, expected)
+
+    def test_supports_explain(self):
+        assert heatmap.supports_explain(ExplainableModel())
+        assert not heatmap.supports_explain(MagicMock())
+        assert not heatmap.supports_explain(None)
+
+
+class TestAnalyzeExplain:
+    @pytest.fixture
+    def client(self):
+        app_module.app.config["TESTING"] = True
+        with app_module.app.test_client() as client, patch("app.PERSIST_UPLOADS", False):
+            yield client
+
+    def _post(self, client, data, query=""):
+        return client.post(
+            f"/api/v1/analyze{query}",
+            data={"image": (BytesIO(data), "scan.jpg")},
+            content_type="multipart/form-data",
+        )
+
+    def test_explanation_from_the_same_pass(self, client):
+        model = ExplainableModel()
+        with patch("app.model", model):
+            response = self._post(client, jpeg_bytes(color=(90, 91, 92)), "?explain=true")
+        assert response.status_code == 200
+        vision = response.get_json()["vision"]
+        assert vision["label"] == "no_tumor"
+        assert vision["explanation"]["class"] == "no_tumor"
+        assert heatmap.decode(vision["explanation"]["heatmap_png"]).shape == (14, 14)
+        assert (model.explain_calls, model.predict_calls) == (1, 0)
+
+    def test_explanations_are_cached_separately(self, client):
+        model = ExplainableModel()
+        data = jpeg_bytes(color=(93, 94, 95))
+        with patch("app.model", model):
+            plain = self._post(client, data).get_json()
+            explained = self._post(client, data, "?explain=1").get_json()
+            again = self._post(client, data, "?explain=1").get_json()
+        assert "explanation" not in plain["vision"]
+        assert explained["vision"]["explanation"] == again["vision"]["explanation"]
+        assert (model.explain_calls, model.predict_calls) == (1, 1)
+
+    def test_model_without_explain_returns_501(self, client):
+        mock_model = MagicMock()
+        mock_model.predict.side_effect = fake_predict
+        with patch("app.model", mock_model):
+            response = self._post(client, jpeg_bytes(color=(96, 97, 98)), "?explain=true")
+        assert response.status_code == 501
+        assert response.get_json()["error"]["code"] == "EXPLAIN_UNAVAILABLE"
+        mock_model.predict.assert_not_called()
+
+
+class TestBatchedExplain:
+    def test_one_explain_pass_per_batch(self):
+        model = ExplainableModel()
+        images = [Image.new("RGB", (200, 200), (i * 20, 50, 50)) for i in range(5)]
+        results = vision_run_batch(images, model, batch_size=2, explain=True)
+        assert model.explain_sizes == [2, 2, 1]
+        assert model.predict_calls == 0
+        assert all(r["explanation"]["shape"] == [14, 14] for r in results)
+
+    def test_study_endpoint_explains_every_analyzed_slice(self):
+        model = ExplainableModel()
+        files = [(BytesIO(jpeg_bytes(color=(i * 60, 100, 100))), f"slice_{i}.jpg") for i in range(3)]
+        files.append((BytesIO(jpeg_bytes(color=(0, 0, 0))[:200]), "broken.jpg"))
+        with app_module.app.test_client() as client, patch("app.model", model):
+            data = client.post(
+                "/api/v1/analyze/batch?explain=true", data={"images": files}, content_type="multipart/form-data"
+            ).get_json()
+        assert model.explain_sizes == [3]
+        assert [s["vision"] is not None and "explanation" in s["vision"] for s in data["slices"]] == [True] * 3 + [False]
+
+
+class TestHeatmapStore:
+    def test_same_image_and_model_share_an_id(self):
+        store = HeatmapStore(1 << 20)
+        assert store.register(b"scan", "v1") == store.register(b"scan", "v1")
+        assert store.register(b"scan", "v1") != store.register(b"scan", "v2")
+        assert store.snapshot()["entries"] == 2
+
+    def test_renders_once_then_keeps_only_the_png(self):
+        store = HeatmapStore(1 << 20)
+        key = store.register(b"x" * 1000, "v1")
+        calls = []
+        render = lambda entry: calls.append(entry.source) or b"png"
+        assert store.render(key, render) == b"png"
+        assert store.render(key, render) == b"png"
+        assert calls == [b"x" * 1000]
+        assert store.snapshot() == {"entries": 1, "bytes": 3, "rendered": 1}
+
+    def test_concurrent_fetches_share_one_render(self):
+        store = HeatmapStore(1 << 20)
+        key = store.register(b"scan", "v1")
+        calls = []
+
+        def render(entry):
+            calls.append(1)
+            time.sleep(0.05)
+            return b"png"
+
+        threads = [threading.Thread(target=store.render, args=(key, render)) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(calls) == 1
+
+    def test_least_recently_used_entries_are_evicted(self):
+        store = HeatmapStore(2500)
+        first = store.register(b"a" * 1000, "v1")
+        second = store.register(b"b" * 1000, "v1")
+        store.get(first)
+        store.register(b"c" * 1000, "v1")
+        assert store.get(second) is None
+        assert store.render(second, lambda entry: b"png") is None
+        assert store.get(first) is not None
+        assert store.snapshot()["bytes"] == 2000
+
+
+class TestLazyHeatmapUrls:
+    @pytest.fixture
+    def client(self):
+        app_module.app.config["TESTING"] = True
+        with app_module.app.test_client() as client, patch("app.PERSIST_UPLOADS", False), patch(
+            "app.heatmap_store", HeatmapStore(1 << 20)
+        ):
+            yield client
+
+    def _post(self, client, data, path="/api/v1/analyze?explain=lazy"):
+        return client.post(path, data={"image": (BytesIO(data), "scan.jpg")}, content_type="multipart/form-data")
+
+    def test_overlay_is_rendered_on_first_fetch_only(self, client):
+        model = ExplainableModel()
+        with patch("app.model", model):
+            data = self._post(client, jpeg_bytes(color=(100, 101, 102))).get_json()
+            url = data["artifacts"]["heatmap_url"]
+            assert "explanation" not in data["vision"]
+            assert model.explain_calls == 0
+            first = client.get(url)
+            second = client.get(url)
+        assert first.status_code == 200 and first.mimetype == "image/png"
+        assert Image.open(BytesIO(first.data)).size == (224, 224)
+        assert second.data == first.data
+        assert model.explain_calls == 1
+
+    def test_study_slices_get_urls(self, client):
+        model = ExplainableModel()
+        files = [(BytesIO(jpeg_bytes(color=(i * 60, 90, 90))), f"slice_{i}.jpg") for i in range(2)]
+        files.append((BytesIO(jpeg_bytes(color=(0, 0, 0))[:200]), "broken.jpg"))
+        with patch("app.model", model):
+            data = client.post(
+                "/api/v1/analyze/batch?explain=lazy", data={"images": files}, content_type="multipart/form-data"
+            ).get_json()
+            urls = [s.get("heatmap_url") for s in data["slices"]]
+            assert urls[2] is None and len(set(urls[:2])) == 2
+            assert client.get(urls[1]).status_code == 200
+        assert model.explain_sizes == [1]
+
+    def test_unknown_heatmap_returns_404(self, client):
+        response = client.get("/api/v1/heatmaps/0123456789abcdef")
+        assert response.status_code == 404
+        assert response.get_json()["error"]["code"] == "HEATMAP_NOT_FOUND"
+
+    def test_replaced_model_returns_409(self, client):
+        # Both stay referenced: a runtime model's version is derived from its id().
+        old, new = ExplainableModel(), ExplainableModel()
+        with patch("app.model", old):
+            url = self._post(client, jpeg_bytes(color=(103, 104, 105))).get_json()["artifacts"]["heatmap_url"]
+        with patch("app.model", new):
+            response = client.get(url)
+        assert response.status_code == 409
+        assert response.get_json()["error"]["code"] == "MODEL_CHANGED"
+
+
+class TestGradcamWarmup:
+    def test_warmup_traces_gradcam_for_explainable_models(self):
+        model = ExplainableModel()
+        with patch("app.model", model), patch("app.result_cache", None), patch("app.WARMUP_ENABLED", True):
+            names = [name for name, _ in app_module.warmup_steps()]
+            assert names == ["vision", "batch", "gradcam"]
+            warmup = app_module.start_warmup(background=False)
+        assert warmup.state == "done"
+        assert model.explain_calls == 1
+
+    def test_no_gradcam_step_otherwise(self):
+        with patch("app.model", MagicMock()):
+            assert [name for name, _ in app_module.warmup_steps()] == ["vision", "batch"]
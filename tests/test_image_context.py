@@ -0,0 +1,151 @@
+"""Tests for the shared ImageContext used by the orchestrator and agents."""
+import os
+import sys
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent.image_context import ImageContext
+from agent.qa_agent import (
+    DRAFT_MEAN_TOLERANCE, DRAFT_STD_TOLERANCE, STATS_DRAFT_SIZE, check_header, decode_for_stats, draft_std_error,
+    run as qa_run,
+)
+
+
+def _jpeg_bytes(img):
+    buf = BytesIO()
+    img.save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+class TestImageContext:
+    @pytest.fixture
+    def noisy_image(self):
+        rng = np.random.default_rng(0)
+        return Image.fromarray(rng.integers(0, 256, (240, 320, 3), dtype=np.uint8))
+
+    def test_from_bytes_path_and_pil_agree(self, noisy_image, tmp_path):
+        data = _jpeg_bytes(noisy_image)
+        path = tmp_path / "scan.jpg"
+        path.write_bytes(data)
+        from_bytes = ImageContext.from_source(data)
+        from_path = ImageContext.from_source(str(path))
+        from_pil = ImageContext.from_source(Image.open(BytesIO(data)))
+        assert from_bytes.size == from_path.size == from_pil.size == (320, 240)
+        assert np.array_equal(np.asarray(from_bytes.image), np.asarray(from_path.image))
+        assert np.array_equal(np.asarray(from_bytes.image), np.asarray(from_pil.image))
+
+    def test_from_source_returns_existing_context(self, noisy_image):
+        ctx = ImageContext(noisy_image)
+        assert ImageContext.from_source(ctx) is ctx
+
+    def test_non_rgb_input_is_converted(self):
+        ctx = ImageContext(Image.new("L", (200, 200), color=128))
+        assert ctx.image.mode == "RGB"
+        assert np.asarray(ctx.image).shape == (200, 200, 3)
+
+    def test_model_input_shape_and_caching(self, noisy_image):
+        ctx = ImageContext(noisy_image)
+        batch = ctx.model_input
+        assert batch.shape == (1, 224, 224, 3)
+        assert batch.dtype == np.float32
+        assert ctx.model_input is batch
+
+    def test_intensity_stats_match_float_reference(self, noisy_image):
+        ctx = ImageContext(noisy_image)
+        reference = np.array(noisy_image) / 255.0
+        mean, std = ctx.intensity_stats
+        assert mean == pytest.approx(float(np.mean(reference)), abs=1e-9)
+        assert std == pytest.approx(float(np.std(reference)), abs=1e-9)
+
+    def test_draft_decode_keeps_source_size(self):
+        rng = np.random.default_rng(0)
+        base = Image.fromarray(rng.integers(60, 200, (64, 64, 3), dtype=np.uint8)).resize((2048, 2048))
+        data = _jpeg_bytes(base)
+        ctx = ImageContext.from_source(data, draft_size=STATS_DRAFT_SIZE)
+        assert ctx.size == (2048, 2048)
+        assert ctx.image.size == (512, 512)
+        reference = np.array(Image.open(BytesIO(data)).convert("RGB")) / 255.0
+        mean, std = ctx.intensity_stats
+        assert mean == pytest.approx(float(np.mean(reference)), abs=DRAFT_MEAN_TOLERANCE)
+        assert std == pytest.approx(float(np.std(reference)), abs=DRAFT_STD_TOLERANCE)
+
+    def test_draft_ignored_for_small_and_non_jpeg(self, noisy_image):
+        buf = BytesIO()
+        noisy_image.save(buf, format="PNG")
+        for data, draft_size in ((buf.getvalue(), 64), (_jpeg_bytes(noisy_image), 512)):
+            ctx = ImageContext.from_source(data, draft_size=draft_size)
+            assert ctx.image.size == ctx.size == (320, 240)
+
+    def test_undecodable_bytes_raise(self):
+        with pytest.raises(Exception):
+            ImageContext.from_source(b"not an image")
+
+
+class TestQaAgentWithContext:
+    def test_qa_reads_from_context(self):
+        ctx = ImageContext(Image.new("RGB", (200, 200), color=(10, 10, 10)))
+        qa = qa_run(ctx)
+        assert qa["safe_to_infer"] is True
+        assert "Image too dark" in qa["warnings"]
+
+    def test_qa_on_raw_bytes_uses_source_size(self):
+        data = _jpeg_bytes(Image.new("RGB", (1600, 140), color=(120, 120, 120)))
+        qa = qa_run(data)
+        assert qa["safe_to_infer"] is False
+        assert qa["warnings"][0] == "Image too small: 1600x140 (min 150 required)"
+
+    def test_smooth_scan_keeps_the_draft(self):
+        rng = np.random.default_rng(0)
+        base = Image.fromarray(rng.integers(60, 200, (64, 64, 3), dtype=np.uint8)).resize((2048, 2048))
+        ctx = decode_for_stats(_jpeg_bytes(base))
+        assert ctx.image.size == (512, 512)
+        assert draft_std_error(ctx) < DRAFT_STD_TOLERANCE
+
+    def test_high_texture_scan_is_decoded_in_full(self):
+        # Per-pixel noise: the draft averages most of it away and understates the std by ~0.12.
+        pixels = np.random.default_rng(0).normal(110, 40, (2048, 2048, 1)).clip(0, 255).astype(np.uint8)
+        data = _jpeg_bytes(Image.fromarray(np.repeat(pixels, 3, axis=2)))
+        drafted = ImageContext.from_source(data, draft_size=STATS_DRAFT_SIZE)
+        assert draft_std_error(drafted) > DRAFT_STD_TOLERANCE
+        reference = np.array(Image.open(BytesIO(data)).convert("RGB")) / 255.0
+        assert float(np.std(reference)) - drafted.intensity_stats[1] > DRAFT_STD_TOLERANCE
+        for source in (data, BytesIO(data)):
+            assert decode_for_stats(source).image.size == (2048, 2048)
+        qa = qa_run(data)
+        assert qa["metrics"]["contrast"] == pytest.approx(float(np.std(reference)), abs=1e-4)
+
+    def test_qa_reports_decode_failure(self):
+        qa = qa_run(b"not an image")
+        assert qa["safe_to_infer"] is False
+        assert qa["warnings"][0].startswith("Could not open image")
+
+
+class TestHeaderCheck:
+    def _encode(self, size, fmt, **params):
+        buf = BytesIO()
+        Image.new("RGB", size, color=(90, 90, 90)).save(buf, format=fmt, **params)
+        return buf.getvalue()
+
+    @pytest.mark.parametrize("fmt, params", [("JPEG", {}), ("JPEG", {"progressive": True}), ("PNG", {})])
+    def test_valid_images_pass(self, fmt, params):
+        assert check_header(self._encode((300, 200), fmt, **params)) is None
+        assert check_header(memoryview(self._encode((300, 200), fmt, **params))) is None
+
+    @pytest.mark.parametrize("fmt", ["JPEG", "PNG"])
+    def test_truncated_images_are_rejected(self, fmt):
+        data = self._encode((300, 300), fmt)
+        qa = check_header(data[: len(data) // 2])
+        assert qa["safe_to_infer"] is False
+        assert qa["warnings"] == ["Image file is truncated"]
+
+    def test_small_image_rejected_like_full_qa(self):
+        data = self._encode((400, 120), "PNG")
+        assert check_header(data)["warnings"][0] == qa_run(data)["warnings"][0]
+
+    def test_other_formats_and_garbage_are_rejected(self):
+        assert check_header(self._encode((300, 300), "GIF"))["warnings"] == ["Unsupported image format: GIF"]
+        assert check_header(b"not an image")["warnings"][0].startswith("Could not open image")
@@ -0,0 +1,111 @@
+"""Tests for the model process pool (uses a fake model, no TensorFlow)."""
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ml.inference_pool import InferencePool, InferenceWorkerError
+
+LOADER = "tests.test_inference_pool:make_fake_model"
+BROKEN_LOADER = "tests.test_inference_pool:make_broken_model"
+FAIL_ONCE_LOADER = "tests.test_inference_pool:make_model_failing_once"
+
+
+class FakeModel:
+    """Returns each row's mean; exits the process when asked to, to simulate a crash."""
+
+    def predict(self, batch, verbose=0):
+        if np.any(batch < 0):
+            os._exit(1)
+        return batch.reshape(len(batch), -1).mean(axis=1, keepdims=True)
+
+
+def make_fake_model():
+    return FakeModel()
+
+
+def make_broken_model():
+    raise RuntimeError("weights missing")
+
+
+def make_model_failing_once(marker):
+    """The first process to load fails (it creates marker); every later load succeeds."""
+    try:
+        os.close(os.open(marker, os.O_CREAT | os.O_EXCL))
+    except FileExistsError:
+        return FakeModel()
+    raise RuntimeError("weights missing")
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+@pytest.fixture
+def pool():
+    p = InferencePool(LOADER, num_workers=2, task_timeout=10, health_interval=0.1)
+    yield p
+    p.close()
+
+
+class TestInferencePool:
+    def test_predict_round_trips_through_shared_memory(self, pool):
+        batch = np.stack([np.full((4, 4, 3), v, dtype=np.float32) for v in (0.25, 0.5, 1.0)])
+        out = pool.predict(batch, verbose=0)
+        assert out.shape == (3, 1)
+        assert np.allclose(out[:, 0], [0.25, 0.5, 1.0])
+
+    def test_health_reports_ready_workers(self, pool):
+        pool.predict(np.zeros((1, 2, 2, 3), dtype=np.float32))
+        deadline = time.monotonic() + 30
+        while not all(w["ready"] for w in pool.health()["workers"]) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        health = pool.health()
+        assert health["ready"] is True
+        assert len(health["workers"]) == 2
+        assert all(w["alive"] and w["ready"] for w in health["workers"])
+
+    def test_crashed_worker_fails_request_and_is_restarted(self, pool):
+        pool.predict(np.zeros((1, 2, 2, 3), dtype=np.float32))
+        with pytest.raises(InferenceWorkerError):
+            pool.predict(-np.ones((1, 2, 2, 3), dtype=np.float32))
+        deadline = time.monotonic() + 30
+        while sum(w["restarts"] for w in pool.health()["workers"]) < 1 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert sum(w["restarts"] for w in pool.health()["workers"]) == 1
+        out = pool.predict(np.ones((2, 2, 2, 3), dtype=np.float32))
+        assert np.allclose(out[:, 0], 1.0)
+
+    def test_load_failure_is_reported(self):
+        p = InferencePool(BROKEN_LOADER, num_workers=1, start_timeout=30, health_interval=0.1)
+        try:
+            with pytest.raises(InferenceWorkerError, match="weights missing"):
+                p.predict(np.zeros((1, 2, 2, 3), dtype=np.float32))
+            assert "weights missing" in p.health()["load_error"]
+            assert p.is_ready() is False
+            # The monitor keeps retrying the load instead of giving up after the first failure.
+            assert wait_for(lambda: p.health()["workers"][0]["restarts"] >= 2)
+        finally:
+            p.close()
+
+    def test_one_failed_load_does_not_reject_requests(self, tmp_path):
+        p = InferencePool(
+            FAIL_ONCE_LOADER, [str(tmp_path / "loaded")], num_workers=2, start_timeout=30, health_interval=0.1
+        )
+        try:
+            out = p.predict(np.ones((1, 2, 2, 3), dtype=np.float32))
+            assert np.allclose(out[:, 0], 1.0)
+            # The process that failed is reloaded and serves too.
+            assert wait_for(lambda: all(w["ready"] for w in p.health()["workers"]))
+            health = p.health()
+            assert health["load_error"] is None
+            assert sum(w["restarts"] for w in health["workers"]) == 1
+            assert np.allclose(p.predict(np.zeros((2, 2, 2, 3), dtype=np.float32))[:, 0], 0.0)
+        finally:
+            p.close()
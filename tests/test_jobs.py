@@ -0,0 +1,131 @@
+"""Tests for the background job manager and orchestrator stage events."""
+import os
+import sys
+import threading
+import time
+
+import pytest
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent.jobs import JobManager, QueueFullError
+from agent.orchestrator import run as orchestrate, run_batch as orchestrate_batch
+from tests.conftest import fake_predict, jpeg_bytes
+
+CLASS_LABELS = ["glioma", "meningioma", "no_tumor", "pituitary"]
+
+
+def _wait(job, timeout=5.0):
+    deadline = time.time() + timeout
+    while not job.done and time.time() < deadline:
+        time.sleep(0.005)
+    assert job.done
+
+
+def _model():
+    mock = MagicMock()
+    mock.predict.side_effect = fake_predict
+    return mock
+
+
+class TestJobManager:
+    def test_job_result_and_status_events(self):
+        jobs = JobManager(max_workers=1, max_queued=1)
+        job = jobs.submit("test", lambda j: {"value": 1})
+        _wait(job)
+        assert job.status == "succeeded"
+        assert job.result == {"value": 1}
+        statuses = [e["data"]["status"] for e in job.events if e["event"] == "status"]
+        assert statuses == ["queued", "running", "succeeded"]
+        assert jobs.get(job.id) is job
+
+    def test_failure_is_recorded(self):
+        jobs = JobManager(max_workers=1, max_queued=1)
+
+        def boom(job):
+            raise ValueError("bad input")
+
+        job = jobs.submit("test", boom)
+        _wait(job)
+        assert job.status == "failed"
+        assert job.error == "bad input"
+        assert job.to_dict()["result"] is None
+
+    def test_queue_full_raises_with_retry_after(self):
+        jobs = JobManager(max_workers=1, max_queued=1)
+        release = threading.Event()
+        first = jobs.submit("test", lambda j: release.wait(5))
+        second = jobs.submit("test", lambda j: release.wait(5))
+        with pytest.raises(QueueFullError) as exc:
+            jobs.submit("test", lambda j: None)
+        assert exc.value.retry_after >= 1
+        release.set()
+        _wait(first)
+        _wait(second)
+        # Capacity frees up once jobs finish.
+        _wait(jobs.submit("test", lambda j: None))
+        assert jobs.stats()["pending"] == 0
+
+    def test_stream_replays_and_follows_until_done(self):
+        jobs = JobManager(max_workers=1, max_queued=1)
+        release = threading.Event()
+
+        def work(job):
+            job.stage("qa", {"stage": "qa"})
+            release.wait(5)
+            job.stage("vision", {"stage": "vision"})
+            return {}
+
+        job = jobs.submit("test", work)
+        received = []
+
+        def consume():
+            received.extend(e for e in job.stream(heartbeat=0.05) if e is not None)
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        time.sleep(0.05)
+        release.set()
+        consumer.join(5)
+        assert not consumer.is_alive()
+        stages = [e["data"]["stage"] for e in received if e["event"] == "stage"]
+        assert stages == ["qa", "vision"]
+        assert received[-1]["data"]["status"] == "succeeded"
+        # after_id skips events the client already has.
+        resumed = list(job.stream(after_id=received[-2]["id"]))
+        assert resumed == [received[-1]]
+
+    def test_expired_jobs_are_evicted(self):
+        jobs = JobManager(max_workers=1, max_queued=1, ttl_seconds=0)
+        job = jobs.submit("test", lambda j: {})
+        _wait(job)
+        jobs.submit("test", lambda j: {})
+        assert jobs.get(job.id) is None
+
+
+class TestOrchestratorStages:
+    def test_run_emits_stages_in_order(self):
+        stages = []
+        result = orchestrate(jpeg_bytes((200, 200)), _model(), CLASS_LABELS, on_stage=lambda s, p: stages.append(p))
+        assert [p["stage"] for p in stages] == ["qa", "vision", "report", "safety_gate"]
+        assert stages[1]["result"] == result["vision"]
+        assert stages[3]["result"] == result["report"]
+
+    def test_qa_failure_marks_vision_skipped(self):
+        stages = []
+        orchestrate(jpeg_bytes((50, 50)), _model(), CLASS_LABELS, on_stage=lambda s, p: stages.append(p))
+        assert stages[1]["stage"] == "vision"
+        assert stages[1]["result"] is None
+        assert stages[1]["skipped"] is True
+
+    def test_batch_emits_stage_counts(self):
+        stages = {}
+        orchestrate_batch(
+            [("a.jpg", jpeg_bytes((200, 200))), ("b.jpg", jpeg_bytes((50, 50)))],
+            _model(),
+            CLASS_LABELS,
+            on_stage=lambda s, p: stages.__setitem__(s, p["result"]),
+        )
+        assert list(stages) == ["qa", "vision", "report", "safety_gate"]
+        assert stages["qa"] == {"num_slices": 2, "num_passed": 1}
+        assert stages["safety_gate"]["study"]["num_analyzed"] == 1
@@ -0,0 +1,247 @@
+"""Tests for named model backends, hot reload and model versions in responses."""
+import os
+import sys
+import threading
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from agent.orchestrator import run as orchestrate, run_batch as orchestrate_batch, run_cached
+from agent.result_cache import ResultCache
+from ml.registry import BACKENDS, ModelHandle, ModelRegistry, ReloadInProgress, register_backend, resolve_backend
+
+
+class FakeModel:
+    """Stands in for a loaded backend; records whether it was closed."""
+
+    def __init__(self, path="", probs=(0.1, 0.2, 0.6, 0.1)):
+        self.path = path
+        self.probs = probs
+        self.closed = False
+
+    def predict(self, batch, verbose=0):
+        return np.tile([self.probs], (len(batch), 1))
+
+    def close(self):
+        self.closed = True
+
+
+def load_fake(path, warmup_batch_sizes=(), option=None):
+    """Loader registered as the "fake" backend in these tests."""
+    return FakeModel(path, probs=(0.7, 0.1, 0.1, 0.1))
+
+
+def _jpeg(size=(200, 200)):
+    buf = BytesIO()
+    pixels = np.random.default_rng(0).integers(40, 200, (size[1], size[0], 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def _registry(on_retired=None):
+    published = []
+    return ModelRegistry(lambda: None, published.append, on_retired), published
+
+
+class TestBackends:
+    def test_builtin_backends_are_named(self):
+        assert {"keras", "tflite"} <= set(BACKENDS)
+
+    def test_register_and_resolve(self):
+        register_backend("fake", "tests.test_model_registry:load_fake")
+        assert resolve_backend("fake") is load_fake
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            resolve_backend("onnx-gpu")
+
+
+class TestHotSwap:
+    def test_swap_publishes_and_closes_idle_model(self):
+        retired = []
+        registry, published = _registry(retired.append)
+        old, new = FakeModel(), FakeModel()
+        registry.swap(ModelHandle(old, "fake", "v1"))
+        registry.swap(ModelHandle(new, "fake", "v2"))
+        assert published == [old, new]
+        assert registry.current.version == "v2"
+        assert old.closed is True and new.closed is False
+        assert [h.model for h in retired] == [old]
+        assert registry.describe()["history"][0]["version"] == "v1"
+
+    def test_in_flight_request_keeps_its_model(self):
+        registry, _ = _registry()
+        old, new = FakeModel(), FakeModel()
+        registry.swap(ModelHandle(old, "fake", "v1"))
+        with registry.pinned(old) as handle:
+            registry.swap(ModelHandle(new, "fake", "v2"))
+            assert handle.version == "v1"
+            assert old.closed is False
+            assert registry.describe()["draining"][0]["in_flight"] == 1
+        assert old.closed is True
+        assert registry.describe()["draining"] == []
+
+    def test_acquire_current_pins_the_model_it_returns(self):
+        registry, _ = _registry()
+        assert registry.acquire_current() == (None, None)
+        old = FakeModel()
+        registry.swap(ModelHandle(old, "fake", "v1"))
+        model, handle = registry.acquire_current()
+        registry.swap(ModelHandle(FakeModel(), "fake", "v2"))
+        assert (model, handle.version, old.closed) == (old, "v1", False)
+        registry.release(handle)
+        assert old.closed is True
+
+    def test_request_pins_the_registry_model_not_a_stale_global(self):
+        registry, _ = _registry()
+        old, new = FakeModel(), FakeModel()
+        registry.swap(ModelHandle(old, "fake", "v1"))
+        # app.model still holds old while a swap has already published new and closed old.
+        with patch.object(app_module, "model_registry", registry), patch("app.model", old):
+            registry.swap(ModelHandle(new, "fake", "v2"))
+            assert old.closed is True
+            with app_module.pinned_model() as (current, version):
+                assert (current, version) == (new, "v2")
+                registry.swap(ModelHandle(FakeModel(), "fake", "v3"))
+                assert new.closed is False
+            assert new.closed is True
+
+    def test_closed_model_cannot_be_pinned(self):
+        registry, _ = _registry()
+        old = FakeModel()
+        registry.swap(ModelHandle(old, "fake", "v1"))
+        registry.swap(ModelHandle(FakeModel(), "fake", "v2"))
+        assert registry.acquire(old) is None
+
+    def test_failed_reload_keeps_current_model(self):
+        registry, published = _registry()
+        current = FakeModel()
+        registry.swap(ModelHandle(current, "fake", "v1"))
+        candidate = FakeModel()
+
+        def reject(handle):
+            raise RuntimeError("warm-up failed")
+
+        with pytest.raises(RuntimeError):
+            registry.reload(lambda: ModelHandle(candidate, "fake", "v2"), reject)
+        assert registry.current.model is current
+        assert candidate.closed is True
+        with pytest.raises(OSError):
+            registry.reload(lambda: (_ for _ in ()).throw(OSError("missing file")))
+        assert published == [current]
+
+    def test_reload_runs_one_at_a_time(self):
+        registry, _ = _registry()
+        registry.swap(ModelHandle(FakeModel(), "fake", "v1"))
+        release = threading.Event()
+        started = threading.Event()
+
+        def slow_loader():
+            started.set()
+            release.wait(5)
+            return ModelHandle(FakeModel(), "fake", "v2")
+
+        worker = threading.Thread(target=registry.reload, args=(slow_loader,))
+        worker.start()
+        started.wait(5)
+        with pytest.raises(ReloadInProgress):
+            registry.reload(lambda: FakeModel())
+        release.set()
+        worker.join(5)
+        assert registry.current.version == "v2"
+
+
+class TestVersionInResponses:
+    def test_run_reports_model_version(self):
+        result = orchestrate(_jpeg(), FakeModel(), app_module.CLASS_LABELS, model_version="vgg:1")
+        assert result["model_version"] == "vgg:1"
+
+    def test_cache_hit_reports_model_version(self):
+        cache = ResultCache(8)
+        for _ in range(2):
+            result = run_cached(cache, "k", _jpeg(), FakeModel(), app_module.CLASS_LABELS, model_version="vgg:1")
+        assert cache.stats()["hits"] == 1
+        assert result["model_version"] == "vgg:1"
+
+    def test_batch_reports_model_version(self):
+        result = orchestrate_batch([("a.jpg", _jpeg())], FakeModel(), app_module.CLASS_LABELS, model_version="vgg:1")
+        assert result["model_version"] == "vgg:1"
+
+
+class TestAdminReload:
+    @pytest.fixture
+    def admin(self, tmp_path):
+        register_backend("fake", "tests.test_model_registry:load_fake")
+        (tmp_path / "v2.bin").write_bytes(b"weights")
+        registry = ModelRegistry(app_module.build_model_handle, app_module._publish_model, app_module._retire_model)
+        original = FakeModel()
+        with patch.object(app_module, "model_registry", registry), patch("app.model", None), \
+                patch("app.warmup", app_module.warmup), patch("app.result_cache", None), \
+                patch("app.ADMIN_TOKEN", "s3cret"), patch("app.MODEL_DIR", str(tmp_path)), \
+                patch("app.WARMUP_ENABLED", True):
+            registry.swap(ModelHandle(original, "keras", "vgg.h5:1:1", "vgg.h5"))
+            app_module.app.config["TESTING"] = True
+            with app_module.app.test_client() as client:
+                yield client, original
+
+    def _reload(self, client, body, token="s3cret"):
+        return client.post("/api/v1/admin/models/reload", json=body, headers={"Authorization": f"Bearer {token}"})
+
+    def test_disabled_without_token(self, admin):
+        client, _ = admin
+        with patch("app.ADMIN_TOKEN", ""):
+            assert self._reload(client, {}).status_code == 404
+
+    def test_wrong_token(self, admin):
+        client, _ = admin
+        response = self._reload(client, {}, token="guess")
+        assert response.status_code == 401
+        assert response.get_json()["error"]["code"] == "UNAUTHORIZED"
+
+    @pytest.mark.parametrize(
+        "body, code",
+        [
+            ({"backend": "nope"}, "INVALID_BACKEND"),
+            ({"backend": "fake", "path": "../../etc/passwd"}, "INVALID_MODEL_PATH"),
+            ({"backend": "fake", "path": "missing.bin"}, "INVALID_MODEL_PATH"),
+        ],
+    )
+    def test_rejects_bad_requests(self, admin, body, code):
+        client, original = admin
+        response = self._reload(client, body)
+        assert response.status_code == 400
+        assert response.get_json()["error"]["code"] == code
+        assert app_module.model is original
+
+    def test_reload_swaps_model_and_version(self, admin):
+        client, original = admin
+        response = self._reload(client, {"backend": "fake", "path": "v2.bin"})
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data["previous"]["version"] == "vgg.h5:1:1"
+        assert data["model"]["backend"] == "fake"
+        assert data["model"]["version"].startswith("v2.bin:")
+        assert data["warmup"]["state"] == "done"
+        assert original.closed is True
+        assert app_module.model.path.endswith("v2.bin")
+        assert app_module.warmup.state == "done"
+
+        analyzed = client.post("/api/v1/analyze", data={"image": (BytesIO(_jpeg()), "scan.jpg")})
+        assert analyzed.get_json()["model_version"] == data["model"]["version"]
+        assert analyzed.get_json()["vision"]["label"] == "glioma"
+        health = client.get("/healthz").get_json()
+        assert health["model_version"] == data["model"]["version"]
+        assert health["models"]["history"][0]["version"] == "vgg.h5:1:1"
+
+    def test_failed_warmup_keeps_previous_model(self, admin):
+        client, original = admin
+        with patch("app.warmup_steps", lambda target=None: [("vision", MagicMock(side_effect=RuntimeError("boom")))]):
+            response = self._reload(client, {"backend": "fake", "path": "v2.bin"})
+        assert response.status_code == 500
+        assert response.get_json()["error"]["code"] == "RELOAD_FAILED"
+        assert app_module.model is original
@@ -0,0 +1,101 @@
+"""Tests for the fused preprocessing path and its per-thread batch buffers."""
+import glob
+import io
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent.orchestrator import analysis_thresholds
+from ml import preprocess
+from ml.preprocess import batch_buffer, decode_image, open_image, preprocess_batch, preprocess_image, preprocess_into, resample_filter
+from tests.conftest import jpeg_bytes
+
+SCANS = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "image_data", "images", "*", "*.jpg")))
+
+
+def _reference(image):
+    """The original preprocessing: resize, float copy, scale."""
+    array = np.array(image.convert("RGB").resize((224, 224)), dtype=np.float32)
+    array *= 1.0 / 255.0
+    return array
+
+
+class TestFusedPreprocess:
+    def test_matches_reference_on_sample_scans(self):
+        assert SCANS
+        for path in SCANS:
+            image = Image.open(path)
+            np.testing.assert_array_equal(preprocess_image(image)[0], _reference(image))
+
+    def test_converts_mode_and_writes_into_out(self):
+        image = Image.new("L", (300, 200), 128)
+        out = np.zeros((224, 224, 3), dtype=np.float32)
+        assert preprocess_into(image, out) is out
+        assert out.dtype == np.float32
+        assert out.max() == pytest.approx(128 / 255)
+
+    def test_preprocess_image_returns_owned_array(self):
+        image = Image.open(SCANS[0])
+        first = preprocess_image(image)
+        preprocess_batch([Image.new("RGB", (224, 224))])
+        second = preprocess_image(image)
+        assert first.shape == (1, 224, 224, 3)
+        assert first is not second
+        np.testing.assert_array_equal(first, second)
+
+    def test_unknown_resample_filter(self):
+        with pytest.raises(ValueError, match="Unknown resample filter"):
+            resample_filter("sinc")
+        assert resample_filter("box") == Image.Resampling.BOX
+
+
+class TestBatchBuffer:
+    def test_buffer_is_reused_and_grown(self):
+        small = batch_buffer(2)
+        assert np.shares_memory(batch_buffer(1), small)
+        large = batch_buffer(6)
+        assert large.shape == (6, 224, 224, 3)
+        assert np.shares_memory(batch_buffer(3), large)
+
+    def test_batch_rows_match_single_images(self):
+        images = [Image.open(path) for path in SCANS[:3]]
+        batch = preprocess_batch(images)
+        for image, row in zip(images, batch):
+            np.testing.assert_array_equal(row, _reference(image))
+
+    def test_threads_get_their_own_buffer(self):
+        main = batch_buffer(1)
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(batch_buffer(1)))
+        thread.start()
+        thread.join()
+        assert not np.shares_memory(main, seen[0])
+
+
+class TestDraftDecode:
+    def test_large_jpeg_is_drafted(self):
+        assert open_image(jpeg_bytes((2048, 2048), (90, 90, 90)), draft_size=512).size == (512, 512)
+        assert open_image(jpeg_bytes((2048, 1536), (90, 90, 90)), draft_size=512).size == (1024, 768)
+        image, source_size = decode_image(jpeg_bytes((2048, 1536), (90, 90, 90)), draft_size=512)
+        assert (image.size, source_size) == ((1024, 768), (2048, 1536))
+
+    def test_draft_keeps_at_least_draft_size(self):
+        assert open_image(jpeg_bytes((800, 800), (90, 90, 90)), draft_size=512).size == (800, 800)
+
+    def test_draft_disabled(self):
+        assert open_image(jpeg_bytes((2048, 1536), (90, 90, 90)), draft_size=0).size == (2048, 1536)
+
+    def test_png_is_decoded_in_full(self):
+        buf = io.BytesIO()
+        Image.new("RGB", (2048, 1536)).save(buf, "PNG")
+        assert open_image(buf.getvalue(), draft_size=512).size == (2048, 1536)
+
+    def test_settings_are_part_of_cache_key(self):
+        thresholds = analysis_thresholds()
+        assert thresholds["preprocess_draft_size"] == preprocess.DRAFT_SIZE
+        assert thresholds["preprocess_resample"] == preprocess.RESAMPLE
@@ -0,0 +1,97 @@
+"""Tests for the extended QA metrics (blur, noise, clipping, grayscale) and their thresholds."""
+import glob
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image, ImageFilter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent.image_context import QA_BUFFER_SIZE, ImageContext
+from agent.orchestrator import analysis_thresholds
+from agent.qa_agent import run as qa_run
+from agent.qa_metrics import _laplacian_and_noise, measure, thresholds, warnings_for
+
+SCANS = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "image_data", "images", "*", "*.jpg")))
+
+
+def _scans():
+    return [Image.open(path).convert("RGB") for path in SCANS]
+
+
+def _warnings(image):
+    return warnings_for(measure(ImageContext(image))[0])
+
+
+def _with_noise(image, sigma, seed=0):
+    pixels = np.asarray(image, dtype=np.float32)
+    noise = np.random.default_rng(seed).normal(0, sigma, pixels.shape[:2] + (1,))
+    return Image.fromarray(np.clip(pixels + noise, 0, 255).astype(np.uint8))
+
+
+class TestCalibration:
+    """The thresholds separate the sample scans from degraded copies of them."""
+
+    def test_sample_scans_raise_no_warnings(self):
+        assert SCANS
+        assert all(_warnings(image) == [] for image in _scans())
+
+    def test_blurred_scans_are_flagged(self):
+        assert all("Image looks blurry" in _warnings(image.filter(ImageFilter.GaussianBlur(3))) for image in _scans())
+
+    def test_noisy_scans_are_flagged(self):
+        assert all("Image looks noisy" in _warnings(_with_noise(image, 15)) for image in _scans())
+
+    def test_colour_photo_is_flagged(self):
+        pixels = np.random.default_rng(0).integers(0, 256, (300, 300, 3), dtype=np.uint8)
+        assert "Image is not grayscale; expected an MRI slice" in _warnings(Image.fromarray(pixels))
+
+    def test_clipped_highlights_are_flagged(self):
+        pixels = np.asarray(_scans()[0]).copy()
+        pixels[: pixels.shape[0] // 4] = 255
+        assert "Highlights are clipped" in _warnings(Image.fromarray(pixels))
+
+
+class TestMeasure:
+    def test_matches_float_reference(self):
+        gray = np.random.default_rng(0).integers(0, 256, (64, 80)).astype(np.float64)
+        laplacian = gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:] - 4 * gray[1:-1, 1:-1]
+        kernel = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]])
+        residual = sum(kernel[i, j] * gray[i:i + 62, j:j + 78] for i in range(3) for j in range(3))
+        blur, noise = _laplacian_and_noise(gray.astype(np.int16))
+        assert blur == pytest.approx(laplacian.var(), rel=1e-5)
+        assert noise == pytest.approx(np.sqrt(np.pi / 2) * np.abs(residual).mean() / 6, rel=1e-9)
+
+    def test_buffer_is_downsampled(self):
+        ctx = ImageContext(Image.new("RGB", (1200, 900)))
+        assert ctx.qa_buffer.size == (400, 300)
+        assert min(ctx.qa_buffer.size) >= QA_BUFFER_SIZE
+
+    def test_timings_cover_each_stage(self):
+        _, timings = measure(ImageContext(_scans()[0]))
+        assert set(timings) == {"buffer", "blur_noise", "histogram", "total"}
+        assert timings["total"] >= timings["blur_noise"]
+
+
+class TestQaResult:
+    def test_metrics_in_qa_result(self):
+        ctx = ImageContext(_scans()[0])
+        qa = qa_run(ctx)
+        mean, std = ctx.intensity_stats
+        assert qa["metrics"]["brightness"] == pytest.approx(mean, abs=1e-5)
+        assert qa["metrics"]["contrast"] == pytest.approx(std, abs=1e-5)
+        assert {"blur_laplacian_var", "noise_sigma", "clipped_high", "clipped_low", "color_fraction"} <= set(qa["metrics"])
+        assert {"intensity", "total"} <= set(qa["metrics_ms"])
+
+    def test_extended_warnings_do_not_block(self):
+        qa = qa_run(ImageContext(_scans()[0].filter(ImageFilter.GaussianBlur(3))))
+        assert qa["safe_to_infer"] is True
+        assert "Image looks blurry" in qa["warnings"]
+
+    def test_too_small_image_has_no_metrics(self):
+        qa = qa_run(ImageContext(Image.new("RGB", (100, 100))))
+        assert "metrics" not in qa
+
+    def test_thresholds_are_part_of_cache_key(self):
+        assert thresholds().items() <= analysis_thresholds().items()
@@ -0,0 +1,102 @@
+"""Tests for the content-hash result cache."""
+import os
+import sys
+from io import BytesIO
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent import result_cache as rc
+from agent.result_cache import ResultCache, cache_key
+from app import app
+
+
+class TestCacheKey:
+    def test_key_depends_on_bytes_model_and_thresholds(self):
+        base = cache_key(b"abc", "v1", {"t": 0.6})
+        assert base == cache_key(b"abc", "v1", {"t": 0.6})
+        assert base != cache_key(b"abd", "v1", {"t": 0.6})
+        assert base != cache_key(b"abc", "v2", {"t": 0.6})
+        assert base != cache_key(b"abc", "v1", {"t": 0.7})
+
+
+class TestResultCache:
+    @pytest.fixture(params=["memory", "sqlite"])
+    def make_cache(self, request, tmp_path):
+        def factory(max_entries=2, ttl_seconds=60):
+            path = str(tmp_path / "cache.sqlite") if request.param == "sqlite" else None
+            return ResultCache(max_entries, ttl_seconds, path)
+        return factory
+
+    def test_hit_and_miss_counters(self, make_cache):
+        cache = make_cache()
+        assert cache.get("k") is None
+        cache.set("k", {"qa": {"ok": True}})
+        assert cache.get("k") == {"qa": {"ok": True}}
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["entries"] == 1
+
+    def test_least_recently_used_entry_evicted(self, make_cache, monkeypatch):
+        clock = iter(range(100, 200))
+        monkeypatch.setattr(rc.time, "time", lambda: next(clock))
+        cache = make_cache(max_entries=2)
+        cache.set("a", {"v": 1})
+        cache.set("b", {"v": 2})
+        cache.get("a")
+        cache.set("c", {"v": 3})
+        assert cache.get("b") is None
+        assert cache.get("a") == {"v": 1}
+        assert cache.get("c") == {"v": 3}
+
+    def test_entries_expire_after_ttl(self, make_cache, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(rc.time, "time", lambda: now[0])
+        cache = make_cache(ttl_seconds=10)
+        cache.set("k", {"v": 1})
+        now[0] += 11
+        assert cache.get("k") is None
+
+    def test_sqlite_entries_survive_reopen(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite")
+        ResultCache(10, 60, path).set("k", {"v": 1})
+        assert ResultCache(10, 60, path).get("k") == {"v": 1}
+
+
+class TestAnalyzeCaching:
+    @pytest.fixture
+    def client(self):
+        app.config["TESTING"] = True
+        with app.test_client() as client:
+            yield client
+
+    def test_repeated_upload_served_from_cache(self, client):
+        buf = BytesIO()
+        Image.new("RGB", (210, 190), color=(40, 90, 160)).save(buf, format="PNG")
+        data = buf.getvalue()
+        mock_model = MagicMock()
+        mock_model.predict.side_effect = lambda batch, verbose=0: np.array([[0.7, 0.1, 0.1, 0.1]])
+        with patch("app.model", mock_model), \
+                patch("app.result_cache", ResultCache(8, 60)), \
+                patch("app.PERSIST_UPLOADS", False):
+            first = client.post(
+                "/api/v1/analyze",
+                data={"image": (BytesIO(data), "a.png")},
+                content_type="multipart/form-data",
+            ).get_json()
+            second = client.post(
+                "/api/v1/analyze",
+                data={"image": (BytesIO(data), "b.png")},
+                content_type="multipart/form-data",
+            ).get_json()
+            health = client.get("/healthz").get_json()
+        assert mock_model.predict.call_count == 1
+        assert first["request_id"] != second["request_id"]
+        assert first["vision"] == second["vision"]
+        assert first["report"] == second["report"]
+        assert health["cache"]["hits"] == 1
+        assert health["cache"]["misses"] == 1
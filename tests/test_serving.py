@@ -0,0 +1,99 @@
+"""Tests for the tf.function serving wrapper (small stand-in Keras model, no .h5 file)."""
+import os
+import sys
+
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tensorflow as tf
+from ml.heatmap import supports_explain
+from ml.serving import ServingModel, as_serving_model, last_conv_layer, load_keras_model
+
+
+def _tiny_model():
+    inputs = tf.keras.Input(shape=(224, 224, 3))
+    x = tf.keras.layers.Conv2D(2, 3, strides=8)(inputs)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    outputs = tf.keras.layers.Dense(4, activation="softmax")(x)
+    return tf.keras.Model(inputs, outputs)
+
+
+@pytest.fixture(scope="module")
+def keras_model():
+    return _tiny_model()
+
+
+class TestServingModel:
+    def test_matches_model_predict(self, keras_model):
+        batch = np.random.default_rng(0).random((3, 224, 224, 3), dtype=np.float32)
+        serving = ServingModel(keras_model)
+        np.testing.assert_allclose(serving.predict(batch), keras_model.predict(batch, verbose=0), rtol=1e-5, atol=1e-6)
+
+    def test_one_trace_serves_every_batch_size(self, keras_model):
+        serving = ServingModel(keras_model)
+        for size in (1, 5, 8, 1):
+            out = serving.predict(np.zeros((size, 224, 224, 3), dtype=np.float32), verbose=0)
+            assert out.shape == (size, 4)
+        assert serving.tracing_count == 1
+
+    def test_non_float32_input_is_cast(self, keras_model):
+        serving = ServingModel(keras_model)
+        out = serving.predict(np.zeros((1, 224, 224, 3), dtype=np.float64))
+        assert out.dtype == np.float32
+
+    def test_warmup_records_each_batch_size(self, keras_model):
+        serving = ServingModel(keras_model)
+        timings = serving.warmup((1, 4))
+        assert set(timings) == {1, 4}
+        assert serving.tracing_count == 1
+
+
+class TestExplain:
+    def test_probs_match_predict_and_heatmaps_are_normalized(self, keras_model):
+        batch = np.random.default_rng(1).random((3, 224, 224, 3), dtype=np.float32)
+        serving = ServingModel(keras_model)
+        probs, cams = serving.explain(batch)
+        np.testing.assert_allclose(probs, serving.predict(batch), rtol=1e-5, atol=1e-6)
+        assert cams.shape == (3, 28, 28)
+        assert cams.min() >= 0 and cams.max() <= 1
+
+    def test_batched_heatmaps_match_per_image_gradcam(self, keras_model):
+        batch = np.random.default_rng(2).random((2, 224, 224, 3), dtype=np.float32)
+        probs, cams = ServingModel(keras_model).explain(batch)
+        cam_model = tf.keras.Model(keras_model.inputs, [last_conv_layer(keras_model).output, keras_model.output])
+        for i in range(2):
+            with tf.GradientTape() as tape:
+                conv_out, preds = cam_model(batch[i:i + 1], training=False)
+                score = preds[:, int(np.argmax(probs[i]))]
+            weights = tf.reduce_mean(tape.gradient(score, conv_out), axis=(0, 1, 2))
+            expected = tf.nn.relu(tf.reduce_sum(conv_out[0] * weights, axis=-1)).numpy()
+            if expected.max() > 0:
+                expected /= expected.max()
+            np.testing.assert_allclose(cams[i], expected, atol=1e-5)
+
+    def test_explainer_is_built_once_per_model(self, keras_model):
+        serving = ServingModel(keras_model)
+        serving.explain(np.zeros((1, 224, 224, 3), dtype=np.float32))
+        explainer = serving._explain
+        serving.explain(np.zeros((4, 224, 224, 3), dtype=np.float32))
+        assert serving._explain is explainer
+        assert explainer.experimental_get_tracing_count() == 1
+        assert supports_explain(serving)
+
+
+class TestAsServingModel:
+    def test_wraps_keras_models_only(self, keras_model):
+        assert isinstance(as_serving_model(keras_model), ServingModel)
+        mock = MagicMock()
+        assert as_serving_model(mock) is mock
+
+    def test_load_keras_model_wraps_and_warms(self, keras_model, tmp_path):
+        path = str(tmp_path / "tiny.keras")
+        keras_model.save(path)
+        serving = load_keras_model(path, warmup_batch_sizes=(2,))
+        assert isinstance(serving, ServingModel)
+        assert set(serving.warmup_ms) == {2}
+        plain = load_keras_model(path, serving_function=False)
+        assert isinstance(plain, tf.keras.Model)
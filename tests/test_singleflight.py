@@ -0,0 +1,66 @@
+"""Tests for single-flight deduplication of in-flight analyses."""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agent.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    def test_concurrent_callers_share_one_run(self):
+        flight = SingleFlight()
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"value": 42}
+
+        results = []
+
+        def caller():
+            results.append(flight.do("k", slow))
+
+        leader = threading.Thread(target=caller)
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=caller) for _ in range(3)]
+        for t in followers:
+            t.start()
+        while flight.stats()["shared"] < 3:
+            time.sleep(0.001)
+        release.set()
+        for t in [leader] + followers:
+            t.join()
+
+        assert len(calls) == 1
+        assert [r[0] for r in results] == [{"value": 42}] * 4
+        assert sorted(r[1] for r in results) == [False, True, True, True]
+        assert flight.stats() == {"in_flight": 0, "leaders": 1, "shared": 3}
+
+    def test_different_keys_run_independently(self):
+        flight = SingleFlight()
+        assert flight.do("a", lambda: 1) == (1, False)
+        assert flight.do("b", lambda: 2) == (2, False)
+
+    def test_key_released_after_completion(self):
+        flight = SingleFlight()
+        flight.do("k", lambda: 1)
+        assert flight.do("k", lambda: 2) == (2, False)
+
+    def test_exception_shared_and_key_released(self):
+        flight = SingleFlight()
+
+        def boom():
+            raise ValueError("bad image")
+
+        with pytest.raises(ValueError):
+            flight.do("k", boom)
+        assert flight.stats()["in_flight"] == 0
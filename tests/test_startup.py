@@ -0,0 +1,103 @@
+"""Tests for the model registry and the import-time budget of the web app."""
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ml.registry import ModelRegistry
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Importing the app must stay well below TensorFlow's own import time (several seconds).
+IMPORT_BUDGET_S = 2.0
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+import_s = time.perf_counter() - start
+tf_imported = "tensorflow" in sys.modules
+client = app.app.test_client()
+home = client.get("/").status_code
+health = client.get("/healthz").get_json()
+print(json.dumps({"import_s": import_s, "tf_imported": tf_imported, "home": home,
+                  "model_load": health["model_load"]["state"]}))
+"""
+
+
+def _probe(**env):
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=ROOT,
+        env={**os.environ, **env},
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    # The background loader may print its startup line after the probe's JSON.
+    return json.loads(next(line for line in result.stdout.splitlines() if line.startswith("{")))
+
+
+class TestModelRegistry:
+    def test_load_publishes_model(self):
+        published = []
+        registry = ModelRegistry(lambda: "model", published.append)
+        assert registry.state == "idle"
+        registry.load()
+        assert published == ["model"]
+        assert registry.state == "ready"
+        assert registry.snapshot()["load_ms"] is not None
+
+    def test_failed_load_publishes_nothing(self):
+        published = []
+
+        def broken():
+            raise OSError("file signature not found")
+
+        registry = ModelRegistry(broken, published.append)
+        registry.load()
+        assert published == []
+        assert registry.state == "failed"
+        assert "signature" in registry.error
+
+    def test_background_load_reports_loading(self):
+        release = threading.Event()
+        registry = ModelRegistry(lambda: release.wait(5) and "model", lambda m: None)
+        registry.load(background=True)
+        assert registry.loading is True
+        registry.load(background=True)  # second call while loading is a no-op
+        release.set()
+        assert registry.wait(5) is True
+        assert registry.state == "ready"
+
+
+class TestImportBudget:
+    def test_import_does_not_load_tensorflow(self):
+        probe = _probe(MODEL_LOAD_DEFERRED="1")
+        assert probe["tf_imported"] is False
+        assert probe["import_s"] < IMPORT_BUDGET_S
+        assert probe["home"] == 200
+        assert probe["model_load"] == "idle"
+
+    def test_background_load_does_not_block_import(self):
+        probe = _probe(MODEL_LOAD="background", MODEL_LOAD_DEFERRED="0")
+        assert probe["import_s"] < IMPORT_BUDGET_S
+        assert probe["home"] == 200
+        assert probe["model_load"] in ("loading", "failed", "ready")
+
+    def test_unavailable_message_while_loading(self):
+        import app
+
+        release = threading.Event()
+        registry = ModelRegistry(lambda: release.wait(5), lambda m: None)
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(app, "model_registry", registry)
+            registry.load(background=True)
+            assert "loading" in app.model_unavailable_message()
+            release.set()
+            registry.wait(5)
+            assert app.model_unavailable_message() == "Model is not available on the server."
@@ -0,0 +1,155 @@
+"""Tests for study-level aggregation: rules, early stop and the streaming study pipeline."""
+import os
+import sys
+from io import BytesIO
+
+import numpy as np
+import pytest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from agent.orchestrator import run_batch as orchestrate_batch
+from agent.study import StudyAggregator, StudyRule
+from tests.conftest import jpeg_bytes
+
+LABELS = ["glioma", "meningioma", "no_tumor", "pituitary"]
+
+
+def _vision(probs):
+    probs = dict(zip(LABELS, probs))
+    return {"label": max(probs, key=probs.get), "probs": probs}
+
+
+def _model(row):
+    model = MagicMock()
+    model.predict.side_effect = lambda batch, verbose=0: np.tile(np.array([row]), (len(batch), 1))
+    return model
+
+
+SLICES = [
+    [0.1, 0.1, 0.7, 0.1],
+    [0.9, 0.0, 0.1, 0.0],
+    [0.2, 0.1, 0.6, 0.1],
+    [0.3, 0.1, 0.5, 0.1],
+]
+
+
+class TestAggregator:
+    def _aggregate(self, rule):
+        aggregator = StudyAggregator(LABELS, rule)
+        for probs in SLICES:
+            aggregator.add(_vision(probs))
+        return aggregator
+
+    def test_mean(self):
+        summary = self._aggregate(StudyRule("mean")).summary(4, 0)
+        assert summary["label"] == "no_tumor"
+        assert summary["confidence"] == pytest.approx(0.475)
+        assert summary["scores"] == summary["mean_probs"]
+        assert summary["label_counts"] == {"glioma": 1, "meningioma": 0, "no_tumor": 3, "pituitary": 0}
+
+    def test_max_lets_one_convincing_slice_decide(self):
+        summary = self._aggregate(StudyRule("max")).summary(4, 0)
+        assert (summary["label"], summary["confidence"]) == ("glioma", pytest.approx(0.9))
+        assert summary["mean_probs"]["no_tumor"] == pytest.approx(0.475)
+
+    def test_topk_averages_the_highest_slices(self):
+        scores = self._aggregate(StudyRule("topk", top_k=2)).scores()
+        assert scores["glioma"] == pytest.approx(0.6)
+        assert scores["no_tumor"] == pytest.approx(0.65)
+        assert StudyRule("topk", top_k=2).settings() == {"aggregation": "topk", "top_k": 2}
+
+    def test_empty_study(self):
+        summary = StudyAggregator(LABELS).summary(2, 2)
+        assert summary["label"] is None and summary["scores"] is None
+        assert (summary["num_rejected"], summary["num_skipped"]) == (2, 0)
+
+    def test_decisive_needs_min_slices_and_confidence(self):
+        aggregator = StudyAggregator(LABELS, StudyRule("mean", early_stop=0.6, min_slices=2))
+        aggregator.add(_vision(SLICES[0]))
+        assert not aggregator.decisive()
+        aggregator.add(_vision(SLICES[2]))
+        assert aggregator.decisive()
+        aggregator.add(_vision(SLICES[1]))
+        assert not aggregator.decisive()
+        assert not StudyAggregator(LABELS, StudyRule("mean")).decisive()
+
+    def test_rule_from_request_values(self):
+        rule = StudyRule.from_values({"aggregation": "TOPK", "top_k": "5"})
+        assert (rule.aggregation, rule.top_k, rule.early_stop) == ("topk", 5, 0.0)
+        assert StudyRule.from_values({"early_stop": "0.9"}).early_stop == 0.9
+        assert StudyRule.from_values({}) == StudyRule()
+        assert StudyRule.from_values({"aggregation": "max"}).early_stop == 0.0
+        invalid = (
+            {"aggregation": "median"}, {"top_k": "0"}, {"early_stop": "1.5"}, {"top_k": "two"},
+            {"aggregation": "max", "early_stop": "0.9"}, {"aggregation": "topk", "early_stop": "0.9"},
+        )
+        for values in invalid:
+            with pytest.raises(ValueError):
+                StudyRule.from_values(values)
+
+
+class TestStreamingStudy:
+    def test_early_stop_skips_remaining_slices(self):
+        model = _model([0.02, 0.02, 0.94, 0.02])
+        images = [(f"s{i}.jpg", jpeg_bytes((200, 200))) for i in range(20)]
+        result = orchestrate_batch(images, model, LABELS, rule=StudyRule("mean", early_stop=0.9, min_slices=4))
+        assert [len(c.args[0]) for c in model.predict.call_args_list] == [4]
+        study = result["study"]
+        assert study["stopped_early"] is True
+        assert (study["num_analyzed"], study["num_skipped"]) == (4, 16)
+        assert study["rule"] == {"aggregation": "mean", "early_stop": 0.9, "min_slices": 4}
+        skipped = {"filename": "s4.jpg", "qa": None, "vision": None, "report": None, "skipped": True}
+        assert result["slices"][4] == skipped
+
+    def test_undecided_study_scores_every_slice(self):
+        model = _model([0.3, 0.2, 0.4, 0.1])
+        images = [(f"s{i}.jpg", jpeg_bytes((200, 200))) for i in range(10)]
+        result = orchestrate_batch(images, model, LABELS, rule=StudyRule("mean", early_stop=0.9, min_slices=4))
+        assert [len(c.args[0]) for c in model.predict.call_args_list] == [4, 4, 2]
+        assert result["study"]["stopped_early"] is False
+        assert result["study"]["num_analyzed"] == 10
+
+    def test_progress_after_every_pass(self):
+        progress = []
+        stages = []
+        images = [("tiny.jpg", jpeg_bytes((50, 50)))] + [(f"s{i}.jpg", jpeg_bytes((200, 200))) for i in range(5)]
+        orchestrate_batch(
+            images, _model([0.3, 0.2, 0.4, 0.1]), LABELS, batch_size=2,
+            on_stage=lambda s, p: stages.append((s, len(progress))), on_progress=progress.append,
+        )
+        assert [(p["num_decoded"], p["num_analyzed"]) for p in progress] == [(3, 2), (5, 4), (6, 5)]
+        assert all(p["num_slices"] == 6 and p["elapsed_ms"] >= 0 for p in progress)
+        assert stages[0] == ("qa", 3)
+
+    def test_rejected_slices_do_not_fill_a_pass(self):
+        model = _model([0.02, 0.02, 0.94, 0.02])
+        images = [("tiny.jpg", jpeg_bytes((50, 50)))] + [(f"s{i}.jpg", jpeg_bytes((200, 200))) for i in range(3)]
+        result = orchestrate_batch(images, model, LABELS, rule=StudyRule("mean", early_stop=0.9, min_slices=2))
+        study = result["study"]
+        assert (study["num_rejected"], study["num_analyzed"], study["num_skipped"]) == (1, 2, 1)
+        assert result["slices"][0]["report"]["impression"] == "Inconclusive due to image quality"
+
+
+class TestStudyRuleOption:
+    def _post(self, client, query, n=3):
+        files = [(BytesIO(jpeg_bytes((200, 200), (i * 60, 80, 80))), f"slice_{i}.jpg") for i in range(n)]
+        return client.post(f"/api/v1/analyze/batch{query}", data={"images": files}, content_type="multipart/form-data")
+
+    def test_aggregation_and_early_stop_from_query(self):
+        model = _model([0.02, 0.02, 0.94, 0.02])
+        with app_module.app.test_client() as client, patch("app.model", model):
+            response = self._post(client, "?aggregation=mean&early_stop=0.9")
+            study = response.get_json()["study"]
+            assert study["rule"] == {"aggregation": "mean", "early_stop": 0.9, "min_slices": 8}
+            assert study["num_analyzed"] == 3
+            study = self._post(client, "?aggregation=topk&top_k=2").get_json()["study"]
+            assert study["rule"] == {"aggregation": "topk", "top_k": 2}
+
+    def test_invalid_rule_returns_400(self):
+        with app_module.app.test_client() as client, patch("app.model", _model([0.1, 0.1, 0.7, 0.1])):
+            for query in ("?aggregation=median", "?aggregation=max&early_stop=0.9"):
+                response = self._post(client, query)
+                assert response.status_code == 400
+                assert response.get_json()["error"]["code"] == "INVALID_STUDY_RULE"
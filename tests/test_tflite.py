@@ -0,0 +1,144 @@
+"""Tests for the TFLite backend and the conversion parity check (small stand-in Keras model)."""
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tensorflow as tf
+from ml.convert_tflite import convert, default_output, labelled_images, parity_check
+from ml.quantize import calibration_sample, render_markdown
+from ml.serving import ServingModel
+from ml.tflite_backend import TFLiteModel, load_tflite_model
+
+
+def _tiny_model():
+    inputs = tf.keras.Input(shape=(224, 224, 3))
+    x = tf.keras.layers.Conv2D(2, 3, strides=8)(inputs)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    outputs = tf.keras.layers.Dense(4, activation="softmax")(x)
+    return tf.keras.Model(inputs, outputs)
+
+
+@pytest.fixture(scope="module")
+def converted(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("tflite")
+    keras_model = _tiny_model()
+    keras_path = str(folder / "tiny.keras")
+    keras_model.save(keras_path)
+    tflite_path = str(folder / "tiny.tflite")
+    assert convert(keras_path, tflite_path) > 0
+    return keras_model, tflite_path
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    for label in ("glioma", "no_tumor"):
+        (tmp_path / label).mkdir()
+        for i in range(2):
+            pixels = rng.integers(0, 255, (64, 64, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(tmp_path / label / f"{i}.png")
+    (tmp_path / "glioma" / "notes.txt").write_text("not an image")
+    return str(tmp_path)
+
+
+class TestTFLiteModel:
+    def test_matches_keras_model(self, converted):
+        keras_model, tflite_path = converted
+        batch = np.random.default_rng(0).random((2, 224, 224, 3), dtype=np.float32)
+        out = TFLiteModel(tflite_path, num_threads=2).predict(batch, verbose=0)
+        np.testing.assert_allclose(out, keras_model.predict(batch, verbose=0), rtol=1e-4, atol=1e-5)
+
+    def test_any_batch_size(self, converted):
+        model = TFLiteModel(converted[1])
+        for size in (1, 5, 1):
+            assert model.predict(np.zeros((size, 224, 224, 3), dtype=np.float64)).shape == (size, 4)
+
+    def test_loader_warms_up(self, converted):
+        model = load_tflite_model(converted[1], warmup_batch_sizes=(1, 2))
+        assert set(model.warmup_ms) == {1, 2}
+
+
+class TestParityCheck:
+    def test_labelled_images_reads_class_folders(self, image_dir):
+        items = labelled_images(image_dir)
+        assert len(items) == 4
+        assert {label for _, label in items} == {"glioma", "no_tumor"}
+
+    def test_converted_model_agrees(self, converted, image_dir):
+        keras_model, tflite_path = converted
+        report = parity_check(ServingModel(keras_model), TFLiteModel(tflite_path), labelled_images(image_dir))
+        assert report["images"] == 4
+        assert report["top1_agreement"] == 1.0
+        assert report["max_abs_diff"] < 1e-4
+        assert report["disagreements"] == []
+
+    def test_no_images_is_an_error(self, converted, tmp_path):
+        with pytest.raises(ValueError):
+            parity_check(converted[0], converted[0], labelled_images(str(tmp_path)))
+
+
+class TestQuantizedVariants:
+    @pytest.fixture(scope="class")
+    def keras_path(self, tmp_path_factory):
+        path = str(tmp_path_factory.mktemp("quant") / "tiny.keras")
+        _tiny_model().save(path)
+        return path
+
+    def test_variant_file_names(self):
+        assert default_output("models/vgg.h5") == "models/vgg.tflite"
+        assert default_output("models/vgg.h5", "int8") == "models/vgg.int8.tflite"
+
+    @pytest.mark.parametrize("variant", ["dynamic", "float16"])
+    def test_float_io_variants_match(self, keras_path, variant, image_dir):
+        path = default_output(keras_path, variant)
+        convert(keras_path, path, variant)
+        model = TFLiteModel(path)
+        assert model.quantized is False
+        report = parity_check(tf.keras.models.load_model(keras_path), model, labelled_images(image_dir))
+        assert report["max_abs_diff"] < 0.05
+
+    def test_int8_variant_is_dequantized(self, keras_path, image_dir):
+        images = labelled_images(image_dir)
+        path = default_output(keras_path, "int8")
+        convert(keras_path, path, "int8", [p for p, _ in images])
+        model = TFLiteModel(path)
+        assert model.quantized is True
+        out = model.predict(np.random.default_rng(0).random((3, 224, 224, 3), dtype=np.float32))
+        assert out.dtype == np.float32 and out.shape == (3, 4)
+        report = parity_check(tf.keras.models.load_model(keras_path), model, images)
+        assert set(report["per_class"]) == {"glioma", "no_tumor"}
+        assert report["max_abs_diff"] < 0.1
+
+    def test_int8_needs_calibration_images(self, keras_path, tmp_path):
+        with pytest.raises(ValueError):
+            convert(keras_path, str(tmp_path / "x.tflite"), "int8")
+        with pytest.raises(ValueError):
+            convert(keras_path, str(tmp_path / "x.tflite"), "int4")
+
+    def test_calibration_sample_is_seeded_and_stratified(self):
+        images = [(f"g{i}", "glioma") for i in range(30)] + [(f"n{i}", "no_tumor") for i in range(10)]
+        sample = calibration_sample(images, 8, seed=1)
+        assert sample == calibration_sample(images, 8, seed=1)
+        assert sample != calibration_sample(images, 8, seed=2)
+        assert sum(path.startswith("g") for path in sample) == 6
+        assert sum(path.startswith("n") for path in sample) == 2
+        assert len(calibration_sample(images, 5, seed=1)) == 5
+        assert calibration_sample(images, 100) == [path for path, _ in images]
+
+    def test_report_lists_every_variant(self):
+        per_class = {"glioma": {"images": 2, "accuracy": 0.5, "delta": 0.0}}
+        rows = [
+            {"variant": "keras", "path": "m.h5", "size_mb": 240.0, "p50_ms": 350.0, "top1_agreement": 1.0,
+             "accuracy": 0.5, "accuracy_delta": 0.0, "per_class": per_class},
+            {"variant": "int8", "path": "m.int8.tflite", "size_mb": 60.0, "p50_ms": 120.0, "top1_agreement": 0.9,
+             "accuracy": 0.45, "accuracy_delta": -0.05,
+             "per_class": {"glioma": {"images": 2, "accuracy": 0.0, "delta": -0.5}}},
+        ]
+        markdown = render_markdown({"model": "m.h5", "generated": "now", "image_dir": "images", "images": 2,
+                                    "calibration_images": 2, "calibration_seed": 0, "variants": rows})
+        assert "| int8 | `m.int8.tflite` | 60.0 | 120 | 90% | 45.0% | -5.0% |" in markdown
+        assert "| glioma | 2 | 50% | 0% (-50%) |" in markdown
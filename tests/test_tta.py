@@ -0,0 +1,140 @@
+"""Tests for test-time augmentation: view generation, aggregation and the tta request option."""
+import glob
+import os
+import sys
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from agent.vision_agent_tf import run as vision_run, run_batch as vision_run_batch
+from ml import tta
+from ml.preprocess import preprocess_image
+from tests.conftest import fake_predict, jpeg_bytes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCANS = sorted(glob.glob(os.path.join(ROOT, "image_data", "images", "*", "*.jpg")))
+VIEWS = tta.view_names(tta.DEFAULT_VIEWS)
+
+
+def _view_predict(batch, verbose=0):
+    """no_tumor for every view except the flipped one (row 1 of each group), which says glioma."""
+    preds = fake_predict(batch)
+    preds[1::len(VIEWS)] = [0.7, 0.1, 0.1, 0.1]
+    return preds
+
+
+class TestViews:
+    def test_view_names(self):
+        assert VIEWS == ["identity", "flip", "shift_left", "shift_right", "shift_up", "shift_down"]
+        assert tta.view_names("flip, identity,flip") == ["identity", "flip"]
+        with pytest.raises(ValueError, match="Unknown TTA view"):
+            tta.view_names("identity,rotate")
+
+    def test_flip_and_shifts(self):
+        src = np.random.default_rng(0).random((224, 224, 3), dtype=np.float32)
+        out = np.empty_like(src)
+        s = tta.SHIFT_PX
+        tta.VIEWS["flip"](src, out)
+        np.testing.assert_array_equal(out, src[:, ::-1])
+        tta.VIEWS["shift_right"](src, out)
+        np.testing.assert_array_equal(out[:, s:], src[:, :-s])
+        np.testing.assert_array_equal(out[:, :s], np.repeat(src[:, :1], s, axis=1))
+        tta.VIEWS["shift_up"](src, out)
+        np.testing.assert_array_equal(out[:-s], src[s:])
+        np.testing.assert_array_equal(out[-s:], np.repeat(src[-1:], s, axis=0))
+
+    def test_views_follow_each_image_in_the_buffer(self):
+        images = [Image.open(path) for path in SCANS[:2]]
+        batch = tta.preprocess_views(images, VIEWS)
+        assert batch.shape == (2 * len(VIEWS), 224, 224, 3)
+        for i, image in enumerate(images):
+            original = preprocess_image(image)[0]
+            np.testing.assert_array_equal(batch[i * len(VIEWS)], original)
+            np.testing.assert_array_equal(batch[i * len(VIEWS) + 1], original[:, ::-1])
+
+    def test_aggregate(self):
+        preds = np.array([[0.8, 0.2], [0.6, 0.4], [0.3, 0.7]])
+        mean, std, agreement = tta.aggregate(preds)
+        np.testing.assert_allclose(mean, [17 / 30, 13 / 30])
+        np.testing.assert_allclose(std, preds.std(axis=0))
+        assert agreement == pytest.approx(2 / 3)
+
+
+class TestVisionAgent:
+    def test_views_share_one_forward_pass(self):
+        model = MagicMock()
+        model.predict.side_effect = _view_predict
+        result = vision_run(Image.open(SCANS[0]), model, tta_views=VIEWS)
+        assert model.predict.call_count == 1
+        assert len(model.predict.call_args[0][0]) == len(VIEWS)
+        assert result["label"] == "no_tumor"
+        assert result["probs"]["glioma"] == pytest.approx((0.7 + 5 * 0.1) / 6)
+        assert result["probs_std"]["glioma"] == pytest.approx(np.std([0.7] + [0.1] * 5))
+        assert result["tta"]["views"] == VIEWS
+        assert result["tta"]["agreement"] == pytest.approx(5 / 6)
+        assert result["tta"]["confidence_std"] == pytest.approx(result["probs_std"]["no_tumor"])
+
+    def test_batch_keeps_views_of_an_image_together(self):
+        model = MagicMock()
+        model.predict.side_effect = _view_predict
+        images = [Image.new("RGB", (200, 200), (i * 40, 60, 60)) for i in range(5)]
+        results = vision_run_batch(images, model, batch_size=12, tta_views=VIEWS)
+        assert [len(c.args[0]) for c in model.predict.call_args_list] == [12, 12, 6]
+        assert [r["tta"]["agreement"] for r in results] == [pytest.approx(5 / 6)] * 5
+
+    def test_explanation_is_for_the_original_view(self):
+        model = MagicMock()
+        model.explain.side_effect = lambda batch: (_view_predict(batch), np.zeros((len(batch), 14, 14)))
+        result = vision_run(Image.open(SCANS[0]), model, explain=True, tta_views=VIEWS)
+        assert result["explanation"]["class"] == "no_tumor"
+
+
+class TestTtaOption:
+    @pytest.fixture
+    def client(self):
+        app_module.app.config["TESTING"] = True
+        with app_module.app.test_client() as client, patch("app.PERSIST_UPLOADS", False), patch(
+            "app.TTA_VIEWS", VIEWS
+        ):
+            yield client
+
+    def _analyze(self, client, data, query=""):
+        return client.post(
+            f"/api/v1/analyze{query}", data={"image": (BytesIO(data), "scan.jpg")}, content_type="multipart/form-data"
+        ).get_json()
+
+    def test_tta_results_are_cached_separately(self, client):
+        model = MagicMock()
+        model.predict.side_effect = _view_predict
+        data = jpeg_bytes(color=(110, 111, 112))
+        with patch("app.model", model):
+            plain = self._analyze(client, data)
+            augmented = self._analyze(client, data, "?tta=true")
+            again = self._analyze(client, data, "?tta=true")
+        assert "tta" not in plain["vision"]
+        assert augmented["vision"]["tta"]["agreement"] == pytest.approx(5 / 6)
+        assert again["vision"] == augmented["vision"]
+        assert [len(c.args[0]) for c in model.predict.call_args_list] == [1, len(VIEWS)]
+
+    def test_tta_default_and_opt_out(self, client):
+        model = MagicMock()
+        model.predict.side_effect = _view_predict
+        with patch("app.model", model), patch("app.TTA_DEFAULT", True):
+            assert "tta" in self._analyze(client, jpeg_bytes(color=(113, 114, 115)))["vision"]
+            assert "tta" not in self._analyze(client, jpeg_bytes(color=(116, 117, 118)), "?tta=false")["vision"]
+
+    def test_study_slices_use_tta(self, client):
+        model = MagicMock()
+        model.predict.side_effect = _view_predict
+        files = [(BytesIO(jpeg_bytes(color=(i * 60, 70, 70))), f"slice_{i}.jpg") for i in range(2)]
+        with patch("app.model", model):
+            data = client.post(
+                "/api/v1/analyze/batch?tta=1", data={"images": files}, content_type="multipart/form-data"
+            ).get_json()
+        assert all(s["vision"]["tta"]["views"] == VIEWS for s in data["slices"])
+        assert [len(c.args[0]) for c in model.predict.call_args_list] == [2 * len(VIEWS)]
@@ -0,0 +1,92 @@
+"""Tests for startup warm-up and the liveness/readiness endpoints."""
+import os
+import sys
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from agent.qa_agent import run as qa_run
+from ml.warmup import Warmup, synthetic_scan
+from tests.conftest import fake_predict
+
+
+class TestWarmup:
+    def test_steps_run_in_order_with_timings(self):
+        calls = []
+        warmup = Warmup([("a", lambda: calls.append("a")), ("b", lambda: calls.append("b"))])
+        assert warmup.ready is False
+        warmup.run()
+        assert calls == ["a", "b"]
+        assert warmup.state == "done"
+        assert warmup.ready is True
+        snapshot = warmup.snapshot()
+        assert set(snapshot["steps_ms"]) == {"a", "b"}
+        assert snapshot["warmup_ms"] >= 0
+
+    def test_failed_step_is_not_ready(self):
+        def boom():
+            raise RuntimeError("no kernel")
+
+        warmup = Warmup([("vision", boom), ("never", lambda: None)])
+        warmup.run()
+        assert warmup.state == "failed"
+        assert warmup.ready is False
+        assert "vision" in warmup.error
+        assert "never" not in warmup.steps_ms
+
+    def test_background_start_and_wait(self):
+        warmup = Warmup([("a", lambda: None)])
+        warmup.start()
+        assert warmup.wait(5) is True
+
+    def test_synthetic_scan_passes_qa(self):
+        qa = qa_run(Image.open(BytesIO(synthetic_scan())))
+        assert qa["safe_to_infer"] is True
+
+
+class TestProbes:
+    @pytest.fixture
+    def client(self):
+        app_module.app.config["TESTING"] = True
+        with app_module.app.test_client() as client, patch("app.warmup", app_module.warmup):
+            yield client
+
+    def test_warmup_runs_pipeline_before_ready(self, client):
+        mock_model = MagicMock()
+        mock_model.predict.side_effect = fake_predict
+        with patch("app.model", mock_model), patch("app.result_cache", None), patch("app.WARMUP_ENABLED", True):
+            warmup = app_module.start_warmup(background=False)
+            assert warmup.state == "done"
+            assert set(warmup.steps_ms) == {"vision", "batch"}
+            # One single-image pass plus one batched pass of BATCH_MAX_SIZE slices.
+            assert [len(c.args[0]) for c in mock_model.predict.call_args_list] == [1, app_module.BATCH_MAX_SIZE]
+            response = client.get("/readyz")
+            assert response.status_code == 200
+            assert response.get_json()["warmup"]["warmup_ms"] is not None
+            health = client.get("/healthz").get_json()
+            assert health["ready"] is True
+            assert health["warmup"]["state"] == "done"
+
+    def test_not_ready_while_warming_up(self, client):
+        warming = Warmup()
+        warming.state = "running"
+        with patch("app.model", MagicMock()), patch("app.warmup", warming):
+            assert client.get("/livez").status_code == 200
+            assert client.get("/readyz").status_code == 503
+            health = client.get("/healthz")
+            assert health.status_code == 500
+            assert health.get_json()["model_loaded"] is True
+            assert health.get_json()["ready"] is False
+
+    @patch("app.model", None)
+    def test_livez_ok_without_model(self, client):
+        response = client.get("/livez")
+        assert response.status_code == 200
+        assert response.get_json()["alive"] is True
+        ready = client.get("/readyz")
+        assert ready.status_code == 503
+        assert ready.get_json()["model_loaded"] is False